@@ -42,7 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'units.middleware.ThrottledSessionMiddleware',  # بدل SessionMiddleware: تمديد الجلسة على فترات
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -76,14 +76,74 @@ WSGI_APPLICATION = 'brooz_config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production profile: WAL (readers don't block the writer), synchronous=NORMAL
+# (safe with WAL), page cache / mmap sizes and in-memory temp tables, applied on every
+# new connection. Transactions start with BEGIN IMMEDIATE so a writer takes the lock
+# up front (waiting up to SQLITE_BUSY_TIMEOUT seconds) instead of failing mid-transaction.
+# auto_vacuum=INCREMENTAL only applies to new database files. Existing ones keep
+# their mode until a one-time `archive_visits --vacuum convert` (a full VACUUM).
+# 30s as before the WAL profile: long admin writes and report jobs hold the lock that long.
+SQLITE_BUSY_TIMEOUT = 30  # seconds
+SQLITE_CACHE_SIZE_KB = 20000
+SQLITE_MMAP_SIZE = 128 * 1024 * 1024
+SQLITE_OPTIONS = {
+    'timeout': SQLITE_BUSY_TIMEOUT,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA auto_vacuum=INCREMENTAL;'
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};'
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+}
+
+# Writes that still hit "database is locked" are retried this many times with
+# exponential backoff starting at DB_LOCK_BACKOFF_MS (units/sqlite.py)
+DB_LOCK_RETRIES = 3
+DB_LOCK_BACKOFF_MS = 50
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    },
+    # سجل الزيارات وملخصاته في ملف منفصل حتى لا تنتظر الحجوزات خلف تسجيل الصفحات
+    'analytics': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'analytics.sqlite3',
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    },
+}
+
+# Visit, VisitDailyRollup and the visit lookup tables live in ANALYTICS_DATABASE
+# (units/routers.py). After adding it: migrate --database=analytics, then
+# move_visits_to_analytics to copy existing visits out of db.sqlite3.
+ANALYTICS_DATABASE = 'analytics'
+DATABASE_ROUTERS = ['units.routers.AnalyticsRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # الجلسات: ملفات مشتركة بين عمليات الخادم حتى يظهر تسجيل الخروج في كل العمليات
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # جداول الأسعار وتقاويمها والإجازات العامة: مشتركة حتى يظهر تعديل السعر في كل العمليات
+    'pricing': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'pricing',
         'OPTIONS': {
-            'timeout': 30,  # زيادة timeout لتجنب القفل
+            'MAX_ENTRIES': 10000,
         },
-    }
+    },
 }
 
 
@@ -133,7 +193,91 @@ LOGIN_URL = '/units/login/'
 # Session settings: 48 hours default, secure and HTTPOnly
 SESSION_COOKIE_AGE = 172800  # 48 hours in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are not rewritten on every request: ThrottledSessionMiddleware re-saves
+# a session (extending its expiry and cookie) only once SESSION_REFRESH_FRACTION of
+# its age has passed since the last refresh, or when it changes.
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_FRACTION = 0.1
+# Session reads come from a file cache shared by all worker processes, writes go through to the DB
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_HTTPONLY = True
 # In production behind HTTPS, set to True
 SESSION_COOKIE_SECURE = False
+
+# Reports: rows fetched per database round-trip when exporting
+REPORT_EXPORT_CHUNK_SIZE = 2000
+
+# Background report jobs: 'thread' runs them in-process, 'command' leaves them
+# for `python manage.py run_report_jobs`
+REPORT_JOBS_BACKEND = 'thread'
+REPORT_JOBS_MAX_WORKERS = 1
+REPORT_JOBS_STALE_SECONDS = 1800
+
+# PDF reports: Arabic TTF font paths (None = try static/fonts/Cairo-*.ttf, then system fonts)
+PDF_ARABIC_FONT = None
+PDF_ARABIC_FONT_BOLD = None
+
+# Arabic text caches used while rendering reports (entries per process)
+ARABIC_SHAPING_CACHE_SIZE = 4096
+ARABIC_DATE_CACHE_SIZE = 2048
+
+# PDF payment reports: above PDF_LARGE_REPORT_ROWS the table is split into
+# LongTable segments of PDF_TABLE_SEGMENT_ROWS; above PDF_MAX_SYNC_ROWS the
+# direct download is refused in favour of a background job
+PDF_TABLE_SEGMENT_ROWS = 500
+PDF_LARGE_REPORT_ROWS = 1000
+PDF_MAX_SYNC_ROWS = 5000
+
+# Visit logging: 'buffered' queues visits in-process and bulk-inserts them from a
+# background thread every VISIT_FLUSH_BATCH records or VISIT_FLUSH_INTERVAL_MS;
+# 'sync' writes each visit inside the request
+VISIT_LOGGING_MODE = 'buffered'
+VISIT_BUFFER_SIZE = 10000
+VISIT_FLUSH_BATCH = 200
+VISIT_FLUSH_INTERVAL_MS = 2000
+
+# Admin visit statistics are read from daily rollups and cached this long (seconds)
+VISIT_STATS_CACHE_SECONDS = 60
+
+# Visit retention: raw visits older than VISIT_RETENTION_DAYS are folded into
+# rollups, written to VISIT_ARCHIVE_DIR as gzip JSONL per day and deleted
+# VISIT_ARCHIVE_BATCH_SIZE rows at a time (python manage.py archive_visits)
+VISIT_RETENTION_DAYS = 90
+VISIT_ARCHIVE_DIR = BASE_DIR / 'archive' / 'visits'
+VISIT_ARCHIVE_BATCH_SIZE = 1000
+
+# Visit user agents, paths and referers are stored once in lookup tables;
+# each process keeps this many recent values per table to resolve IDs without a query
+VISIT_INTERN_CACHE_SIZE = 1024
+
+# Visit tracking filters (units/tracking.py). Anonymous hits are recorded 1 in
+# VISIT_SAMPLE_RATE, each saved with weight=VISIT_SAMPLE_RATE so totals stay unbiased.
+# Bot user agents and excluded paths are never recorded; if VISIT_INCLUDE_PATHS is
+# non-empty only matching paths are. Patterns are regular expressions; set
+# VISIT_BOT_USER_AGENT_PATTERNS or VISIT_EXCLUDE_PATHS here only to replace the
+# defaults in units/tracking.py (DEFAULT_BOT_USER_AGENT_PATTERNS, DEFAULT_EXCLUDE_PATHS).
+# Requests without a User-Agent header are recorded unless
+# VISIT_EMPTY_USER_AGENT_IS_BOT is True (some privacy tools strip the header).
+VISIT_SAMPLE_RATE = 1
+VISIT_EMPTY_USER_AGENT_IS_BOT = False
+VISIT_INCLUDE_PATHS = []
+
+# Pricing engine (units/pricing.py). Per-unit weekday/holiday/Eid price tables, the
+# yearly price calendars and the merged public holidays are cached in PRICING_CACHE_ALIAS
+# for PRICE_TABLE_CACHE_SECONDS and dropped or patched when a price changes. The alias
+# must be shared by all server processes (files here). With a per-process cache such as
+# LocMemCache an edit only reaches the process that saved it; the others quote the old
+# price for up to PRICE_TABLE_CACHE_SECONDS.
+PRICING_CACHE_ALIAS = 'pricing'
+PRICE_TABLE_CACHE_SECONDS = 300
+# First day of each Eid (Gregorian); SpecialPricing night N is day N of the Eid.
+# Update when the dates are announced.
+EID_START_DATES = {
+    'eid_al_fitr': ['2025-03-30', '2026-03-20', '2027-03-10'],
+    'eid_al_adha': ['2025-06-06', '2026-05-27', '2027-05-16'],
+}
+# Largest number of (unit, range) pairs priced by one /api/pricing/quote/ call
+PRICING_QUOTE_MAX_ITEMS = 500
+# Largest pricing file accepted by the admin import (rows)
+PRICING_IMPORT_MAX_ROWS = 20000
@@ -25,6 +25,7 @@ from units import views as unit_views
 urlpatterns = [
     path('admin/profits/pdf/', unit_views.profits_pdf, name='admin_profits_pdf'),
     path('admin/profits/', unit_views.profits_view, name='admin_profits'),
+    path('admin/occupancy/', unit_views.occupancy_view, name='admin_occupancy'),
     path('admin/', admin.site.urls),
     path('', include('units.urls')),
     # Redirect common mistyped URL to admin
@@ -1,11 +1,15 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
 from django.utils.html import format_html
-from .models import Unit, Booking, Report, Contract, UserProfile, Visit, Expense, UnitPricing, SpecialPricing, ProfitPercentage, UnitImage, Holiday
+from .models import Unit, Booking, Report, Contract, UserProfile, Visit, Expense, UnitPricing, SpecialPricing, ProfitPercentage, UnitImage, Holiday, PublicHoliday, PublicHolidayOverride, ReportJob
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django import forms
 from .validators import validate_arabic_username
+from .rollups import visit_rollup_stats
+from .sqlite import RetryOnLockedAdminMixin
 
 class UnitImageInline(admin.TabularInline):
     model = UnitImage
@@ -24,7 +28,7 @@ class UnitImageInline(admin.TabularInline):
 
 
 @admin.register(Unit)
-class UnitAdmin(admin.ModelAdmin):
+class UnitAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة الوحدات في لوحة التحكم"""
     
     list_display = ['name', 'owner', 'status_badge', 'created_at']
@@ -72,7 +76,7 @@ class UnitAdmin(admin.ModelAdmin):
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة الحجوزات في لوحة التحكم"""
     
     list_display = ['unit', 'start_date', 'end_date', 'price_per_day', 'cash_amount', 'transfer_amount', 'customer_name', 'customer_phone', 'duration', 'created_at']
@@ -155,8 +159,8 @@ class VisitAdmin(admin.ModelAdmin):
     
     list_display = ['user_display', 'visit_count_display', 'path_display', 'ip_address', 'visit_date', 'user_agent_short']
     list_filter = ['created_at', 'path']
-    search_fields = ['user__username', 'user__email', 'ip_address', 'path']
-    readonly_fields = ['user', 'session_key', 'ip_address', 'user_agent', 'path', 'referer', 'created_at']
+    search_fields = ['ip_address', 'path__value']
+    readonly_fields = ['user', 'session_key', 'ip_address', 'user_agent', 'path', 'referer', 'weight', 'created_at']
     date_hierarchy = 'created_at'
     change_list_template = 'admin/units/visit_change_list.html'
     
@@ -164,13 +168,31 @@ class VisitAdmin(admin.ModelAdmin):
         """عرض فقط زيارات المستثمرين (استبعاد admin/staff)"""
         qs = super().get_queryset(request)
         # استبعاد زيارات admin/staff من القائمة
-        qs = qs.exclude(user__is_staff=True).exclude(user__is_superuser=True)
-        return qs.select_related('user')
+        # الزيارات قد تكون في قاعدة بيانات أخرى (routers.py): لا ربط مع جدول المستخدمين
+        staff_ids = User.objects.filter(Q(is_staff=True) | Q(is_superuser=True)).values_list('id', flat=True)
+        qs = qs.exclude(user_id__in=list(staff_ids))
+        return qs.select_related('path', 'user_agent').prefetch_related('user')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """البحث باسم المستخدم أو بريده عبر جدول المستخدمين ثم بأرقامهم"""
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            user_ids = list(
+                User.objects.filter(Q(username__icontains=search_term) | Q(email__icontains=search_term))
+                .values_list('id', flat=True)
+            )
+            if user_ids:
+                results |= queryset.filter(user_id__in=user_ids)
+        return results, may_have_duplicates
     
     def changelist_view(self, request, extra_context=None):
         """إضافة إحصائيات حسب المستخدم المحدد"""
         extra_context = extra_context or {}
         
+        # إحصائيات المستخدمين من الملخصات اليومية (بدون مسح سجل الزيارات)
+        stats = visit_rollup_stats()
+        visit_counts_dict = {row['user_id']: row['visit_count'] for row in stats['per_user']}
+        
         # الحصول على المستخدم المحدد من الفلتر
         user_id = request.GET.get('user__id__exact')
         
@@ -180,36 +202,23 @@ class VisitAdmin(admin.ModelAdmin):
                 selected_user = User.objects.get(id=user_id)
                 # حساب الزيارات فقط إذا كان المستخدم ليس admin/staff
                 if not selected_user.is_staff and not selected_user.is_superuser:
-                    visit_count = Visit.objects.filter(user=selected_user).count()
                     extra_context['selected_user'] = selected_user
-                    extra_context['user_visit_count'] = visit_count
+                    extra_context['user_visit_count'] = visit_counts_dict.get(selected_user.id, 0)
             except:
                 pass
         
         # إحصائيات عامة لجميع المستخدمين (فقط المستثمرين، بدون admin/staff)
-        from django.db.models import Count
-        user_stats = (
-            Visit.objects
-            .filter(user__isnull=False)
-            .exclude(user__is_staff=True)
-            .exclude(user__is_superuser=True)
-            .values('user__username', 'user__email', 'user__id')
-            .annotate(total_visits=Count('id'))
-            .order_by('-total_visits')
-        )
-        extra_context['user_stats'] = list(user_stats)
+        extra_context['user_stats'] = [
+            {
+                'user__username': row['user__username'],
+                'user__email': row['user__email'],
+                'user__id': row['user_id'],
+                'total_visits': row['visit_count'],
+            }
+            for row in stats['per_user']
+        ]
         
-        # حساب عدد الزيارات لكل مستخدم لتخزينه في cache (فقط المستثمرين)
-        from django.db.models import Count as CountFunc
-        visit_counts_dict = dict(
-            Visit.objects
-            .filter(user__isnull=False)
-            .exclude(user__is_staff=True)
-            .exclude(user__is_superuser=True)
-            .values('user_id')
-            .annotate(count=CountFunc('id'))
-            .values_list('user_id', 'count')
-        )
+        # عدد الزيارات لكل مستخدم لعرضه في القائمة (فقط المستثمرين)
         self._visit_counts_cache = visit_counts_dict
         
         return super().changelist_view(request, extra_context)
@@ -224,7 +233,7 @@ class VisitAdmin(admin.ModelAdmin):
             )
         return format_html('<span style="color: #999;">زائر غير مسجل</span>')
     user_display.short_description = 'المستخدم'
-    user_display.admin_order_field = 'user__username'
+    user_display.admin_order_field = 'user_id'
     
     def visit_count_display(self, obj):
         """عرض عدد الزيارات للمستخدم (يظهر فقط في القائمة) - فقط للمستثمرين"""
@@ -249,7 +258,8 @@ class VisitAdmin(admin.ModelAdmin):
     
     def path_display(self, obj):
         """عرض المسار بشكل مختصر"""
-        path = obj.path[:50] + '...' if len(obj.path) > 50 else obj.path
+        path = obj.path.value if obj.path else ''
+        path = path[:50] + '...' if len(path) > 50 else path
         return format_html('<code style="font-size: 11px;">{}</code>', path)
     path_display.short_description = 'المسار'
     
@@ -262,7 +272,8 @@ class VisitAdmin(admin.ModelAdmin):
     def user_agent_short(self, obj):
         """عرض معلومات المتصفح بشكل مختصر"""
         if obj.user_agent:
-            ua = obj.user_agent[:60] + '...' if len(obj.user_agent) > 60 else obj.user_agent
+            ua = obj.user_agent.value
+            ua = ua[:60] + '...' if len(ua) > 60 else ua
             return format_html('<small>{}</small>', ua)
         return '-'
     user_agent_short.short_description = 'المتصفح'
@@ -291,7 +302,7 @@ class VisitAdmin(admin.ModelAdmin):
             )
         return format_html('<span style="color: #999;">زائر غير مسجل</span>')
     user_display.short_description = 'المستخدم'
-    user_display.admin_order_field = 'user__username'
+    user_display.admin_order_field = 'user_id'
     
     def visit_count_display(self, obj):
         """عرض عدد الزيارات للمستخدم (يظهر فقط في القائمة) - فقط للمستثمرين"""
@@ -316,7 +327,8 @@ class VisitAdmin(admin.ModelAdmin):
     
     def path_display(self, obj):
         """عرض المسار بشكل مختصر"""
-        path = obj.path[:50] + '...' if len(obj.path) > 50 else obj.path
+        path = obj.path.value if obj.path else ''
+        path = path[:50] + '...' if len(path) > 50 else path
         return format_html('<code style="font-size: 11px;">{}</code>', path)
     path_display.short_description = 'المسار'
     
@@ -329,7 +341,8 @@ class VisitAdmin(admin.ModelAdmin):
     def user_agent_short(self, obj):
         """عرض معلومات المتصفح بشكل مختصر"""
         if obj.user_agent:
-            ua = obj.user_agent[:60] + '...' if len(obj.user_agent) > 60 else obj.user_agent
+            ua = obj.user_agent.value
+            ua = ua[:60] + '...' if len(ua) > 60 else ua
             return format_html('<small>{}</small>', ua)
         return '-'
     user_agent_short.short_description = 'المتصفح'
@@ -372,15 +385,27 @@ if not getattr(admin_site, '_brooz_urls_patched', False):
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     list_display = ['title', 'owner', 'created_at']
     list_filter = ['owner', 'created_at']
     search_fields = ['title', 'owner__username', 'owner__email']
     fields = ['owner', 'title', 'file']
 
 
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'requested_by', 'created_at', 'finished_at', 'report']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['requested_by__username', 'error']
+    readonly_fields = ['kind', 'params', 'params_hash', 'status', 'attach_to_owner', 'file', 'report',
+                       'error', 'requested_by', 'created_at', 'started_at', 'finished_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(Contract)
-class ContractAdmin(admin.ModelAdmin):
+class ContractAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     list_display = ['title', 'owner', 'created_at']
     list_filter = ['owner', 'created_at']
     search_fields = ['title', 'owner__username', 'owner__email']
@@ -438,7 +463,7 @@ class CustomUserChangeForm(UserChangeForm):
         self.fields['username'].validators.append(validate_arabic_username)
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(RetryOnLockedAdminMixin, UserAdmin):
     form = CustomUserChangeForm
     add_form = CustomUserCreationForm
     inlines = (UserProfileInline,)
@@ -469,13 +494,13 @@ admin.site.register(User, CustomUserAdmin)
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'phone_number']
     search_fields = ['user__username', 'user__email', 'phone_number']
 
 
 @admin.register(Expense)
-class ExpenseAdmin(admin.ModelAdmin):
+class ExpenseAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة المصروفات في لوحة التحكم"""
     
     list_display = ['unit', 'category_display', 'price', 'invoice_link', 'created_at', 'owner']
@@ -620,9 +645,10 @@ class ExpenseAdmin(admin.ModelAdmin):
 
 
 @admin.register(UnitPricing)
-class UnitPricingAdmin(admin.ModelAdmin):
-    """إدارة أسعار الوحدات في لوحة التحكم"""
+class UnitPricingAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
+    """إدارة أسعار الوحدات في لوحة التحكم (مع استيراد وتصدير كل الأسعار)"""
     
+    change_list_template = 'admin/units/unitpricing_change_list.html'
     list_display = ['unit', 'day_display', 'price', 'updated_at']
     list_filter = ['unit', 'day_of_week', 'updated_at']
     search_fields = ['unit__name']
@@ -654,10 +680,83 @@ class UnitPricingAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """السماح بحذف الأسعار فقط للمديرين (staff)"""
         return request.user.is_staff
+    
+    def get_urls(self):
+        from django.urls import path
+        custom_urls = [
+            path('transfer/', self.admin_site.admin_view(self.transfer_view), name='units_unitpricing_transfer'),
+            path('export.<str:fmt>', self.admin_site.admin_view(self.export_view), name='units_unitpricing_export'),
+        ]
+        return custom_urls + super().get_urls()
+    
+    def export_view(self, request, fmt):
+        """تصدير أسعار كل الوحدات (أيام الأسبوع، ليالي الأعياد، الإجازات)"""
+        from django.http import Http404, HttpResponse, StreamingHttpResponse
+        from .pricing_io import EXCEL_AVAILABLE, export_filename, iter_pricing_csv, write_pricing_xlsx
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if fmt == 'csv':
+            response = StreamingHttpResponse(iter_pricing_csv(), content_type='text/csv; charset=utf-8')
+        elif fmt == 'xlsx' and EXCEL_AVAILABLE:
+            response = HttpResponse(
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            write_pricing_xlsx(response)
+        else:
+            raise Http404
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt)}"'
+        return response
+    
+    def transfer_view(self, request):
+        """استيراد ملف أسعار: تجربة تعرض الفروق، أو تطبيق في معاملة واحدة"""
+        from django.contrib import messages
+        from django.db import OperationalError
+        from django.shortcuts import render
+        from .pricing_io import EXCEL_AVAILABLE, PricingImport, read_pricing_file
+        from .sqlite import call_with_retry, is_locked_error
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        
+        importer = None
+        applied = False
+        if request.method == 'POST':
+            uploaded = request.FILES.get('file')
+            dry_run = request.POST.get('apply') != '1'
+            if uploaded is None:
+                messages.error(request, 'اختر ملف الأسعار')
+            else:
+                try:
+                    importer = PricingImport(read_pricing_file(uploaded))
+                except ValueError as e:
+                    messages.error(request, str(e))
+                if importer is not None and importer.errors:
+                    messages.error(request, f'الملف فيه {len(importer.errors)} خطأ، لم يُطبق أي تغيير')
+                elif importer is not None and not dry_run:
+                    try:
+                        call_with_retry(importer.apply, name='pricing_import')
+                        applied = True
+                        counts = importer.counts
+                        messages.success(
+                            request, f'تم الاستيراد: {counts["create"]} جديد، {counts["update"]} معدّل'
+                        )
+                    except OperationalError as e:
+                        if not is_locked_error(e):
+                            raise
+                        messages.error(request, 'النظام مشغول حالياً، حاول مرة أخرى')
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'استيراد وتصدير الأسعار',
+            'importer': importer,
+            'applied': applied,
+            'excel_available': EXCEL_AVAILABLE,
+        }
+        return render(request, 'admin/units/pricing_transfer.html', context)
 
 
 @admin.register(SpecialPricing)
-class SpecialPricingAdmin(admin.ModelAdmin):
+class SpecialPricingAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة الأسعار الخاصة للوحدات في لوحة التحكم"""
     
     list_display = ['unit', 'pricing_type_display', 'night_display', 'price', 'updated_at']
@@ -699,7 +798,7 @@ class SpecialPricingAdmin(admin.ModelAdmin):
 
 
 @admin.register(Holiday)
-class HolidayAdmin(admin.ModelAdmin):
+class HolidayAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة الإجازات في لوحة التحكم"""
     
     list_display = ['unit', 'holiday_name', 'holiday_date', 'price', 'updated_at']
@@ -731,6 +830,55 @@ class HolidayAdmin(admin.ModelAdmin):
         return request.user.is_staff
 
 
+class PublicHolidayOverrideInline(admin.TabularInline):
+    model = PublicHolidayOverride
+    extra = 0
+    fields = ('unit', 'price', 'multiplier', 'is_excluded')
+    autocomplete_fields = ['unit']
+
+
+@admin.register(PublicHoliday)
+class PublicHolidayAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
+    """إدارة الإجازات العامة لكل الوحدات واستثناءات الوحدات منها"""
+
+    list_display = ['holiday_name', 'holiday_date', 'price', 'multiplier', 'overrides_count', 'updated_at']
+    list_filter = ['holiday_date']
+    search_fields = ['holiday_name']
+    date_hierarchy = 'holiday_date'
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [PublicHolidayOverrideInline]
+
+    fieldsets = (
+        ('المعلومات الأساسية', {
+            'fields': ('holiday_name', 'holiday_date', 'price', 'multiplier')
+        }),
+        ('معلومات إضافية', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(overrides_total=Count('overrides'))
+
+    def overrides_count(self, obj):
+        return obj.overrides_total
+    overrides_count.short_description = 'استثناءات الوحدات'
+    overrides_count.admin_order_field = 'overrides_total'
+
+    def has_add_permission(self, request):
+        """السماح بإضافة الإجازات العامة فقط للمديرين (staff)"""
+        return request.user.is_staff
+
+    def has_change_permission(self, request, obj=None):
+        """السماح بتعديل الإجازات العامة فقط للمديرين (staff)"""
+        return request.user.is_staff
+
+    def has_delete_permission(self, request, obj=None):
+        """السماح بحذف الإجازات العامة فقط للمديرين (staff)"""
+        return request.user.is_staff
+
+
 # تم إخفاء ProfitPercentage من admin لأنه أصبح متاحاً في صفحة الأرباح
 # @admin.register(ProfitPercentage)
 # class ProfitPercentageAdmin(admin.ModelAdmin):
@@ -765,7 +913,7 @@ class HolidayAdmin(admin.ModelAdmin):
 
 
 @admin.register(UnitImage)
-class UnitImageAdmin(admin.ModelAdmin):
+class UnitImageAdmin(RetryOnLockedAdminMixin, admin.ModelAdmin):
     """إدارة صور الوحدات"""
     
     list_display = ['unit', 'title', 'is_featured', 'preview', 'created_at']
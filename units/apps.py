@@ -7,4 +7,9 @@ class UnitsConfig(AppConfig):
 
     def ready(self):
         import units.signals  # تفعيل الـ signals
+        from django.core import checks
+        from units.pdf import check_pdf_fonts
+        checks.register(check_pdf_fonts)  # فحص خطوط PDF عند التشغيل
+        from units.jobs import connect_resume_on_first_request
+        connect_resume_on_first_request()  # استئناف مهام التقارير المنقطعة
 
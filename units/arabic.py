@@ -0,0 +1,121 @@
+"""
+أدوات النص العربي المشتركة: تنسيق التواريخ وإعادة تشكيل النص للـ PDF
+
+أسماء الأيام والأشهر جداول ثابتة تُبنى مرة واحدة، وإعادة التشكيل والتنسيق
+محفوظتان في ذاكرة LRU محدودة لأن التقارير تكرر نفس النصوص (أسماء الوحدات،
+لاحقة العملة، العناوين، التواريخ) آلاف المرات. العدادات لكل عملية.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+from django.conf import settings
+
+# محاولة استيراد مكتبات إعادة تشكيل النص العربي
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+    ARABIC_SUPPORT = True
+except ImportError:
+    ARABIC_SUPPORT = False
+    arabic_reshaper = None
+    get_display = None
+
+# أيام الأسبوع بالعربي (حسب date.weekday(): 0=الإثنين، 6=الأحد)
+WEEKDAYS_ARABIC = ('الإثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت', 'الأحد')
+
+# أسماء الأشهر الميلادية (الفهرس = رقم الشهر)
+MONTHS_ARABIC = (
+    '', 'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+    'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر',
+)
+
+SHAPING_CACHE_SIZE = getattr(settings, 'ARABIC_SHAPING_CACHE_SIZE', 4096)
+DATE_CACHE_SIZE = getattr(settings, 'ARABIC_DATE_CACHE_SIZE', 2048)
+
+
+def parse_date(value):
+    """تحويل نص التاريخ (YYYY-MM-DD أو مع الوقت) إلى date، أو None إن تعذّر"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _format_with_weekday(date_obj):
+    return f"{WEEKDAYS_ARABIC[date_obj.weekday()]} {date_obj.day} {MONTHS_ARABIC[date_obj.month]} {date_obj.year}"
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _format_short(date_obj):
+    return f"{date_obj.day} {MONTHS_ARABIC[date_obj.month]} {date_obj.year}"
+
+
+def format_date_arabic(date_obj):
+    """تحويل التاريخ إلى صيغة عربية مع التقويم الميلادي ويوم الأسبوع"""
+    if not date_obj:
+        return ""
+    parsed = parse_date(date_obj)
+    if parsed is None:
+        return date_obj
+    return _format_with_weekday(parsed)
+
+
+def format_date_arabic_short(date_obj):
+    """تحويل التاريخ إلى صيغة عربية (اليوم الشهر السنة) بدون يوم الأسبوع"""
+    if not date_obj:
+        return ""
+    parsed = parse_date(date_obj)
+    if parsed is None:
+        return date_obj
+    return _format_short(parsed)
+
+
+@lru_cache(maxsize=SHAPING_CACHE_SIZE)
+def _reshape(text):
+    try:
+        # إعادة تشكيل النص العربي ثم تحويل الاتجاه من اليمين إلى اليسار
+        return get_display(arabic_reshaper.reshape(text))
+    except Exception:
+        return text
+
+
+def reshape_arabic_text(text):
+    """إعادة تشكيل النص العربي لعرضه بشكل صحيح من اليمين لليسار"""
+    if not text or not ARABIC_SUPPORT or not isinstance(text, str):
+        return text
+    return _reshape(text)
+
+
+def _info(cached):
+    info = cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_ratio': round(info.hits / lookups, 4) if lookups else None,
+    }
+
+
+def cache_stats():
+    """عدادات الإصابة/الإخفاق لذاكرة التشكيل والتواريخ (لهذه العملية فقط)"""
+    return {
+        'shaping': _info(_reshape),
+        'dates': _info(_format_with_weekday),
+        'short_dates': _info(_format_short),
+    }
+
+
+def clear_caches():
+    _reshape.cache_clear()
+    _format_with_weekday.cache_clear()
+    _format_short.cache_clear()
@@ -0,0 +1,105 @@
+"""
+البحث عن الوحدات المتاحة في فترة لكل الوحدات (أو وحدات مالك) بعدد ثابت من الاستعلامات
+
+1. الوحدات مع علامة تعارض: NOT EXISTS على الحجوزات المتقاطعة مع الفترة
+   (فهرس unit, start_date, end_date) — الوحدات الحرة تماماً تُعرف من استعلام واحد.
+2. مع min_nights: حجوزات الفترة للوحدات المتعارضة فقط، لإيجاد أول مدة حرة
+   متصلة لا تقل عن min_nights ليلة.
+3. الأسعار من جداول الأسعار المخزنة (pricing.py) دون أسعار الحجوزات لأن
+   المدد المعروضة حرة.
+
+الليالي من from إلى to (شاملة) مثل نافذة التقويم.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef
+
+from .models import Booking
+from .pricing import quote_many
+
+SORT_OPTIONS = ('price', 'name')
+
+
+def free_runs(start, end, booked_ranges):
+    """المدد الحرة المتصلة [(من، إلى)] داخل الفترة بعد طرح الحجوزات"""
+    runs = []
+    cursor = start
+    for booked_start, booked_end in sorted(booked_ranges):
+        if booked_end < cursor:
+            continue
+        if booked_start > cursor:
+            runs.append((cursor, min(booked_start - timedelta(days=1), end)))
+        cursor = max(cursor, booked_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        runs.append((cursor, end))
+    return runs
+
+
+def search_availability(units, start, end, min_nights=None, max_price=None, sort='price'):
+    """الوحدات الحرة في [start, end] مرتبة حسب متوسط سعر الليلة
+
+    بدون min_nights يجب أن تكون الفترة كلها حرة، ومعه يكفي أول مدة حرة متصلة
+    لا تقل عن min_nights ليلة. max_price حد أعلى لمتوسط سعر الليلة في المدة.
+    """
+    overlapping = Booking.objects.filter(
+        unit=OuterRef('pk'), start_date__lte=end, end_date__gte=start
+    )
+    units = units.annotate(has_bookings=Exists(overlapping))
+    if not min_nights:
+        units = units.filter(has_bookings=False)
+    candidates = list(units.select_related('owner').only('id', 'name', 'owner__username'))
+
+    busy_ids = [unit.id for unit in candidates if unit.has_bookings]
+    booked = defaultdict(list)
+    if busy_ids:
+        for unit_id, booked_start, booked_end in Booking.objects.filter(
+            unit_id__in=busy_ids, start_date__lte=end, end_date__gte=start
+        ).values_list('unit_id', 'start_date', 'end_date'):
+            booked[unit_id].append((booked_start, booked_end))
+
+    offers = []
+    for unit in candidates:
+        if unit.has_bookings:
+            runs = [
+                run for run in free_runs(start, end, booked[unit.id])
+                if (run[1] - run[0]).days + 1 >= min_nights
+            ]
+            if not runs:
+                continue
+            free_from, free_to = runs[0]
+        else:
+            free_from, free_to = start, end
+        offers.append((unit, free_from, free_to))
+
+    quotes = quote_many(
+        [(unit.id, free_from, free_to) for unit, free_from, free_to in offers], include_bookings=False
+    )
+
+    results = []
+    for (unit, free_from, free_to), quote in zip(offers, quotes):
+        nights = quote['nights']
+        total = quote['total']
+        nightly = (total / nights).quantize(Decimal('0.01')) if total is not None else None
+        if max_price is not None and (nightly is None or nightly > max_price):
+            continue
+        results.append({
+            'id': unit.id,
+            'name': unit.name,
+            'owner': unit.owner.username if unit.owner else None,
+            'free_from': free_from.strftime('%Y-%m-%d'),
+            'free_to': free_to.strftime('%Y-%m-%d'),
+            'nights': nights,
+            'total_price': float(total) if total is not None else None,
+            'nightly_price': float(nightly) if nightly is not None else None,
+        })
+
+    if sort == 'name':
+        results.sort(key=lambda row: row['name'])
+    else:
+        # الوحدات بلا سعر في آخر القائمة
+        results.sort(key=lambda row: (row['nightly_price'] is None, row['nightly_price'] or 0, row['name']))
+    return results
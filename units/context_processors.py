@@ -1,10 +1,7 @@
 """
 Context processors لإضافة إحصائيات الزيارات إلى templates
 """
-from django.db.models import Count
-from django.utils import timezone
-from datetime import timedelta
-from .models import Visit
+from .rollups import visit_rollup_stats
 
 
 def visit_stats(request):
@@ -13,33 +10,23 @@ def visit_stats(request):
         return {}
     
     try:
-        # إحصائيات شاملة (فقط للمستثمرين، بدون admin/staff)
-        # استبعاد زيارات admin/staff من الإحصائيات
-        total_visits = Visit.objects.exclude(user__is_staff=True).exclude(user__is_superuser=True).count()
-        registered_visits = Visit.objects.filter(user__isnull=False).exclude(user__is_staff=True).exclude(user__is_superuser=True).count()
-        anonymous_visits = Visit.objects.filter(user__isnull=True).count()
-        
-        # إحصائيات حسب المستخدم (فقط المستثمرين)
-        user_visit_stats = (
-            Visit.objects
-            .filter(user__isnull=False)
-            .exclude(user__is_staff=True)
-            .exclude(user__is_superuser=True)
-            .values('user__username', 'user__email')
-            .annotate(visit_count=Count('id'))
-            .order_by('-visit_count')[:20]
-        )
-        
-        # إحصائيات اليوم (فقط المستثمرين)
-        today = timezone.now().date()
-        today_visits = Visit.objects.filter(created_at__date=today).exclude(user__is_staff=True).exclude(user__is_superuser=True).count()
+        # إحصائيات شاملة (فقط للمستثمرين، بدون admin/staff) من الملخصات اليومية
+        stats = visit_rollup_stats()
+        user_visit_stats = [
+            {
+                'user__username': row['user__username'],
+                'user__email': row['user__email'],
+                'visit_count': row['visit_count'],
+            }
+            for row in stats['per_user'][:20]
+        ]
         
         return {
-            'total_visits': total_visits,
-            'registered_visits': registered_visits,
-            'anonymous_visits': anonymous_visits,
-            'user_visit_stats': list(user_visit_stats),
-            'today_visits': today_visits,
+            'total_visits': stats['total_visits'],
+            'registered_visits': stats['registered_visits'],
+            'anonymous_visits': stats['anonymous_visits'],
+            'user_visit_stats': user_visit_stats,
+            'today_visits': stats['today_visits'],
         }
     except Exception:
         # في حالة عدم وجود جدول الزيارات بعد (أثناء migrations)
@@ -0,0 +1,106 @@
+"""
+جداول القيم المكررة في سجل الزيارات (المتصفح، المسار، الصفحة المرجعية)
+
+كل زيارة تحفظ أرقام هذه القيم بدل النصوص الكاملة. تحويل النص إلى رقم يمر
+بذاكرة LRU داخل العملية لكل جدول، فالقيم المتكررة (وهي الغالبية) لا تحتاج
+أي استعلام، ولا يُنشأ سطر جديد إلا لأول ظهور للقيمة.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+
+from .models import VisitPath, VisitReferer, VisitUserAgent
+
+# حقل الزيارة -> نموذج جدول القيم
+VISIT_DIMENSIONS = {
+    'user_agent': VisitUserAgent,
+    'path': VisitPath,
+    'referer': VisitReferer,
+}
+
+
+def intern_cache_size():
+    """عدد القيم المحفوظة في الذاكرة لكل جدول"""
+    return getattr(settings, 'VISIT_INTERN_CACHE_SIZE', 1024)
+
+
+class InternMap:
+    """ذاكرة LRU: نص -> رقم السطر في جدول القيم"""
+
+    def __init__(self, model, max_size=None):
+        self.model = model
+        self.max_size = max_size or intern_cache_size()
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, value):
+        """الرقم من الذاكرة فقط (بدون استعلام)، أو None"""
+        with self._lock:
+            pk = self._ids.get(value)
+            if pk is not None:
+                self._ids.move_to_end(value)
+                self.hits += 1
+            return pk
+
+    def _remember(self, value, pk):
+        with self._lock:
+            self._ids[value] = pk
+            self._ids.move_to_end(value)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def get_id(self, value):
+        """رقم القيمة (مع إنشائها عند أول ظهور)، و None للقيم الفارغة"""
+        if not value:
+            return None
+        pk = self.cached(value)
+        if pk is not None:
+            return pk
+        with self._lock:
+            self.misses += 1
+        digest = self.model.make_digest(value)
+        pk = self.model.objects.filter(digest=digest).values_list('pk', flat=True).first()
+        if pk is None:
+            try:
+                with transaction.atomic(using=router.db_for_write(self.model)):
+                    pk = self.model.objects.create(value=value).pk
+            except IntegrityError:
+                # أنشأتها عملية أخرى في نفس اللحظة
+                pk = self.model.objects.get(digest=digest).pk
+        self._remember(value, pk)
+        return pk
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._ids),
+            'maxsize': self.max_size,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+intern_maps = {field: InternMap(model) for field, model in VISIT_DIMENSIONS.items()}
+
+
+def intern_visit_fields(fields):
+    """نسخة من حقول زيارة مع استبدال النصوص بأرقامها (user_agent -> user_agent_id ...)"""
+    fields = dict(fields)
+    for field, intern_map in intern_maps.items():
+        if field in fields:
+            fields[f'{field}_id'] = intern_map.get_id(fields.pop(field))
+    return fields
+
+
+def intern_cache_stats():
+    return {field: intern_map.stats() for field, intern_map in intern_maps.items()}
@@ -0,0 +1,136 @@
+"""
+تصدير تقارير المدفوعات إلى Excel بوضع الكتابة المتدفقة (write-only)
+
+تُكتب الصفوف واحداً تلو الآخر من مكرّر الاستعلام بأنماط مسمّاة مشتركة
+وخلايا رقمية حقيقية بتنسيق العملة، ويُحفظ الملف في ملف مؤقت على القرص
+بدلاً من الذاكرة حتى يبقى استهلاك الذاكرة ثابتاً مهما كان عدد الصفوف.
+
+escape_formula مشتركة مع ملفات CSV (exports.py و pricing_io.py): النص الذي يبدأ
+بـ = أو + أو - أو @ يُسبق بـ ' حتى لا ينفذه برنامج الجداول كمعادلة.
+"""
+import tempfile
+
+from django.conf import settings
+
+from .arabic import format_date_arabic
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+# تنسيق العملة للخلايا الرقمية
+CURRENCY_FORMAT = '#,##0.00 "ر.س"'
+
+HEADERS = ['الوحدة', 'التاريخ', 'اسم العميل', 'رقم الهاتف', 'الكاش', 'التحويل', 'الإجمالي']
+COLUMN_WIDTHS = {'A': 20, 'B': 25, 'C': 18, 'D': 15, 'E': 15, 'F': 15, 'G': 15}
+
+# بدايات النص التي يقرؤها Excel معادلة (مع الجدولة وبداية السطر)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_chunk_size():
+    """حجم الدفعة عند قراءة الصفوف من قاعدة البيانات"""
+    return getattr(settings, 'REPORT_EXPORT_CHUNK_SIZE', 2000)
+
+
+def escape_formula(value):
+    """نص يبدأ كمعادلة يُسبق بـ ' (الأرقام تبقى كما هي)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def unescape_formula(value):
+    """عكس escape_formula عند قراءة ملف صدّرناه"""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def payment_report_title(query):
+    """عنوان ملف Excel مع معلومات الفلترة"""
+    title_text = 'تقارير المدفوعات - القمة العقارية'
+    for label in query.describe(format_date_arabic):
+        if label:
+            title_text += f' | {label}'
+    return title_text
+
+
+def _register_styles(wb):
+    """تسجيل الأنماط المسمّاة مرة واحدة لكل ملف (بدلاً من تنسيق كل خلية)"""
+    side = Side(style='thin')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    center = Alignment(horizontal='center', vertical='center')
+    fill = PatternFill(start_color="a89078", end_color="a89078", fill_type="solid")
+    white_bold = Font(bold=True, color="FFFFFF", size=12)
+
+    styles = [
+        NamedStyle(name='report_title', font=Font(bold=True, size=14), alignment=center),
+        NamedStyle(name='report_header', font=white_bold, fill=fill, border=border, alignment=center),
+        NamedStyle(name='report_text', border=border, alignment=center),
+        NamedStyle(name='report_money', border=border, alignment=center, number_format=CURRENCY_FORMAT),
+        NamedStyle(name='report_total', font=white_bold, fill=fill, border=border, alignment=center),
+        NamedStyle(name='report_total_money', font=white_bold, fill=fill, border=border,
+                   alignment=center, number_format=CURRENCY_FORMAT),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
+
+
+def _cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def write_payment_report_xlsx(query, title_text, date_formatter, fileobj):
+    """كتابة تقرير المدفوعات إلى fileobj بوضع write-only"""
+    wb = Workbook(write_only=True)
+    _register_styles(wb)
+    ws = wb.create_sheet("تقارير المدفوعات")
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    ws.merged_cells.add('A1:G1')
+
+    ws.append([_cell(ws, title_text, 'report_title')])
+    ws.append([])
+    ws.append([_cell(ws, header, 'report_header') for header in HEADERS])
+
+    for row in query.iter_rows(chunk_size=export_chunk_size()):
+        ws.append([
+            _cell(ws, escape_formula(row.unit_name), 'report_text'),
+            _cell(ws, date_formatter(row.start_date), 'report_text'),
+            _cell(ws, escape_formula(row.customer_name) or '-', 'report_text'),
+            _cell(ws, escape_formula(row.customer_phone) or '-', 'report_text'),
+            _cell(ws, row.cash_amount or 0, 'report_money'),
+            _cell(ws, row.transfer_amount or 0, 'report_money'),
+            _cell(ws, row.total_amount, 'report_money'),
+        ])
+
+    totals = query.totals
+    ws.append([
+        _cell(ws, 'الإجمالي', 'report_total'),
+        _cell(ws, '', 'report_total'),
+        _cell(ws, '', 'report_total'),
+        _cell(ws, '', 'report_total'),
+        _cell(ws, totals['total_cash'], 'report_total_money'),
+        _cell(ws, totals['total_transfer'], 'report_total_money'),
+        _cell(ws, totals['total_all'], 'report_total_money'),
+    ])
+    wb.save(fileobj)
+
+
+def payment_report_xlsx_tempfile(query, title_text, date_formatter):
+    """بناء التقرير في ملف مؤقت وإرجاعه مفتوحاً من البداية (يُحذف عند الإغلاق)"""
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_payment_report_xlsx(query, title_text, date_formatter, tmp)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    return tmp
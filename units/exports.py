@@ -0,0 +1,101 @@
+"""
+تصدير الحجوزات والمصروفات كبيانات خام (CSV و JSON Lines) بشكل متدفق
+
+تُقرأ الصفوف على دفعات عبر values_list().iterator() وتُرسل للعميل فور
+توليدها عبر StreamingHttpResponse، فلا تكبر الذاكرة مع طول الفترة.
+
+نصوص CSV تمر عبر escape_formula (excel.py) لأن العميل يفتح الملف في Excel،
+أما JSON Lines فتبقى كما هي.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from .excel import escape_formula, export_chunk_size
+from .models import Expense
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# (اسم الحقل في الاستعلام، اسم العمود في الملف)
+BOOKING_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('unit_id', 'unit_id'),
+    ('unit__name', 'unit_name'),
+    ('start_date', 'start_date'),
+    ('end_date', 'end_date'),
+    ('customer_name', 'customer_name'),
+    ('customer_phone', 'customer_phone'),
+    ('price_per_day', 'price_per_day'),
+    ('cash_amount', 'cash_amount'),
+    ('transfer_amount', 'transfer_amount'),
+    ('is_owner_booking', 'is_owner_booking'),
+    ('notes', 'notes'),
+    ('created_at', 'created_at'),
+]
+
+EXPENSE_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('unit_id', 'unit_id'),
+    ('unit__name', 'unit_name'),
+    ('category', 'category'),
+    ('price', 'price'),
+    ('description', 'description'),
+    ('owner__username', 'owner'),
+    ('created_at', 'created_at'),
+]
+
+
+class Echo:
+    """كائن يشبه الملف يُرجع ما يُكتب فيه مباشرة (لاستخدام csv.writer مع التدفق)"""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    """تحويل القيم إلى صيغة نصية/رقمية قابلة للتسلسل"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_bookings_queryset(query):
+    return query.bookings.values_list(*[field for field, _ in BOOKING_EXPORT_FIELDS])
+
+
+def export_expenses_queryset(query):
+    expenses = query.apply(Expense.objects.all(), date_field='created_at__date')
+    return expenses.order_by('-created_at').values_list(*[field for field, _ in EXPENSE_EXPORT_FIELDS])
+
+
+def iter_csv(values_qs, columns):
+    """توليد أسطر CSV (مع BOM حتى يفتح Excel النص العربي بشكل صحيح)"""
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(columns)
+    for row in values_qs.iterator(chunk_size=export_chunk_size()):
+        yield writer.writerow([_plain(escape_formula(value)) for value in row])
+
+
+def iter_jsonl(values_qs, columns):
+    """توليد سطر JSON لكل صف"""
+    for row in values_qs.iterator(chunk_size=export_chunk_size()):
+        record = {column: _plain(value) for column, value in zip(columns, row)}
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def iter_export(values_qs, fields, fmt):
+    columns = [column for _, column in fields]
+    if fmt == 'csv':
+        return iter_csv(values_qs, columns)
+    return iter_jsonl(values_qs, columns)
+
+
+def export_filename(prefix, fmt):
+    return f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+
@@ -0,0 +1,123 @@
+"""
+الملخص المالي المُجمّع للوحدات (الإيرادات، المصروفات، الصافي، عدد الحجوزات)
+
+يُحدّث الملخص تدريجياً من signals الحجوزات والمصروفات بدلاً من إعادة حساب
+كامل السجل في كل مرة تُفتح فيها صفحة التقويم أو الأرباح.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Unit, UnitFinancialSummary
+from .profits import CENT, annotate_unit_financials
+
+ZERO = Decimal('0.00')
+
+
+def booking_revenue(cash_amount, transfer_amount, price_per_day, start_date, end_date):
+    """قيمة الحجز: الكاش + التحويل إن وُجدا، وإلا سعر اليوم × عدد الأيام"""
+    cash_transfer_total = (cash_amount or ZERO) + (transfer_amount or ZERO)
+    if cash_transfer_total > 0:
+        return cash_transfer_total
+    if price_per_day is not None:
+        total_days = (end_date - start_date).days + 1
+        return price_per_day * max(total_days, 1)
+    return ZERO
+
+
+def booking_instance_revenue(booking):
+    """قيمة حجز من كائن Booking"""
+    return booking_revenue(
+        booking.cash_amount, booking.transfer_amount, booking.price_per_day,
+        booking.start_date, booking.end_date
+    )
+
+
+def compute_unit_totals(unit_ids=None):
+    """حساب الإجماليات من الجداول الأصلية مباشرة (استعلام مجمّع واحد)
+
+    تُرجع قاموساً {unit_id: {'total_revenue', 'total_expenses', 'booking_count'}}
+    لجميع الوحدات أو للوحدات المحددة فقط.
+    """
+    units = Unit.objects.all()
+    if unit_ids is not None:
+        units = units.filter(id__in=unit_ids)
+    rows = annotate_unit_financials(units).order_by().values_list(
+        'id', 'total_revenue', 'total_expenses', 'booking_count'
+    )
+    return {
+        unit_id: {
+            'total_revenue': revenue.quantize(CENT),
+            'total_expenses': expenses.quantize(CENT),
+            'booking_count': count,
+        }
+        for unit_id, revenue, expenses, count in rows
+    }
+
+
+def rebuild_unit_summaries(unit_ids=None):
+    """إعادة بناء الملخصات من الصفر (تُستخدم من أمر الإدارة وعند غياب الملخص)"""
+    totals = compute_unit_totals(unit_ids)
+    with transaction.atomic():
+        for unit_id, item in totals.items():
+            UnitFinancialSummary.objects.update_or_create(
+                unit_id=unit_id,
+                defaults={
+                    'total_revenue': item['total_revenue'],
+                    'total_expenses': item['total_expenses'],
+                    'net_total': item['total_revenue'] - item['total_expenses'],
+                    'booking_count': item['booking_count'],
+                }
+            )
+    return totals
+
+
+def get_unit_summary(unit):
+    """قراءة ملخص الوحدة في O(1) مع بنائه عند أول طلب"""
+    unit_id = getattr(unit, 'pk', unit)
+    summary = UnitFinancialSummary.objects.filter(unit_id=unit_id).first()
+    if summary is None:
+        rebuild_unit_summaries([unit_id])
+        summary = UnitFinancialSummary.objects.get(unit_id=unit_id)
+    return summary
+
+
+def adjust_unit_summary(unit_id, revenue=ZERO, expenses=ZERO, bookings=0):
+    """تطبيق فرق على ملخص وحدة بتحديث ذري واحد
+
+    إذا لم يكن للوحدة ملخص بعد فلا شيء يُحدّث، وسيُبنى كاملاً عند أول قراءة.
+    """
+    if not unit_id or (not revenue and not expenses and not bookings):
+        return
+    UnitFinancialSummary.objects.filter(unit_id=unit_id).update(
+        total_revenue=F('total_revenue') + revenue,
+        total_expenses=F('total_expenses') + expenses,
+        net_total=F('net_total') + revenue - expenses,
+        booking_count=F('booking_count') + bookings,
+    )
+
+
+def verify_unit_summaries(unit_ids=None):
+    """مقارنة الملخصات المخزنة بالقيم المحسوبة، وإرجاع قائمة الفروقات"""
+    totals = compute_unit_totals(unit_ids)
+    stored = {
+        s.unit_id: s for s in UnitFinancialSummary.objects.filter(unit_id__in=list(totals))
+    }
+    mismatches = []
+    for unit_id, item in totals.items():
+        summary = stored.get(unit_id)
+        if summary is None:
+            mismatches.append((unit_id, 'missing', None, None))
+            continue
+        expected_net = item['total_revenue'] - item['total_expenses']
+        checks = [
+            ('total_revenue', summary.total_revenue, item['total_revenue']),
+            ('total_expenses', summary.total_expenses, item['total_expenses']),
+            ('net_total', summary.net_total, expected_net),
+            ('booking_count', summary.booking_count, item['booking_count']),
+        ]
+        for field, actual, expected in checks:
+            if actual != expected:
+                mismatches.append((unit_id, field, actual, expected))
+    return mismatches
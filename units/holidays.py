@@ -0,0 +1,136 @@
+"""
+الإجازات العامة لكل الوحدات مع استثناءات الوحدات
+
+`public_holidays()` عرض مدمج {التاريخ: PublicHolidayEntry} لكل الإجازات العامة
+واستثناءاتها، يُقرأ في استعلامين ويُحفظ في ذاكرة الأسعار المشتركة حتى يتغير
+أي منها (signals.py). محرك الأسعار (pricing.py) يأخذ سعر الوحدة منه.
+
+أولوية سعر الإجازة للوحدة: إجازة الوحدة نفسها (Holiday)، ثم استثناء الوحدة في
+الإجازة العامة (سعر، أو مضاعف، أو استثناء كامل فتُسعّر الليلة عادياً)، ثم سعر
+الإجازة العامة أو مضاعفها. المضاعف يُضرب في سعر يوم الأسبوع للوحدة.
+
+`collapse_unit_holidays` يُستخدم من أمر `collapse_holidays` (الترحيل 0022 فيه نسخته
+الخاصة بالنماذج التاريخية) لدمج الإجازات المكررة لكل وحدة في إجازة عامة واحدة،
+ويستقبل النماذج كوسائط.
+"""
+from collections import Counter, defaultdict, namedtuple
+from decimal import Decimal
+
+PUBLIC_HOLIDAYS_CACHE_KEY = 'units:public_holidays'
+
+# overrides: {رقم الوحدة: (السعر، المضاعف، مستثناة)}
+PublicHolidayEntry = namedtuple('PublicHolidayEntry', 'name price multiplier overrides')
+
+
+def _apply(price, multiplier, weekday_price):
+    if price is not None:
+        return price
+    if multiplier is not None and weekday_price is not None:
+        return (weekday_price * multiplier).quantize(Decimal('0.01'))
+    return None
+
+
+def holiday_price(entry, unit_id, weekday_price):
+    """سعر الإجازة العامة للوحدة، أو None إن كانت مستثناة أو بلا سعر"""
+    override = entry.overrides.get(unit_id)
+    if override is not None:
+        price, multiplier, is_excluded = override
+        if is_excluded:
+            return None
+        return _apply(price, multiplier, weekday_price)
+    return _apply(entry.price, entry.multiplier, weekday_price)
+
+
+def load_public_holidays():
+    from .models import PublicHoliday, PublicHolidayOverride
+
+    overrides = defaultdict(dict)
+    for holiday_id, unit_id, price, multiplier, is_excluded in PublicHolidayOverride.objects.values_list(
+        'holiday_id', 'unit_id', 'price', 'multiplier', 'is_excluded'
+    ):
+        overrides[holiday_id][unit_id] = (price, multiplier, is_excluded)
+    return {
+        holiday_date: PublicHolidayEntry(name, price, multiplier, overrides.get(holiday_id, {}))
+        for holiday_id, holiday_date, name, price, multiplier in PublicHoliday.objects.values_list(
+            'id', 'holiday_date', 'holiday_name', 'price', 'multiplier'
+        )
+    }
+
+
+def public_holidays():
+    """{التاريخ: PublicHolidayEntry} من الذاكرة المؤقتة"""
+    from .pricing import price_table_cache_seconds, pricing_cache
+
+    cache = pricing_cache()
+    holidays = cache.get(PUBLIC_HOLIDAYS_CACHE_KEY)
+    if holidays is None:
+        holidays = load_public_holidays()
+        cache.set(PUBLIC_HOLIDAYS_CACHE_KEY, holidays, price_table_cache_seconds())
+    return holidays
+
+
+def invalidate_public_holidays():
+    from .pricing import pricing_cache
+
+    pricing_cache().delete(PUBLIC_HOLIDAYS_CACHE_KEY)
+
+
+def unit_holidays(unit_id):
+    """إجازات الوحدة للعرض: إجازاتها الخاصة والإجازات العامة بسعرها للوحدة"""
+    from .models import Holiday
+    from .pricing import price_tables
+
+    holidays = [
+        {'holiday_name': name, 'holiday_date': holiday_date, 'price': price, 'is_public': False}
+        for name, holiday_date, price in Holiday.objects.filter(unit_id=unit_id).values_list(
+            'holiday_name', 'holiday_date', 'price'
+        )
+    ]
+    own_dates = {holiday['holiday_date'] for holiday in holidays}
+    weekday_prices = price_tables([unit_id])[unit_id].weekday
+    for holiday_date, entry in public_holidays().items():
+        if holiday_date in own_dates:
+            continue
+        price = holiday_price(entry, unit_id, weekday_prices.get(holiday_date.weekday()))
+        if price is not None:
+            holidays.append({'holiday_name': entry.name, 'holiday_date': holiday_date, 'price': price, 'is_public': True})
+    holidays.sort(key=lambda holiday: holiday['holiday_date'])
+    return holidays
+
+
+def collapse_unit_holidays(holiday_model, public_model, override_model, unit_model, using='default'):
+    """دمج الإجازات المكررة لعدة وحدات بنفس التاريخ في إجازة عامة واحدة
+
+    اسم الإجازة وسعرها الأكثر تكراراً يصبحان الإجازة العامة، والوحدات بسعر آخر
+    تأخذ استثناءً بسعرها، والوحدات التي لم تكن لها الإجازة تُستثنى منها، فلا
+    يتغير سعر أي ليلة. لا يُدمج التاريخ إلا إن قلّ عدد الأسطر، ولا يُمس تاريخ له
+    إجازة عامة من قبل. تُرجع (عدد الإجازات العامة، عدد الأسطر المحذوفة).
+    """
+    unit_ids = set(unit_model.objects.using(using).values_list('id', flat=True))
+    existing = set(public_model.objects.using(using).values_list('holiday_date', flat=True))
+    by_date = defaultdict(list)
+    for row in holiday_model.objects.using(using).values_list('id', 'unit_id', 'holiday_date', 'holiday_name', 'price'):
+        by_date[row[2]].append(row)
+
+    created = 0
+    removed = 0
+    for holiday_date, rows in sorted(by_date.items()):
+        if len(rows) < 2 or holiday_date in existing:
+            continue
+        name = Counter(row[3] for row in rows).most_common(1)[0][0]
+        price = Counter(row[4] for row in rows).most_common(1)[0][0]
+        priced = [(unit_id, row_price) for _, unit_id, _, _, row_price in rows if row_price != price]
+        excluded = unit_ids - {row[1] for row in rows}
+        if 1 + len(priced) + len(excluded) >= len(rows):
+            continue
+        holiday = public_model.objects.using(using).create(
+            holiday_name=name, holiday_date=holiday_date, price=price
+        )
+        override_model.objects.using(using).bulk_create(
+            [override_model(holiday=holiday, unit_id=unit_id, price=row_price) for unit_id, row_price in priced]
+            + [override_model(holiday=holiday, unit_id=unit_id, is_excluded=True) for unit_id in sorted(excluded)]
+        )
+        holiday_model.objects.using(using).filter(id__in=[row[0] for row in rows]).delete()
+        created += 1
+        removed += len(rows)
+    return created, removed
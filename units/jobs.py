@@ -0,0 +1,285 @@
+"""
+مهام توليد التقارير في الخلفية
+
+يرسل الموظف فلاتر التقرير فتُحفظ مهمة ReportJob، ثم يولّد عامل محلي الملف
+(خيط ضمن العملية نفسها، أو أمر `manage.py run_report_jobs` مستقل) ويحفظه،
+ويستعلم المتصفح عن الحالة حتى يصبح الملف جاهزاً للتحميل.
+الطلبات المتطابقة قيد الانتظار أو التنفيذ تُدمج في مهمة واحدة.
+
+مع عامل الخيوط تضيع المهام الجارية عند توقف العملية، لذلك تُعاد المهام المتوقفة
+إلى الانتظار وتُجدول المهام المنتظرة عند أول طلب تخدمه كل عملية (resume_report_jobs)،
+وعند طلب تقرير مطابق لمهمة متوقفة أو الاستعلام عن حالتها.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .arabic import format_date_arabic
+from .excel import payment_report_title, write_payment_report_xlsx
+from .models import Report, ReportJob, Unit
+from .pdf import write_payment_report_pdf
+from .reports import PaymentReportQuery
+
+logger = logging.getLogger(__name__)
+
+# نوع الملف: (الامتداد، نوع المحتوى)
+JOB_KINDS = {
+    'pdf': ('.pdf', 'application/pdf'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+ACTIVE_STATUSES = (ReportJob.STATUS_PENDING, ReportJob.STATUS_RUNNING)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def jobs_backend():
+    """'thread' لتنفيذ المهام داخل العملية، أو 'command' لتركها لأمر run_report_jobs"""
+    return getattr(settings, 'REPORT_JOBS_BACKEND', 'thread')
+
+
+def stale_after():
+    """المدة التي تُعتبر بعدها مهمة "قيد التنفيذ" متوقفة (انهارت عمليتها)"""
+    return timedelta(seconds=getattr(settings, 'REPORT_JOBS_STALE_SECONDS', 1800))
+
+
+def params_hash(kind, params, attach_to_owner=False):
+    """بصمة ثابتة لنوع الملف والفلاتر (لدمج الطلبات المتطابقة)"""
+    payload = json.dumps(
+        {'kind': kind, 'params': params, 'attach': bool(attach_to_owner)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_JOBS_MAX_WORKERS', 1),
+                thread_name_prefix='report-job',
+            )
+        return _executor
+
+
+def _run_in_thread(job_id):
+    """تنفيذ مهمة من خيط العامل مع اتصال قاعدة بيانات خاص به"""
+    close_old_connections()
+    try:
+        run_report_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_report_job(job_id):
+    """تشغيل المهمة في خيوط هذه العملية بعد الالتزام (مع عامل الخيوط فقط)"""
+    if jobs_backend() == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id))
+
+
+def submit_report_job(kind, query, user=None, attach_to_owner=False):
+    """إنشاء مهمة تقرير أو إرجاع المهمة المطابقة الجارية: (job, created)"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f'نوع ملف غير مدعوم: {kind}')
+    params = query.params()
+    key = params_hash(kind, params, attach_to_owner)
+
+    with transaction.atomic():
+        # المهمة المطابقة المتوقفة تعود للانتظار وتُدمج فيها هذه الطلبية بدلاً من تكرارها
+        revived = requeue_stale_jobs(params_hash=key)
+        job = (
+            ReportJob.objects.filter(params_hash=key, status__in=ACTIVE_STATUSES)
+            .order_by('created_at')
+            .first()
+        )
+        if job is not None:
+            if revived:
+                schedule_report_job(job.pk)
+            return job, False
+        job = ReportJob.objects.create(
+            kind=kind,
+            params=params,
+            params_hash=key,
+            attach_to_owner=attach_to_owner,
+            requested_by=user if user is not None and user.is_authenticated else None,
+        )
+
+    schedule_report_job(job.pk)
+    return job, True
+
+
+def job_query(job):
+    """إعادة بناء فلاتر التقرير من معاملات المهمة"""
+    params = job.params or {}
+    return PaymentReportQuery(
+        unit_id=params.get('unit_id', ''),
+        report_type=params.get('report_type', 'all'),
+        selected_date=params.get('date', ''),
+    )
+
+
+def job_filename(job):
+    extension = JOB_KINDS[job.kind][0]
+    return f'payment_reports_{job.pk}_{job.created_at.strftime("%Y%m%d_%H%M%S")}{extension}'
+
+
+def _attach_report(job, query):
+    """إضافة ملف PDF إلى تقارير مالك الوحدة (عند تحديد وحدة لها مالك)"""
+    if query.unit_pk is None:
+        return None
+    owner_id = Unit.objects.filter(pk=query.unit_pk).values_list('owner_id', flat=True).first()
+    if owner_id is None:
+        return None
+    title = 'تقرير المدفوعات'
+    _, report_label = query.describe(format_date_arabic)
+    if report_label:
+        title = f'{title} - {report_label}'
+    return Report.objects.create(owner_id=owner_id, title=title, file=job.file.name)
+
+
+def _render(job):
+    """توليد الملف في ملف مؤقت ثم حفظه في مساحة التخزين"""
+    query = job_query(job)
+    extension = JOB_KINDS[job.kind][0]
+    with tempfile.TemporaryFile(suffix=extension) as tmp:
+        if job.kind == 'pdf':
+            write_payment_report_pdf(query, tmp)
+        else:
+            write_payment_report_xlsx(query, payment_report_title(query), format_date_arabic, tmp)
+        tmp.seek(0)
+        job.file.save(job_filename(job), File(tmp), save=False)
+
+
+def _finish(job):
+    """ربط الملف بالمهمة وبتقارير المالك في معاملة واحدة (بعد التوليد حتى لا يطول قفل الكتابة)"""
+    with transaction.atomic():
+        if job.attach_to_owner and job.kind == 'pdf':
+            job.report = _attach_report(job, job_query(job))
+        job.status = ReportJob.STATUS_DONE
+        job.error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'report', 'status', 'error', 'finished_at'])
+
+
+def _discard_file(job):
+    """حذف ملف مهمة فشلت من مساحة التخزين (لا يبقى ملف لا تشير إليه مهمة ولا تقرير)"""
+    if not job.file:
+        return
+    try:
+        job.file.delete(save=False)
+    except Exception:
+        logger.exception('تعذر حذف ملف المهمة %s', job.pk)
+
+
+def run_report_job(job_id):
+    """تنفيذ مهمة واحدة إن كانت ما زالت في الانتظار (الحجز ذري بين العمال)"""
+    claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.STATUS_PENDING).update(
+        status=ReportJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        _render(job)
+        _finish(job)
+    except Exception as exc:
+        logger.exception('فشل توليد التقرير للمهمة %s', job_id)
+        # الملف حُفظ لكن ربطه بالمهمة أو بالتقرير فشل (وتراجع)
+        _discard_file(job)
+        job.report = None
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(exc) or exc.__class__.__name__
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'report', 'status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(**filters):
+    """إعادة المهام المتوقفة في حالة "قيد التنفيذ" إلى الانتظار (كلها أو المطابقة لـ filters)"""
+    cutoff = timezone.now() - stale_after()
+    return ReportJob.objects.filter(
+        status=ReportJob.STATUS_RUNNING, started_at__lt=cutoff, **filters
+    ).update(status=ReportJob.STATUS_PENDING, started_at=None)
+
+
+def resume_report_jobs():
+    """إعادة المهام المتوقفة وجدولة كل المهام المنتظرة في خيوط هذه العملية"""
+    requeued = requeue_stale_jobs()
+    job_ids = list(
+        ReportJob.objects.filter(status=ReportJob.STATUS_PENDING)
+        .order_by('created_at').values_list('id', flat=True)
+    )
+    for job_id in job_ids:
+        # تنفيذ مهمة منتظرة مرتين لا يضر: الحجز في run_report_job ذري
+        _get_executor().submit(_run_in_thread, job_id)
+    return requeued, len(job_ids)
+
+
+def _resume_on_first_request(sender, **kwargs):
+    request_started.disconnect(dispatch_uid='report_jobs_resume')
+    try:
+        requeued, pending = resume_report_jobs()
+    except Exception:
+        logger.exception('تعذر استئناف مهام التقارير')
+        return
+    if requeued or pending:
+        logger.info('استؤنفت مهام التقارير: %s متوقفة، %s منتظرة', requeued, pending)
+
+
+def connect_resume_on_first_request():
+    """استئناف المهام عند أول طلب (لا في ready: العملية الأم لـ autoreload وأوامر الإدارة لا تخدم طلبات)"""
+    if jobs_backend() == 'thread':
+        request_started.connect(_resume_on_first_request, dispatch_uid='report_jobs_resume')
+
+
+def run_pending_jobs(limit=None):
+    """تنفيذ المهام المنتظرة بالترتيب (يُستخدم من أمر run_report_jobs)"""
+    job_ids = ReportJob.objects.filter(status=ReportJob.STATUS_PENDING).order_by('created_at')
+    job_ids = job_ids.values_list('id', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+    finished = []
+    for job_id in list(job_ids):
+        job = run_report_job(job_id)
+        if job is not None:
+            finished.append(job)
+    return finished
+
+
+def job_payload(job):
+    """حالة المهمة كقاموس JSON لنقطة الاستعلام"""
+    payload = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('units:report_job_status', args=[job.pk]),
+        'download_url': None,
+        'report_id': job.report_id,
+        'error': job.error or None,
+    }
+    if job.status == ReportJob.STATUS_DONE and job.file:
+        payload['download_url'] = reverse('units:report_job_download', args=[job.pk])
+    return payload
+
+
+def job_download_name(job):
+    return os.path.basename(job.file.name)
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+
+from units.retention import (
+    VACUUM_MODES, archive_cutoff, archive_day, archive_dir, day_visits, days_to_archive,
+    reclaim_space,
+)
+
+
+class Command(BaseCommand):
+    help = 'أرشفة الزيارات الأقدم من فترة الاحتفاظ إلى ملفات gzip JSONL ثم حذفها وضغط قاعدة البيانات'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='فترة الاحتفاظ بالأيام (الافتراضي VISIT_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='عدد الزيارات المحذوفة في كل معاملة (الافتراضي VISIT_ARCHIVE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='ثوانٍ الانتظار بين دفعات الحذف لإفساح المجال للكتابات الأخرى'
+        )
+        parser.add_argument(
+            '--vacuum', choices=VACUUM_MODES, default='auto',
+            help=(
+                'طريقة استرجاع المساحة بعد الحذف (الافتراضي auto: incremental_vacuum فقط إن كانت '
+                'القاعدة بوضع auto_vacuum=INCREMENTAL). convert تحوّل القاعدة لهذا الوضع مرة واحدة '
+                'و full تنفذ VACUUM، وكلاهما يقفل القاعدة طوال إعادة كتابتها'
+            )
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='عرض الأيام التي ستُؤرشف دون تعديل'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        days = days_to_archive(cutoff)
+        if not days:
+            self.stdout.write(f'لا توجد زيارات أقدم من {cutoff}')
+            return
+
+        if options['dry_run']:
+            for day in days:
+                self.stdout.write(f'{day}: {day_visits(day).count()} زيارة')
+            self.stdout.write(f'{len(days)} يوم سيُؤرشف إلى {archive_dir()}')
+            return
+
+        total_archived = total_deleted = 0
+        for day in days:
+            archived, deleted = archive_day(day, options['batch_size'], options['pause'])
+            total_archived += archived
+            total_deleted += deleted
+            self.stdout.write(f'{day}: أُرشفت {archived} وحُذفت {deleted}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'تمت أرشفة {total_archived} زيارة وحذف {total_deleted} من {len(days)} يوم'
+        ))
+
+        mode = reclaim_space(options['vacuum'])
+        if mode == 'skipped':
+            self.stdout.write(self.style.WARNING(
+                'القاعدة ليست بوضع auto_vacuum=INCREMENTAL فلم تُسترجع المساحة. '
+                'للتحويل مرة واحدة في وقت صيانة: archive_visits --vacuum convert'
+            ))
+        elif mode:
+            self.stdout.write(f'تم استرجاع المساحة ({mode})')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from units.models import Booking, BookingNight
+from units.occupancy import backfill_nights
+
+
+class Command(BaseCommand):
+    help = 'بناء جدول الليالي المحجوزة للحجوزات الموجودة وعرض الحجوزات المتعارضة'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='حذف كل الليالي وإعادة بنائها من الحجوزات (في معاملة واحدة)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='عدد الليالي المدرجة في كل دفعة'
+        )
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(BookingNight)
+        with transaction.atomic(using=using):
+            if options['rebuild']:
+                deleted, _ = BookingNight.objects.using(using).all().delete()
+                self.stdout.write(f'حُذفت {deleted} ليلة')
+            created, conflicts = backfill_nights(Booking, BookingNight, using, options['batch_size'])
+
+        for booking_id, unit_id, night in conflicts:
+            self.stdout.write(self.style.WARNING(
+                f'الحجز {booking_id}: ليلة {night} في الوحدة {unit_id} محجوزة بحجز آخر'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'أُضيفت {created} ليلة، وتعارضات: {len(conflicts)}'
+        ))
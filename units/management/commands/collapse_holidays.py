@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from units.holidays import collapse_unit_holidays
+from units.models import Holiday, PublicHoliday, PublicHolidayOverride, Unit
+
+
+class Command(BaseCommand):
+    help = 'دمج إجازات الوحدات المكررة بنفس التاريخ في إجازات عامة مع استثناءات الوحدات'
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(PublicHoliday)
+        with transaction.atomic(using=using):
+            created, removed = collapse_unit_holidays(Holiday, PublicHoliday, PublicHolidayOverride, Unit, using)
+        # إشارات الإجازات تحدّث الأسعار المخزنة بعد الالتزام
+        self.stdout.write(self.style.SUCCESS(
+            f'أُنشئت {created} إجازة عامة بدلاً من {removed} إجازة للوحدات'
+        ))
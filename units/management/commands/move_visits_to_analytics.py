@@ -0,0 +1,220 @@
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from units.dimensions import VISIT_DIMENSIONS, intern_visit_fields
+from units.models import Visit, VisitDailyRollup
+from units.rollups import STATS_CACHE_KEY, add_rollup_counts, add_visits_to_rollups
+from units.routers import analytics_alias
+
+VISIT_FIELDS = ('session_key', 'ip_address', 'weight', 'created_at', 'user_id')
+# الزيارة المنسوخة تُعرف بكل حقولها لأن أرقامها في قاعدة التحليلات جديدة
+VISIT_KEY_FIELDS = VISIT_FIELDS + tuple(f'{field}_id' for field in VISIT_DIMENSIONS)
+
+# أعمدة الجدول قبل 0016 (النصوص داخل الزيارة، وبدون weight قبل 0019)
+LEGACY_VISIT_COLUMNS = (
+    'id', 'session_key', 'ip_address', 'user_agent', 'path', 'referer', 'weight', 'created_at', 'user_id',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'نقل الزيارات القديمة وملخصاتها من القاعدة الافتراضية إلى قاعدة التحليلات '
+        '(بعد migrate --database=analytics)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=DEFAULT_DB_ALIAS,
+            help='القاعدة التي فيها الزيارات القديمة (الافتراضي default)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='عدد الزيارات المنقولة في كل دفعة'
+        )
+        parser.add_argument(
+            '--keep-source', action='store_true',
+            help='نسخ دون حذف من القاعدة الأصلية (تشغيله مرة ثانية يكرر الملخصات اليومية)'
+        )
+
+    def handle(self, *args, **options):
+        target = analytics_alias()
+        source = options['source']
+        if target is None:
+            raise CommandError('قاعدة التحليلات غير معرّفة في DATABASES (ANALYTICS_DATABASE)')
+        if source == target:
+            raise CommandError('القاعدة المصدر هي نفسها قاعدة التحليلات')
+        tables = connections[source].introspection.table_names()
+        if Visit._meta.db_table not in tables:
+            self.stdout.write(f'لا يوجد سجل زيارات في {source}')
+            return
+
+        self.batch_size = options['batch_size']
+        self.keep_source = options['keep_source']
+        self.source = source
+
+        columns = self.source_columns()
+        if 'user_agent_id' in columns:
+            dimension_ids = {field: self.move_dimension(model) for field, model in VISIT_DIMENSIONS.items()}
+            visits = self.move_visits(dimension_ids)
+        else:
+            # المصدر لم تمر عليه 0016 وما بعدها (الموجّه يحصرها في قاعدة التحليلات)
+            visits = self.move_legacy_visits(columns)
+        rollups = self.move_rollups() if VisitDailyRollup._meta.db_table in tables else 0
+        if not self.keep_source:
+            for model in VISIT_DIMENSIONS.values():
+                if model._meta.db_table in tables:
+                    model.objects.using(source).all().delete()
+        cache.delete(STATS_CACHE_KEY)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'تم نقل {visits} زيارة و {rollups} ملخص يومي من {source} إلى {target}'
+        ))
+
+    def move_dimension(self, model):
+        """نسخ جدول قيم إلى قاعدة التحليلات: {الرقم في المصدر: الرقم في الهدف}"""
+        rows = list(model.objects.using(self.source).values_list('id', 'value', 'digest'))
+        target = model.objects.all()
+        existing = dict(target.filter(digest__in=[digest for _, _, digest in rows]).values_list('digest', 'id'))
+        target.bulk_create(
+            [model(value=value, digest=digest) for _, value, digest in rows if digest not in existing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        ids = dict(target.filter(digest__in=[digest for _, _, digest in rows]).values_list('digest', 'id'))
+        return {pk: ids[digest] for pk, _, digest in rows}
+
+    def uncopied(self, rows, fields=lambda row: row):
+        """الزيارات التي لم تُنسخ بعد إلى قاعدة التحليلات
+
+        النسخ والحذف من المصدر في قاعدتين فلا تجمعهما معاملة واحدة: إن توقف الأمر
+        بينهما تبقى الدفعة في المصدر وقد نُسخت. لا تُحفظ أرقام المصدر لأنها قد تتعارض
+        مع زيارات سُجلت في قاعدة التحليلات، فتُقارن الدفعة بالزيارات الموجودة في
+        نفس الأوقات بكل حقولها، وتُنسخ الزيادة فقط (زيارتان متطابقتان تبقيان اثنتين).
+        fields: دالة تُرجع حقول Visit من عنصر الدفعة. يُستدعى داخل معاملة الكتابة
+        في قاعدة التحليلات.
+        """
+        copied = Counter(
+            Visit.objects.filter(created_at__in={fields(row)['created_at'] for row in rows})
+            .order_by().values_list(*VISIT_KEY_FIELDS)
+        )
+        fresh = []
+        for row in rows:
+            key = tuple(fields(row)[field] for field in VISIT_KEY_FIELDS)
+            if copied[key]:
+                copied[key] -= 1
+            else:
+                fresh.append(row)
+        return fresh
+
+    def move_visits(self, dimension_ids):
+        """نسخ الزيارات على دفعات (بأرقام جديدة) وحذف كل دفعة من المصدر بعد نسخها
+
+        تشغيل الأمر مرة ثانية بعد توقفه لا يكرر الزيارات (انظر uncopied).
+        """
+        source_visits = Visit.objects.using(self.source).order_by('id')
+        fields = ('id',) + VISIT_KEY_FIELDS
+        moved = 0
+        last_id = 0
+        while True:
+            batch = list(source_visits.filter(id__gt=last_id).values(*fields)[:self.batch_size])
+            if not batch:
+                return moved
+            last_id = batch[-1]['id']
+            for row in batch:
+                row.pop('id')
+                for field in VISIT_DIMENSIONS:
+                    pk = row[f'{field}_id']
+                    row[f'{field}_id'] = dimension_ids[field][pk] if pk else None
+            with transaction.atomic(using=analytics_alias()):
+                Visit.objects.bulk_create(
+                    [Visit(**row) for row in self.uncopied(batch)], batch_size=self.batch_size
+                )
+            if not self.keep_source:
+                with transaction.atomic(using=self.source):
+                    source_visits.filter(id__lte=last_id).delete()
+            moved += len(batch)
+            self.stdout.write(f'نُقلت {moved} زيارة')
+
+    def source_columns(self):
+        connection = connections[self.source]
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(cursor, Visit._meta.db_table)
+        return {column.name for column in description}
+
+    def source_datetime(self, value):
+        """قيمة created_at كما يقرؤها Django من قاعدة المصدر"""
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if value is not None and settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value, connections[self.source].timezone)
+        return value
+
+    def move_legacy_visits(self, columns):
+        """نسخ زيارات الجدول القديم بـ SQL مباشر: النصوص تُحوَّل إلى أرقام جداول القيم
+        في قاعدة التحليلات، والوزن 1 إن لم يكن العمود موجوداً، وتُضاف الزيارات إلى
+        الملخصات اليومية لأن المصدر لا ملخصات فيه. الزيارات المنسوخة سابقاً تُتجاوز
+        هي وملخصاتها (انظر uncopied)"""
+        connection = connections[self.source]
+        quote = connection.ops.quote_name
+        table = quote(Visit._meta.db_table)
+        selected = [column for column in LEGACY_VISIT_COLUMNS if column in columns]
+        select_sql = (
+            f'SELECT {", ".join(quote(column) for column in selected)} FROM {table} '
+            f'WHERE {quote("id")} > %s ORDER BY {quote("id")} LIMIT %s'
+        )
+        delete_sql = f'DELETE FROM {table} WHERE {quote("id")} <= %s'
+        moved = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(select_sql, [last_id, self.batch_size])
+                batch = [dict(zip(selected, row)) for row in cursor.fetchall()]
+            if not batch:
+                return moved
+            last_id = batch[-1]['id']
+            for row in batch:
+                row.pop('id')
+                row['created_at'] = self.source_datetime(row['created_at'])
+                row.setdefault('weight', 1)
+            with transaction.atomic(using=analytics_alias()):
+                visits = self.uncopied(
+                    [(intern_visit_fields(row), row) for row in batch], fields=itemgetter(0)
+                )
+                Visit.objects.bulk_create([Visit(**fields) for fields, _ in visits], batch_size=self.batch_size)
+                add_visits_to_rollups([row for _, row in visits])
+            if not self.keep_source:
+                with transaction.atomic(using=self.source), connection.cursor() as cursor:
+                    cursor.execute(delete_sql, [last_id])
+            moved += len(batch)
+            self.stdout.write(f'نُقلت {moved} زيارة')
+
+    def move_rollups(self):
+        """دمج الملخصات اليومية في ملخصات قاعدة التحليلات (تشمل الأيام المؤرشفة)"""
+        source_rollups = VisitDailyRollup.objects.using(self.source).order_by('id')
+        moved = 0
+        last_id = 0
+        while True:
+            batch = list(
+                source_rollups.filter(id__gt=last_id)
+                .values_list('id', 'date', 'user_id', 'path_bucket', 'count')[:self.batch_size]
+            )
+            if not batch:
+                return moved
+            last_id = batch[-1][0]
+            counts = Counter()
+            for _, day, user_id, bucket, count in batch:
+                counts[(day, user_id, bucket)] += count
+            # الملخصات تُجمع ولا تُقارن، فحذف الدفعة من المصدر يبقى معلقاً حتى تُضاف:
+            # إن فشلت الإضافة بقيت الدفعة في المصدر ولم تُحسب مرتين
+            with transaction.atomic(using=self.source):
+                if not self.keep_source:
+                    source_rollups.filter(id__lte=last_id).delete()
+                add_rollup_counts(counts)
+            moved += len(batch)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from units.finance import rebuild_unit_summaries, verify_unit_summaries
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء الملخصات المالية للوحدات أو التحقق من مطابقتها للحجوزات والمصروفات'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--unit', type=int, action='append', dest='unit_ids',
+            help='رقم الوحدة (يمكن تكراره). الافتراضي: جميع الوحدات'
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='التحقق فقط دون تعديل، مع خطأ عند وجود فروقات'
+        )
+
+    def handle(self, *args, **options):
+        unit_ids = options['unit_ids']
+
+        if options['verify']:
+            mismatches = verify_unit_summaries(unit_ids)
+            for unit_id, field, actual, expected in mismatches:
+                self.stdout.write(f'الوحدة {unit_id}: {field} المخزن={actual} المتوقع={expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} فرق في الملخصات المالية')
+            self.stdout.write(self.style.SUCCESS('الملخصات المالية مطابقة'))
+            return
+
+        totals = rebuild_unit_summaries(unit_ids)
+        mismatches = verify_unit_summaries(unit_ids)
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} فرق بعد إعادة البناء')
+        self.stdout.write(self.style.SUCCESS(f'تمت إعادة بناء {len(totals)} ملخص'))
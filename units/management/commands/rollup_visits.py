@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from units.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'تحديث ملخصات الزيارات اليومية من سجل الزيارات (من آخر يوم مُجمّع حتى اليوم)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='إعادة الحساب ابتداءً من تاريخ محدد (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='إعادة حساب كل الأيام الموجودة في سجل الزيارات'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('صيغة التاريخ غير صحيحة، استخدم YYYY-MM-DD')
+        elif options['full']:
+            since = datetime.min.date()
+
+        start, rows = rebuild_rollups(since)
+        if start is None:
+            self.stdout.write('لا توجد زيارات لتجميعها')
+            return
+        self.stdout.write(self.style.SUCCESS(f'تم تجميع الزيارات من {start}: {rows} صف'))
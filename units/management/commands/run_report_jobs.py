@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from units.jobs import requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'عامل مهام التقارير: يولّد ملفات PDF/Excel المنتظرة ويحفظها'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='تنفيذ المهام المنتظرة حالياً ثم الخروج'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='ثوانٍ الانتظار بين كل فحص للمهام الجديدة (الافتراضي 5)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f'أُعيدت {requeued} مهمة متوقفة إلى الانتظار')
+
+            for job in run_pending_jobs():
+                if job.status == job.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f'المهمة {job.pk}: {job.file.name}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'المهمة {job.pk}: {job.error}'))
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
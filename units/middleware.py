@@ -1,9 +1,13 @@
 """
-Middleware لتتبع زيارات المستخدمين للموقع
+Middleware لتتبع زيارات المستخدمين للموقع، وحفظ الجلسات بدون كتابة مع كل طلب
 """
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
 from django.utils.deprecation import MiddlewareMixin
-from .models import Visit
-from django.utils import timezone
+from .tracking import path_tracked, visit_weight
+from .visits import record_visit
 
 
 class VisitTrackingMiddleware(MiddlewareMixin):
@@ -13,16 +17,9 @@ class VisitTrackingMiddleware(MiddlewareMixin):
     
     def process_request(self, request):
         """تسجيل الزيارة عند كل طلب"""
-        # تجاهل طلبات AJAX والـ static files
-        if request.path.startswith('/static/') or request.path.startswith('/media/'):
-            return None
-        
-        # تجاهل طلبات admin (نريد فقط تتبع زيارات الموقع الرئيسي)
-        if request.path.startswith('/admin/'):
-            return None
-        
-        # تجاهل طلبات API
-        if request.path.startswith('/api/'):
+        # تجاهل المسارات المستبعدة (static، media، admin، api...) - انظر tracking.py
+        path = request.path
+        if not path_tracked(path):
             return None
         
         # الحصول على معلومات المستخدم
@@ -32,23 +29,28 @@ class VisitTrackingMiddleware(MiddlewareMixin):
         if user and (user.is_staff or user.is_superuser):
             return None
         
+        # تجاهل الروبوتات، وأخذ عينة من زيارات غير المسجلين (بوزن يعوض المتروك)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        weight = visit_weight(user_agent, user)
+        if not weight:
+            return None
+        
         session_key = request.session.session_key
         
         # الحصول على معلومات الطلب
         ip_address = self.get_client_ip(request)
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        path = request.path
         referer = request.META.get('HTTP_REFERER', '')
         
-        # تسجيل الزيارة (فقط للمستثمرين)
+        # تسجيل الزيارة (فقط للمستثمرين) - على دفعات في الخلفية دون انتظار قاعدة البيانات
         try:
-            Visit.objects.create(
+            record_visit(
                 user=user,
                 session_key=session_key,
                 ip_address=ip_address,
                 user_agent=user_agent,
                 path=path,
-                referer=referer if referer else None
+                referer=referer if referer else None,
+                weight=weight
             )
         except Exception:
             # تجاهل الأخطاء في التسجيل لتجنب تعطيل الموقع
@@ -65,3 +67,35 @@ class VisitTrackingMiddleware(MiddlewareMixin):
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
+
+
+class ThrottledSessionMiddleware(SessionMiddleware):
+    """
+    بديل SessionMiddleware: تمديد صلاحية الجلسة دون حفظها مع كل طلب
+
+    مع SESSION_SAVE_EVERY_REQUEST = False لا تُحفظ الجلسة إلا إذا تغيرت، أو إذا
+    مضى جزء SESSION_REFRESH_FRACTION من مدتها (48 ساعة) منذ آخر تمديد، فيُعاد
+    حفظها وإرسال الكوكي بمدة جديدة. مدة "تذكرني" وجلسة المتصفح من set_expiry
+    في login_view تبقى كما هي، وإنما يتأخر التمديد حتى هذا الجزء من المدة.
+    """
+    REFRESHED_KEY = '_refreshed_at'
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and not settings.SESSION_SAVE_EVERY_REQUEST:
+            self.refresh_if_due(session)
+        return super().process_response(request, response)
+
+    def refresh_if_due(self, session):
+        # جلسة لم تُقرأ في هذا الطلب (أو فارغة) لا تحتاج تمديداً
+        if not session.accessed or session.is_empty():
+            return
+        now = int(time.time())
+        refreshed_at = session.get(self.REFRESHED_KEY)
+        fraction = getattr(settings, 'SESSION_REFRESH_FRACTION', 0.1)
+        if (
+            session.modified
+            or refreshed_at is None
+            or now - refreshed_at >= fraction * session.get_expiry_age()
+        ):
+            session[self.REFRESHED_KEY] = now
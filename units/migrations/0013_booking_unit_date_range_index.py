@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0012_holiday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['unit', 'start_date', 'end_date'], name='units_booki_unit_id_1f88e7_idx'),
+        ),
+    ]
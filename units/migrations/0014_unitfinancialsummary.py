@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0013_booking_unit_date_range_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitFinancialSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='إجمالي الحجوزات')),
+                ('total_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='إجمالي المصروفات')),
+                ('net_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='الصافي')),
+                ('booking_count', models.PositiveIntegerField(default=0, verbose_name='عدد الحجوزات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+                ('unit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='financial_summary', to='units.unit', verbose_name='الوحدة')),
+            ],
+            options={
+                'verbose_name': 'ملخص مالي للوحدة',
+                'verbose_name_plural': 'الملخصات المالية للوحدات',
+            },
+        ),
+    ]
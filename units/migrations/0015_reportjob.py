@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0014_unitfinancialsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pdf', 'PDF'), ('xlsx', 'Excel')], max_length=10, verbose_name='نوع الملف')),
+                ('params', models.JSONField(default=dict, verbose_name='معاملات التقرير')),
+                ('params_hash', models.CharField(db_index=True, help_text='تُستخدم لدمج الطلبات المتطابقة قيد الانتظار', max_length=64, verbose_name='بصمة المعاملات')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'جاهز'), ('failed', 'فشل')], db_index=True, default='pending', max_length=10, verbose_name='الحالة')),
+                ('attach_to_owner', models.BooleanField(default=False, verbose_name='إرفاق بتقارير المالك')),
+                ('file', models.FileField(blank=True, upload_to='report_jobs/%Y/%m/', verbose_name='الملف')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الطلب')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدأ في')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهى في')),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='units.report', verbose_name='التقرير المرفق')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='طلبه')),
+            ],
+            options={
+                'verbose_name': 'مهمة تقرير',
+                'verbose_name_plural': 'مهام التقارير',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0015_reportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='تاريخ الزيارة'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:57
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def path_bucket(path):
+    """نسخة من units.rollups.path_bucket كما كانت عند هذا الترحيل"""
+    segments = [segment for segment in (path or '').split('/') if segment][:3]
+    if not segments:
+        return '/'
+    segments = ['*' if segment.isdigit() else segment for segment in segments]
+    return ('/' + '/'.join(segments) + '/')[:100]
+
+
+def build_rollups(apps, schema_editor):
+    """تجميع الزيارات الموجودة إلى الملخصات اليومية"""
+    db_alias = schema_editor.connection.alias
+    Visit = apps.get_model('units', 'Visit')
+    VisitDailyRollup = apps.get_model('units', 'VisitDailyRollup')
+    rows = (
+        Visit.objects.using(db_alias).order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'user_id', 'path')
+        .annotate(visit_count=Count('id'))
+    )
+    counts = Counter()
+    for row in rows.iterator():
+        counts[(row['day'], row['user_id'], path_bucket(row['path']))] += row['visit_count']
+    VisitDailyRollup.objects.using(db_alias).bulk_create(
+        [
+            VisitDailyRollup(date=day, user_id=user_id, path_bucket=bucket, count=count)
+            for (day, user_id, bucket), count in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0016_visit_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('path_bucket', models.CharField(max_length=100, verbose_name='مجموعة المسار')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='عدد الزيارات')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='visit_rollups', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'ملخص زيارات يومي',
+                'verbose_name_plural': 'ملخصات الزيارات اليومية',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'user', 'path_bucket'], name='units_visit_date_80272e_idx'), models.Index(fields=['user', 'date'], name='units_visit_user_id_e6d787_idx')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop, hints={'model_name': 'visitdailyrollup'}),
+    ]
@@ -0,0 +1,150 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+DIMENSIONS = (
+    # (الحقل النصي القديم، الحقل المؤقت، نموذج الجدول)
+    ('user_agent', 'user_agent_ref', 'VisitUserAgent'),
+    ('path', 'path_ref', 'VisitPath'),
+    ('referer', 'referer_ref', 'VisitReferer'),
+)
+
+
+def _dimension_id(manager, ids, value):
+    """رقم القيمة في جدولها (مع إنشائها عند الحاجة)، و None للقيم الفارغة"""
+    if not value:
+        return None
+    if value not in ids:
+        digest = hashlib.sha1(value.encode('utf-8')).hexdigest()
+        ids[value] = manager.get_or_create(digest=digest, defaults={'value': value})[0].pk
+    return ids[value]
+
+
+def intern_visits(apps, schema_editor):
+    """نقل النصوص المكررة في الزيارات الموجودة إلى الجداول على دفعات"""
+    db_alias = schema_editor.connection.alias
+    Visit = apps.get_model('units', 'Visit')
+    managers = {ref: apps.get_model('units', name).objects.using(db_alias) for _, ref, name in DIMENSIONS}
+    ids = {ref: {} for _, ref, _ in DIMENSIONS}
+    fields = [field for field, _, _ in DIMENSIONS]
+
+    last_id = 0
+    while True:
+        batch = list(Visit.objects.using(db_alias).filter(id__gt=last_id).order_by('id').only('id', *fields)[:BATCH_SIZE])
+        if not batch:
+            break
+        for visit in batch:
+            for field, ref, _ in DIMENSIONS:
+                setattr(visit, f'{ref}_id', _dimension_id(managers[ref], ids[ref], getattr(visit, field)))
+        Visit.objects.using(db_alias).bulk_update(batch, [f'{ref}_id' for _, ref, _ in DIMENSIONS])
+        last_id = batch[-1].id
+
+
+def restore_visits(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Visit = apps.get_model('units', 'Visit')
+    last_id = 0
+    while True:
+        batch = list(
+            Visit.objects.using(db_alias).filter(id__gt=last_id).order_by('id')
+            .select_related(*[ref for _, ref, _ in DIMENSIONS])[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for visit in batch:
+            for field, ref, _ in DIMENSIONS:
+                dimension = getattr(visit, ref)
+                setattr(visit, field, dimension.value if dimension else ('' if field == 'path' else None))
+        Visit.objects.using(db_alias).bulk_update(batch, [field for field, _, _ in DIMENSIONS])
+        last_id = batch[-1].id
+
+
+def dimension_fields():
+    return [
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('value', models.TextField(verbose_name='القيمة')),
+        ('digest', models.CharField(editable=False, max_length=40, unique=True, verbose_name='البصمة')),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0017_visitdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitUserAgent',
+            fields=dimension_fields(),
+            options={
+                'verbose_name': 'متصفح',
+                'verbose_name_plural': 'المتصفحات',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitPath',
+            fields=dimension_fields(),
+            options={
+                'verbose_name': 'مسار صفحة',
+                'verbose_name_plural': 'مسارات الصفحات',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitReferer',
+            fields=dimension_fields(),
+            options={
+                'verbose_name': 'صفحة مرجعية',
+                'verbose_name_plural': 'الصفحات المرجعية',
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='units.visituseragent', verbose_name='متصفح المستخدم'),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='path_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='units.visitpath', verbose_name='مسار الصفحة'),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='referer_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='units.visitreferer', verbose_name='الصفحة المرجعية'),
+        ),
+        migrations.RunPython(intern_visits, restore_visits, hints={'model_name': 'visit'}),
+        migrations.RemoveField(
+            model_name='visit',
+            name='user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='visit',
+            name='path',
+        ),
+        migrations.RemoveField(
+            model_name='visit',
+            name='referer',
+        ),
+        migrations.RenameField(
+            model_name='visit',
+            old_name='user_agent_ref',
+            new_name='user_agent',
+        ),
+        migrations.RenameField(
+            model_name='visit',
+            old_name='path_ref',
+            new_name='path',
+        ),
+        migrations.RenameField(
+            model_name='visit',
+            old_name='referer_ref',
+            new_name='referer',
+        ),
+    ]
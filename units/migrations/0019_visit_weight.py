@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0018_visit_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visit',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, help_text='عدد الزيارات التي يمثلها هذا السطر عند أخذ عينة من الزوار', verbose_name='الوزن'),
+        ),
+    ]
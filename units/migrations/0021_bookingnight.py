@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:12
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_nights(apps, schema_editor):
+    """ليالي الحجوزات الموجودة (نسخة من units.occupancy.backfill_nights كما كانت عند هذا الترحيل)
+
+    الحجوزات المتعارضة القديمة تُتجاوز: الليلة لأول حجز، ويعرض البقية أمر backfill_booking_nights.
+    """
+    Booking = apps.get_model('units', 'Booking')
+    BookingNight = apps.get_model('units', 'BookingNight')
+    db_alias = schema_editor.connection.alias
+    nights = BookingNight.objects.using(db_alias)
+    taken = set()
+    pending = []
+    bookings = Booking.objects.using(db_alias).order_by('id').values_list('id', 'unit_id', 'start_date', 'end_date')
+    for booking_id, unit_id, start_date, end_date in bookings.iterator(chunk_size=1000):
+        night = start_date
+        while night <= end_date:
+            if (unit_id, night) not in taken:
+                taken.add((unit_id, night))
+                pending.append(BookingNight(booking_id=booking_id, unit_id=unit_id, night=night))
+            night += timedelta(days=1)
+        if len(pending) >= 1000:
+            nights.bulk_create(pending)
+            pending = []
+    nights.bulk_create(pending)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0020_visit_user_no_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField(verbose_name='الليلة')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='units.booking', verbose_name='الحجز')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='units.unit', verbose_name='الوحدة')),
+            ],
+            options={
+                'verbose_name': 'ليلة محجوزة',
+                'verbose_name_plural': 'الليالي المحجوزة',
+                'constraints': [models.UniqueConstraint(fields=('unit', 'night'), name='unique_unit_night')],
+            },
+        ),
+        migrations.RunPython(build_nights, migrations.RunPython.noop, hints={'model_name': 'bookingnight'}),
+    ]
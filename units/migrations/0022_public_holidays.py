@@ -0,0 +1,129 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:24
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def collapse_holidays(apps, schema_editor):
+    """دمج إجازات الوحدات المكررة بنفس التاريخ في إجازات عامة
+
+    نسخة من units.holidays.collapse_unit_holidays كما كانت عند هذا الترحيل (انظر أمر
+    collapse_holidays): الاسم والسعر الأكثر تكراراً للإجازة العامة، واستثناء بسعره
+    لكل وحدة بسعر آخر، واستثناء كامل للوحدات التي لم تكن لها الإجازة.
+    """
+    db_alias = schema_editor.connection.alias
+    Holiday = apps.get_model('units', 'Holiday')
+    PublicHoliday = apps.get_model('units', 'PublicHoliday')
+    PublicHolidayOverride = apps.get_model('units', 'PublicHolidayOverride')
+    unit_ids = set(apps.get_model('units', 'Unit').objects.using(db_alias).values_list('id', flat=True))
+    by_date = defaultdict(list)
+    for row in Holiday.objects.using(db_alias).values_list('id', 'unit_id', 'holiday_date', 'holiday_name', 'price'):
+        by_date[row[2]].append(row)
+
+    for holiday_date, rows in sorted(by_date.items()):
+        if len(rows) < 2:
+            continue
+        name = Counter(row[3] for row in rows).most_common(1)[0][0]
+        price = Counter(row[4] for row in rows).most_common(1)[0][0]
+        priced = [(unit_id, row_price) for _, unit_id, _, _, row_price in rows if row_price != price]
+        excluded = unit_ids - {row[1] for row in rows}
+        if 1 + len(priced) + len(excluded) >= len(rows):
+            continue
+        holiday = PublicHoliday.objects.using(db_alias).create(
+            holiday_name=name, holiday_date=holiday_date, price=price
+        )
+        PublicHolidayOverride.objects.using(db_alias).bulk_create(
+            [PublicHolidayOverride(holiday=holiday, unit_id=unit_id, price=row_price) for unit_id, row_price in priced]
+            + [PublicHolidayOverride(holiday=holiday, unit_id=unit_id, is_excluded=True) for unit_id in sorted(excluded)]
+        )
+        Holiday.objects.using(db_alias).filter(id__in=[row[0] for row in rows]).delete()
+
+
+def expand_holidays(apps, schema_editor):
+    """عكس الدمج: إجازة لكل وحدة بسعرها من كل إجازة عامة"""
+    db_alias = schema_editor.connection.alias
+    Holiday = apps.get_model('units', 'Holiday')
+    PublicHoliday = apps.get_model('units', 'PublicHoliday')
+    weekday_prices = defaultdict(dict)
+    for unit_id, day_of_week, price in apps.get_model('units', 'UnitPricing').objects.using(db_alias).values_list(
+        'unit_id', 'day_of_week', 'price'
+    ):
+        weekday_prices[unit_id][day_of_week] = price
+    unit_ids = list(apps.get_model('units', 'Unit').objects.using(db_alias).values_list('id', flat=True))
+    taken = set(Holiday.objects.using(db_alias).values_list('unit_id', 'holiday_date'))
+    overrides = defaultdict(dict)
+    for holiday_id, unit_id, price, multiplier, is_excluded in (
+        apps.get_model('units', 'PublicHolidayOverride').objects.using(db_alias)
+        .values_list('holiday_id', 'unit_id', 'price', 'multiplier', 'is_excluded')
+    ):
+        overrides[holiday_id][unit_id] = (price, multiplier, is_excluded)
+
+    rows = []
+    for holiday in PublicHoliday.objects.using(db_alias).all():
+        for unit_id in unit_ids:
+            if (unit_id, holiday.holiday_date) in taken:
+                continue
+            price, multiplier, is_excluded = overrides[holiday.id].get(
+                unit_id, (holiday.price, holiday.multiplier, False)
+            )
+            weekday_price = weekday_prices[unit_id].get(holiday.holiday_date.weekday())
+            if is_excluded:
+                continue
+            if price is None and multiplier is not None and weekday_price is not None:
+                price = (weekday_price * multiplier).quantize(Decimal('0.01'))
+            if price is not None:
+                rows.append(Holiday(
+                    unit_id=unit_id, holiday_name=holiday.holiday_name,
+                    holiday_date=holiday.holiday_date, price=price,
+                ))
+    Holiday.objects.using(db_alias).bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0021_bookingnight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicHoliday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holiday_name', models.CharField(help_text='مثال: يوم التأسيس، اليوم الوطني، إلخ', max_length=200, verbose_name='اسم الإجازة')),
+                ('holiday_date', models.DateField(unique=True, verbose_name='تاريخ الإجازة')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='سعر الليلة')),
+                ('multiplier', models.DecimalField(blank=True, decimal_places=2, help_text='بدلاً من السعر الثابت: يُضرب في سعر يوم الأسبوع للوحدة (مثال: 1.5)', max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='مضاعف السعر')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإضافة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+            ],
+            options={
+                'verbose_name': 'إجازة عامة',
+                'verbose_name_plural': 'الإجازات العامة',
+                'ordering': ['holiday_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PublicHolidayOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='سعر الليلة')),
+                ('multiplier', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='مضاعف السعر')),
+                ('is_excluded', models.BooleanField(default=False, help_text='الليلة بسعرها العادي لهذه الوحدة', verbose_name='مستثناة من الإجازة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإضافة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+                ('holiday', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='units.publicholiday', verbose_name='الإجازة')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holiday_overrides', to='units.unit', verbose_name='الوحدة')),
+            ],
+            options={
+                'verbose_name': 'سعر إجازة عامة لوحدة',
+                'verbose_name_plural': 'أسعار الإجازات العامة للوحدات',
+                'unique_together': {('holiday', 'unit')},
+            },
+        ),
+        migrations.RunPython(collapse_holidays, expand_holidays, hints={'model_name': 'publicholiday'}),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:43
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    """دمج الصفوف المكررة لنفس (التاريخ، المستخدم، المجموعة) في صف واحد قبل القيد"""
+    from django.db.models import Count, Min, Sum
+
+    VisitDailyRollup = apps.get_model('units', 'VisitDailyRollup')
+    rollups = VisitDailyRollup.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        rollups.order_by().values('date', 'user_id', 'path_bucket')
+        .annotate(rows=Count('id'), keep_id=Min('id'), total=Sum('count'))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        group = rollups.filter(date=row['date'], user_id=row['user_id'], path_bucket=row['path_bucket'])
+        group.filter(id=row['keep_id']).update(count=row['total'])
+        group.exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('units', '0022_public_holidays'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='visitdailyrollup',
+            name='units_visit_date_80272e_idx',
+        ),
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop, hints={'model_name': 'visitdailyrollup'}),
+        migrations.AddConstraint(
+            model_name='visitdailyrollup',
+            constraint=models.UniqueConstraint(models.F('date'), django.db.models.functions.comparison.Coalesce('user', models.Value(0)), models.F('path_bucket'), name='unique_visit_rollup_bucket'),
+        ),
+    ]
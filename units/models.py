@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from datetime import timedelta
+import hashlib
 import os
 
 class UserProfile(models.Model):
@@ -129,41 +133,74 @@ class Booking(models.Model):
         verbose_name = "حجز"
         verbose_name_plural = "الحجوزات"
         ordering = ['-start_date']
+        indexes = [
+            # استعلامات نافذة التقويم (حجوزات وحدة داخل فترة)
+            models.Index(fields=['unit', 'start_date', 'end_date']),
+        ]
+    
+    CONFLICT_MESSAGE = 'يوجد حجز متعارض في هذه الفترة'
     
     def __str__(self):
         return f"{self.unit.name} - من {self.start_date} إلى {self.end_date}"
     
     def clean(self):
         """التحقق من صحة البيانات"""
-        from django.core.exceptions import ValidationError
+        self.validate_dates()
         
-        if self.start_date and self.end_date:
-            # السماح بحجز يوم واحد فقط
-            if self.end_date != self.start_date:
-                raise ValidationError({
-                    'end_date': 'الحجز مسموح ليوم واحد فقط. يجب أن يساوي تاريخ النهاية تاريخ البداية.'
-                })
-            
-            # التحقق من عدم تعارض الحجوزات
-            overlapping_bookings = Booking.objects.filter(
-                unit=self.unit,
-                start_date__lte=self.end_date,
-                end_date__gte=self.start_date
+        if self.start_date and self.end_date and self.unit_id:
+            # التحقق من عدم تعارض الحجوزات (من جدول الليالي المحجوزة)
+            overlapping_nights = BookingNight.objects.filter(
+                unit_id=self.unit_id,
+                night__gte=self.start_date,
+                night__lte=self.end_date
             )
             
             # استثناء الحجز الحالي عند التعديل
             if self.pk:
-                overlapping_bookings = overlapping_bookings.exclude(pk=self.pk)
+                overlapping_nights = overlapping_nights.exclude(booking_id=self.pk)
             
-            if overlapping_bookings.exists():
+            if overlapping_nights.exists():
+                raise ValidationError({
+                    'start_date': self.CONFLICT_MESSAGE
+                })
+    
+    def validate_dates(self):
+        if self.start_date and self.end_date:
+            # السماح بحجز يوم واحد فقط
+            if self.end_date != self.start_date:
                 raise ValidationError({
-                    'start_date': 'يوجد حجز متعارض في هذه الفترة'
+                    'end_date': 'الحجز مسموح ليوم واحد فقط. يجب أن يساوي تاريخ النهاية تاريخ البداية.'
                 })
     
+    def nights(self):
+        """الليالي التي يشغلها الحجز (من البداية حتى النهاية)"""
+        night = self.start_date
+        while night <= self.end_date:
+            yield night
+            night += timedelta(days=1)
+    
     def save(self, *args, **kwargs):
-        """حفظ الحجز مع التحقق"""
-        self.full_clean()
-        super().save(*args, **kwargs)
+        """حفظ الحجز مع ليالي الإشغال (داخل معاملة واحدة مع تحديث ملخص الوحدة)
+
+        التعارض يكتشفه القيد الفريد (الوحدة، الليلة) في جدول BookingNight عند
+        الإدراج، فلا يمر حجزان لنفس الليلة حتى لو تزامنا.
+        """
+        # وجود الوحدة والمستخدم يضمنه قيد المفتاح الأجنبي، فلا داعي لاستعلام إضافي
+        self.clean_fields(exclude=['unit', 'user'])
+        self.validate_dates()
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding:
+                BookingNight.objects.filter(booking=self).delete()
+            try:
+                BookingNight.objects.bulk_create([
+                    BookingNight(booking=self, unit_id=self.unit_id, night=night)
+                    for night in self.nights()
+                ])
+            except IntegrityError:
+                # الخروج بخطأ يلغي المعاملة كلها (بما فيها الحجز نفسه)
+                raise ValidationError({'start_date': self.CONFLICT_MESSAGE})
     
     @property
     def total_amount(self):
@@ -171,6 +208,33 @@ class Booking(models.Model):
         return (self.cash_amount or 0) + (self.transfer_amount or 0)
 
 
+class BookingNight(models.Model):
+    """ليلة محجوزة لوحدة: سطر لكل ليلة في كل حجز، ولا تتكرر الليلة للوحدة"""
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='booked_nights',
+        verbose_name='الحجز'
+    )
+    unit = models.ForeignKey(
+        Unit,
+        on_delete=models.CASCADE,
+        related_name='booked_nights',
+        verbose_name='الوحدة'
+    )
+    night = models.DateField(verbose_name='الليلة')
+
+    class Meta:
+        verbose_name = 'ليلة محجوزة'
+        verbose_name_plural = 'الليالي المحجوزة'
+        constraints = [
+            models.UniqueConstraint(fields=['unit', 'night'], name='unique_unit_night'),
+        ]
+
+    def __str__(self):
+        return f'{self.unit_id} - {self.night}'
+
+
 def validate_pdf(file_obj):
     name = getattr(file_obj, 'name', '')
     ext = os.path.splitext(name)[1].lower()
@@ -218,11 +282,65 @@ class Contract(models.Model):
         return self.title
 
 
+class VisitDimension(models.Model):
+    """قيمة نصية مكررة في سجل الزيارات (متصفح، مسار، صفحة مرجعية) تُخزن مرة واحدة
+
+    تشير إليها الزيارات برقم بدل تكرار النص في كل سطر. الفهرس الفريد على
+    بصمة القيمة (sha1) وليس على النص نفسه حتى يبقى صغيراً مهما طال النص.
+    """
+    value = models.TextField(
+        verbose_name='القيمة'
+    )
+    digest = models.CharField(
+        max_length=40,
+        unique=True,
+        editable=False,
+        verbose_name='البصمة'
+    )
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def make_digest(value):
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.digest = self.make_digest(self.value)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.value
+
+
+class VisitUserAgent(VisitDimension):
+    class Meta:
+        verbose_name = 'متصفح'
+        verbose_name_plural = 'المتصفحات'
+
+
+class VisitPath(VisitDimension):
+    class Meta:
+        verbose_name = 'مسار صفحة'
+        verbose_name_plural = 'مسارات الصفحات'
+
+
+class VisitReferer(VisitDimension):
+    class Meta:
+        verbose_name = 'صفحة مرجعية'
+        verbose_name_plural = 'الصفحات المرجعية'
+
+
 class Visit(models.Model):
-    """نموذج لتتبع زيارات المستخدمين للموقع"""
+    """نموذج لتتبع زيارات المستخدمين للموقع
+
+    قد يُخزن في قاعدة بيانات منفصلة (انظر routers.py)، لذلك العلاقة بالمستخدم
+    بدون قيد، وتُحذف زيارات المستخدم عند حذفه بإشارة في signals.py.
+    """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='visits',
         verbose_name='المستخدم',
         null=True,
@@ -240,23 +358,38 @@ class Visit(models.Model):
         null=True,
         blank=True
     )
-    user_agent = models.TextField(
+    user_agent = models.ForeignKey(
+        'VisitUserAgent',
+        on_delete=models.PROTECT,
+        related_name='visits',
         verbose_name='متصفح المستخدم',
-        blank=True,
-        null=True
+        null=True,
+        blank=True
     )
-    path = models.CharField(
-        max_length=500,
+    path = models.ForeignKey(
+        'VisitPath',
+        on_delete=models.PROTECT,
+        related_name='visits',
         verbose_name='مسار الصفحة',
+        null=True,
         blank=True
     )
-    referer = models.URLField(
+    referer = models.ForeignKey(
+        'VisitReferer',
+        on_delete=models.PROTECT,
+        related_name='visits',
         verbose_name='الصفحة المرجعية',
-        blank=True,
-        null=True
+        null=True,
+        blank=True
+    )
+    weight = models.PositiveIntegerField(
+        default=1,
+        verbose_name='الوزن',
+        help_text='عدد الزيارات التي يمثلها هذا السطر عند أخذ عينة من الزوار'
     )
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='تاريخ الزيارة',
         db_index=True
     )
@@ -276,6 +409,49 @@ class Visit(models.Model):
         return f'زائر غير مسجل - {self.created_at.strftime("%Y-%m-%d %H:%M")}'
 
 
+class VisitDailyRollup(models.Model):
+    """عدد الزيارات اليومي لكل مستخدم ومجموعة مسارات (بديل عن مسح سجل الزيارات)"""
+    date = models.DateField(
+        verbose_name='التاريخ'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='visit_rollups',
+        verbose_name='المستخدم',
+        null=True,
+        blank=True
+    )
+    path_bucket = models.CharField(
+        max_length=100,
+        verbose_name='مجموعة المسار'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='عدد الزيارات'
+    )
+
+    class Meta:
+        verbose_name = 'ملخص زيارات يومي'
+        verbose_name_plural = 'ملخصات الزيارات اليومية'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+        constraints = [
+            # صف واحد لكل (تاريخ، مستخدم، مجموعة) حتى للزوار (user فارغ): NULL لا يتكرر في قيد عادي
+            models.UniqueConstraint(
+                models.F('date'), Coalesce('user', models.Value(0)), models.F('path_bucket'),
+                name='unique_visit_rollup_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        username = self.user.username if self.user else 'زائر غير مسجل'
+        return f'{self.date} - {username} - {self.path_bucket}: {self.count}'
+
+
 class Expense(models.Model):
     """نموذج المصروفات للوحدات"""
     
@@ -352,6 +528,149 @@ class Expense(models.Model):
             return dict(self.EXPENSE_CATEGORIES).get(self.category, self.category)
         return 'بدون فئة'
 
+    def save(self, *args, **kwargs):
+        """حفظ المصروف داخل معاملة واحدة مع تحديث ملخص الوحدة"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class UnitFinancialSummary(models.Model):
+    """ملخص مالي مُجمّع لكل وحدة (يُحدّث تلقائياً مع كل حجز أو مصروف)"""
+
+    unit = models.OneToOneField(
+        Unit,
+        on_delete=models.CASCADE,
+        related_name='financial_summary',
+        verbose_name="الوحدة"
+    )
+    total_revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="إجمالي الحجوزات"
+    )
+    total_expenses = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="إجمالي المصروفات"
+    )
+    net_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="الصافي"
+    )
+    booking_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="عدد الحجوزات"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+
+    class Meta:
+        verbose_name = "ملخص مالي للوحدة"
+        verbose_name_plural = "الملخصات المالية للوحدات"
+
+    def __str__(self):
+        return f"{self.unit.name} - {self.net_total} ر.س"
+
+
+class ReportJob(models.Model):
+    """مهمة توليد تقرير (PDF أو Excel) في الخلفية بدلاً من داخل الطلب"""
+
+    KIND_CHOICES = [
+        ('pdf', 'PDF'),
+        ('xlsx', 'Excel'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'في الانتظار'),
+        (STATUS_RUNNING, 'قيد التنفيذ'),
+        (STATUS_DONE, 'جاهز'),
+        (STATUS_FAILED, 'فشل'),
+    ]
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        verbose_name="نوع الملف"
+    )
+    params = models.JSONField(
+        default=dict,
+        verbose_name="معاملات التقرير"
+    )
+    params_hash = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name="بصمة المعاملات",
+        help_text="تُستخدم لدمج الطلبات المتطابقة قيد الانتظار"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True,
+        verbose_name="الحالة"
+    )
+    attach_to_owner = models.BooleanField(
+        default=False,
+        verbose_name="إرفاق بتقارير المالك"
+    )
+    file = models.FileField(
+        upload_to='report_jobs/%Y/%m/',
+        blank=True,
+        verbose_name="الملف"
+    )
+    report = models.ForeignKey(
+        Report,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name="التقرير المرفق"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="الخطأ"
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_jobs',
+        verbose_name="طلبه"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاريخ الطلب"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="بدأ في"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="انتهى في"
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "مهمة تقرير"
+        verbose_name_plural = "مهام التقارير"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} - {self.get_status_display()}"
+
 
 class UnitPricing(models.Model):
     """نموذج أسعار تأجير الوحدات حسب أيام الأسبوع"""
@@ -513,6 +832,120 @@ class Holiday(models.Model):
         return f"{self.unit.name} - {self.holiday_name} ({self.holiday_date}) - {self.price} ر.س"
 
 
+class PublicHoliday(models.Model):
+    """إجازة عامة لكل الوحدات (بدلاً من تكرار الإجازة لكل وحدة في Holiday)
+
+    سعر الليلة ثابت (price) أو مضاعف لسعر يوم الأسبوع للوحدة (multiplier)،
+    ويمكن تغييره لوحدة معينة عبر PublicHolidayOverride.
+    """
+    
+    holiday_name = models.CharField(
+        max_length=200,
+        verbose_name="اسم الإجازة",
+        help_text="مثال: يوم التأسيس، اليوم الوطني، إلخ"
+    )
+    holiday_date = models.DateField(
+        unique=True,
+        verbose_name="تاريخ الإجازة"
+    )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="سعر الليلة"
+    )
+    multiplier = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        verbose_name="مضاعف السعر",
+        help_text="بدلاً من السعر الثابت: يُضرب في سعر يوم الأسبوع للوحدة (مثال: 1.5)"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاريخ الإضافة"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+    
+    class Meta:
+        verbose_name = "إجازة عامة"
+        verbose_name_plural = "الإجازات العامة"
+        ordering = ['holiday_date']
+    
+    def __str__(self):
+        return f"{self.holiday_name} ({self.holiday_date})"
+    
+    def clean(self):
+        if (self.price is None) == (self.multiplier is None):
+            raise ValidationError('حدد سعر الليلة أو مضاعف السعر (أحدهما فقط)')
+
+
+class PublicHolidayOverride(models.Model):
+    """سعر إجازة عامة لوحدة معينة: سعر ثابت، أو مضاعف، أو استثناء الوحدة من الإجازة"""
+    
+    holiday = models.ForeignKey(
+        PublicHoliday,
+        on_delete=models.CASCADE,
+        related_name='overrides',
+        verbose_name="الإجازة"
+    )
+    unit = models.ForeignKey(
+        Unit,
+        on_delete=models.CASCADE,
+        related_name='holiday_overrides',
+        verbose_name="الوحدة"
+    )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="سعر الليلة"
+    )
+    multiplier = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        verbose_name="مضاعف السعر"
+    )
+    is_excluded = models.BooleanField(
+        default=False,
+        verbose_name="مستثناة من الإجازة",
+        help_text="الليلة بسعرها العادي لهذه الوحدة"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاريخ الإضافة"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+    
+    class Meta:
+        verbose_name = "سعر إجازة عامة لوحدة"
+        verbose_name_plural = "أسعار الإجازات العامة للوحدات"
+        unique_together = ['holiday', 'unit']
+    
+    def __str__(self):
+        return f"{self.unit.name} - {self.holiday.holiday_name}"
+    
+    def clean(self):
+        if self.is_excluded:
+            if self.price is not None or self.multiplier is not None:
+                raise ValidationError('الوحدة المستثناة لا تحتاج سعراً')
+        elif (self.price is None) == (self.multiplier is None):
+            raise ValidationError('حدد سعر الليلة أو مضاعف السعر (أحدهما فقط) أو استثنِ الوحدة')
+
+
 class ProfitPercentage(models.Model):
     """نموذج نسبة الأرباح للمالكين (المستثمرين)"""
     
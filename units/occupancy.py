@@ -0,0 +1,123 @@
+"""
+إشغال الوحدات: بناء جدول الليالي المحجوزة وشبكة الإشغال لكل الوحدات
+
+`backfill_nights` يُستخدم من أمر `backfill_booking_nights` (الترحيل 0021 فيه نسخته
+الخاصة بالنماذج التاريخية)، ويستقبل النماذج كوسائط.
+
+`occupancy_grid` يبني مصفوفة الوحدات × الأيام لصفحة الإشغال: استعلام واحد
+للوحدات، واستعلام نطاق واحد للحجوزات، والأسعار من جداول pricing.py المخزنة. كل وحدة سطر نصي
+بحرف ست عشري لكل يوم يجمع علامات اليوم (انظر *_FLAG)، فتبقى الشبكة لـ 300
+وحدة × 90 يوماً في حدود 30 كيلوبايت.
+"""
+from datetime import timedelta
+
+BOOKED_FLAG = 1
+OWNER_BOOKING_FLAG = 2
+HOLIDAY_PRICE_FLAG = 4
+NO_PRICE_FLAG = 8
+
+GRID_FLAGS = {
+    'booked': BOOKED_FLAG,
+    'owner_booking': OWNER_BOOKING_FLAG,
+    'holiday_price': HOLIDAY_PRICE_FLAG,
+    'no_price': NO_PRICE_FLAG,
+}
+
+
+def _nights(start_date, end_date):
+    night = start_date
+    while night <= end_date:
+        yield night
+        night += timedelta(days=1)
+
+
+def backfill_nights(booking_model, night_model, using='default', batch_size=1000):
+    """إضافة ليالي الحجوزات التي ليس لها ليالٍ بعد
+
+    الحجوزات القديمة المتعارضة لا تُوقف البناء: الليلة تبقى لأول حجز (حسب الرقم)
+    وتُرجع البقية في قائمة التعارضات. تُرجع (عدد الليالي المضافة، التعارضات)
+    حيث كل تعارض (رقم الحجز، رقم الوحدة، الليلة).
+    """
+    nights = night_model.objects.using(using)
+    taken = set(nights.values_list('unit_id', 'night'))
+    covered = set(nights.values_list('booking_id', flat=True))
+
+    created = 0
+    conflicts = []
+    pending = []
+    bookings = (
+        booking_model.objects.using(using).order_by('id')
+        .values_list('id', 'unit_id', 'start_date', 'end_date')
+    )
+    for booking_id, unit_id, start_date, end_date in bookings.iterator(chunk_size=batch_size):
+        if booking_id in covered:
+            continue
+        for night in _nights(start_date, end_date):
+            if (unit_id, night) in taken:
+                conflicts.append((booking_id, unit_id, night))
+                continue
+            taken.add((unit_id, night))
+            pending.append(night_model(booking_id=booking_id, unit_id=unit_id, night=night))
+        if len(pending) >= batch_size:
+            nights.bulk_create(pending)
+            created += len(pending)
+            pending = []
+    if pending:
+        nights.bulk_create(pending)
+        created += len(pending)
+    return created, conflicts
+
+
+def occupancy_grid(units, start, end):
+    """شبكة إشغال الوحدات في [start, end]
+
+    تُرجع قائمة بسطر لكل وحدة: days نص بطول الفترة (حرف ست عشري لكل يوم)،
+    weekday_prices أسعار أيام الأسبوع (0=الإثنين)، holiday_prices
+    {رقم اليوم في الفترة: السعر} لليالي الإجازات والأعياد.
+    """
+    from .holidays import public_holidays
+    from .models import Booking
+    from .pricing import eid_calendar, price_tables
+
+    units = list(units.select_related('owner').only('id', 'name', 'is_available', 'owner__username'))
+    unit_ids = [unit.id for unit in units]
+    days = (end - start).days + 1
+
+    flags = {unit_id: [0] * days for unit_id in unit_ids}
+    bookings = Booking.objects.filter(
+        unit_id__in=unit_ids, start_date__lte=end, end_date__gte=start
+    ).values_list('unit_id', 'start_date', 'end_date', 'is_owner_booking')
+    for unit_id, start_date, end_date, is_owner_booking in bookings:
+        row = flags[unit_id]
+        mark = BOOKED_FLAG | (OWNER_BOOKING_FLAG if is_owner_booking else 0)
+        for offset in range(max((start_date - start).days, 0), min((end_date - start).days, days - 1) + 1):
+            row[offset] |= mark
+
+    tables = price_tables(unit_ids)
+    eid_nights = eid_calendar()
+    public = public_holidays()
+    grid = []
+    for unit in units:
+        row = flags[unit.id]
+        table = tables[unit.id]
+        weekdays = table.weekday
+        holidays = {}
+        for offset in range(days):
+            price, source = table.price(start + timedelta(days=offset), eid_nights, public)
+            if source in ('holiday', 'eid'):
+                holidays[offset] = price
+                row[offset] |= HOLIDAY_PRICE_FLAG
+            elif price is None:
+                row[offset] |= NO_PRICE_FLAG
+        grid.append({
+            'id': unit.id,
+            'name': unit.name,
+            'owner': unit.owner.username if unit.owner else None,
+            'is_available': unit.is_available,
+            'days': ''.join(format(flag, 'x') for flag in row),
+            'weekday_prices': [
+                float(weekdays[day]) if day in weekdays else None for day in range(7)
+            ],
+            'holiday_prices': {offset: float(price) for offset, price in holidays.items()},
+        })
+    return grid
@@ -0,0 +1,499 @@
+"""
+بناء ملفات PDF للتقارير خارج دورة الطلب
+
+تُستخدم من عرض التصدير المباشر ومن مهام التقارير في الخلفية على حد سواء.
+الخط العربي يُحدَّد ويُسجَّل مرة واحدة لكل عملية، والأنماط (ParagraphStyle و
+TableStyle) تُبنى مرة واحدة بعده وتُشارك بين جميع التقارير، فيبدأ الرسم مباشرة.
+"""
+import itertools
+import os
+import tempfile
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.core import checks
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFName, PDFStream
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.pdfbase.ttfonts import TTFont
+
+from .arabic import format_date_arabic, reshape_arabic_text
+from .excel import export_chunk_size
+
+ARABIC_FONT_NAME = 'ArabicFont'
+ARABIC_FONT_BOLD_NAME = 'ArabicFont-Bold'
+
+# أزواج (عادي، عريض) حسب الأفضلية (الأفضل أولاً) عند عدم تحديد الخط في الإعدادات
+DEFAULT_FONT_CANDIDATES = [
+    (os.path.join(settings.BASE_DIR, 'static', 'fonts', 'Cairo-Regular.ttf'),
+     os.path.join(settings.BASE_DIR, 'static', 'fonts', 'Cairo-Bold.ttf')),
+    # Windows - Tahoma و Arial Unicode أفضل للعربية
+    ('C:/Windows/Fonts/tahoma.ttf', 'C:/Windows/Fonts/tahomabd.ttf'),
+    ('C:/Windows/Fonts/arialuni.ttf', None),
+    ('C:/Windows/Fonts/arial.ttf', 'C:/Windows/Fonts/arialbd.ttf'),
+    ('C:/Windows/Fonts/Times New Roman.ttf', None),
+    # Linux - DejaVu Sans
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/TTF/DejaVuSans.ttf', '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf'),
+]
+
+# الخطوط المسجلة: الاسم العادي والعريض والمسار المستخدم (None عند الرجوع لـ Helvetica)
+FontSet = namedtuple('FontSet', ['regular', 'bold', 'path'])
+
+FALLBACK_FONTS = FontSet('Helvetica', 'Helvetica-Bold', None)
+
+BRAND_COLOR = colors.HexColor('#a89078')
+PROFITS_COLOR = colors.HexColor('#8b7765')
+
+_fonts = None
+_styles = None
+_lock = threading.Lock()
+
+
+def font_candidates():
+    """مرشحات الخط: من الإعدادات PDF_ARABIC_FONT / PDF_ARABIC_FONT_BOLD أولاً ثم الافتراضية"""
+    candidates = []
+    configured = getattr(settings, 'PDF_ARABIC_FONT', None)
+    if configured:
+        candidates.append((str(configured), getattr(settings, 'PDF_ARABIC_FONT_BOLD', None)))
+    return candidates + DEFAULT_FONT_CANDIDATES
+
+
+def _register(regular_path, bold_path):
+    pdfmetrics.registerFont(TTFont(ARABIC_FONT_NAME, regular_path))
+    if bold_path and os.path.exists(bold_path):
+        pdfmetrics.registerFont(TTFont(ARABIC_FONT_BOLD_NAME, str(bold_path)))
+        return FontSet(ARABIC_FONT_NAME, ARABIC_FONT_BOLD_NAME, regular_path)
+    return FontSet(ARABIC_FONT_NAME, ARABIC_FONT_NAME, regular_path)
+
+
+def _resolve_fonts():
+    for regular_path, bold_path in font_candidates():
+        if not os.path.exists(regular_path):
+            continue
+        try:
+            return _register(regular_path, bold_path)
+        except Exception:
+            continue
+    return FALLBACK_FONTS
+
+
+def get_fonts():
+    """الخطوط العربية المسجلة (تُحدَّد وتُسجَّل مرة واحدة لكل عملية)"""
+    global _fonts
+    if _fonts is None:
+        with _lock:
+            if _fonts is None:
+                _fonts = _resolve_fonts()
+    return _fonts
+
+
+def setup_arabic_font():
+    """اسم الخط العربي المسجل، أو Helvetica إن لم يتوفر خط يدعم العربية"""
+    return get_fonts().regular
+
+
+# أنماط التقارير المبنية مسبقاً (للقراءة فقط - لا تُعدَّل بعد البناء)
+ReportStyles = namedtuple('ReportStyles', [
+    'title', 'subtitle', 'cell', 'header', 'summary', 'payment_table', 'payment_segment',
+    'profits_title', 'profits_header', 'profits_cell', 'profits_table',
+])
+
+
+def _build_styles(fonts):
+    sample = getSampleStyleSheet()
+    regular, bold = fonts.regular, fonts.bold
+    black = colors.HexColor('#000000')
+
+    title = ParagraphStyle(
+        'CustomTitle', parent=sample['Heading1'], fontSize=20, textColor=black, spaceAfter=15,
+        alignment=TA_CENTER, fontName=bold, encoding='utf-8', rightIndent=0, leftIndent=0,
+    )
+    subtitle = ParagraphStyle(
+        'CustomSubtitle', parent=sample['Normal'], fontSize=12, textColor=black, spaceAfter=10,
+        alignment=TA_CENTER, fontName=regular, encoding='utf-8', rightIndent=0, leftIndent=0,
+    )
+    cell = ParagraphStyle(
+        'TableStyle', parent=sample['Normal'], fontSize=10, alignment=TA_CENTER, fontName=regular,
+        encoding='utf-8', rightIndent=0, leftIndent=0, spaceBefore=0, spaceAfter=0, leading=12,
+    )
+    header = ParagraphStyle(
+        'TableHeaderStyle', parent=sample['Normal'], fontSize=10, alignment=TA_CENTER, fontName=bold,
+        encoding='utf-8', rightIndent=0, leftIndent=0, leading=12,
+    )
+    summary = ParagraphStyle(
+        'SummaryStyle', parent=sample['Normal'], fontSize=12, textColor=colors.HexColor('#1f2937'),
+        spaceAfter=5, alignment=0, fontName=bold, encoding='utf-8',
+    )
+
+    # رأس الجدول - ألوان الهوية (تدرج البيج)
+    header_commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), bold),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        ('LEFTPADDING', (0, 0), (-1, 0), 12),
+        ('RIGHTPADDING', (0, 0), (-1, 0), 12),
+    ]
+
+    # بيانات الجدول - النصوص سوداء (حتى الصف last_row)
+    def body_commands(last_row):
+        return [
+            ('BACKGROUND', (0, 1), (-1, last_row), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, last_row), black),
+            ('FONTNAME', (0, 1), (-1, last_row), regular),
+            ('FONTSIZE', (0, 1), (-1, last_row), 10),
+            ('ROWBACKGROUNDS', (0, 1), (-1, last_row), [colors.white, colors.HexColor('#fefcf8')]),
+            ('TOPPADDING', (0, 1), (-1, last_row), 12),
+            ('BOTTOMPADDING', (0, 1), (-1, last_row), 12),
+            ('LEFTPADDING', (0, 1), (-1, last_row), 12),
+            ('RIGHTPADDING', (0, 1), (-1, last_row), 12),
+        ]
+
+    # صف الإجمالي - ألوان الهوية (بيج ذهبي)
+    total_commands = [
+        ('BACKGROUND', (0, -1), (-1, -1), BRAND_COLOR),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+        ('FONTNAME', (0, -1), (-1, -1), bold),
+        ('FONTSIZE', (0, -1), (-1, -1), 10),
+        ('TOPPADDING', (0, -1), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
+        ('LEFTPADDING', (0, -1), (-1, -1), 12),
+        ('RIGHTPADDING', (0, -1), (-1, -1), 12),
+    ]
+
+    # الحدود - مطابق للوحة التحكم (1px solid #e2e8f0)
+    grid_commands = [('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0'))]
+
+    payment_table = TableStyle(header_commands + body_commands(-2) + total_commands + grid_commands)
+    # مقاطع التقارير الكبيرة: بدون صف إجمالي إلا في المقطع الأخير
+    payment_segment = TableStyle(header_commands + body_commands(-1) + grid_commands)
+
+    profits_title = ParagraphStyle(
+        'ProfitsTitle', parent=sample['Heading1'], fontSize=18, textColor=PROFITS_COLOR,
+        spaceAfter=30, alignment=TA_CENTER, fontName=bold,
+    )
+    profits_header = ParagraphStyle(
+        'ProfitsHeader', parent=sample['Normal'], fontSize=10, alignment=TA_CENTER, fontName=bold,
+        textColor=colors.white, backColor=PROFITS_COLOR,
+    )
+    profits_cell = ParagraphStyle(
+        'ProfitsCell', parent=sample['Normal'], fontSize=9, alignment=TA_CENTER, fontName=regular,
+    )
+    profits_table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), PROFITS_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), bold),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -2), colors.black),
+        ('FONTNAME', (0, 1), (-1, -2), regular),
+        ('FONTSIZE', (0, 1), (-1, -2), 9),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f5f5f5')]),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e9ecef')),
+        ('FONTNAME', (0, -1), (-1, -1), bold),
+        ('FONTSIZE', (0, -1), (-1, -1), 10),
+    ])
+
+    return ReportStyles(
+        title, subtitle, cell, header, summary, payment_table, payment_segment,
+        profits_title, profits_header, profits_cell, profits_table,
+    )
+
+
+def report_styles():
+    """أنماط التقارير المشتركة (تُبنى مرة واحدة بعد تسجيل الخطوط)"""
+    global _styles
+    if _styles is None:
+        fonts = get_fonts()
+        with _lock:
+            if _styles is None:
+                _styles = _build_styles(fonts)
+    return _styles
+
+
+def check_pdf_fonts(app_configs=None, **kwargs):
+    """فحص عند التشغيل: الخط المحدد في الإعدادات موجود، ويوجد خط يدعم العربية"""
+    errors = []
+    configured = getattr(settings, 'PDF_ARABIC_FONT', None)
+    if configured and not os.path.exists(str(configured)):
+        errors.append(checks.Warning(
+            f'PDF_ARABIC_FONT غير موجود: {configured}',
+            hint='حدّد مسار ملف TTF صحيح يدعم العربية.',
+            id='units.W001',
+        ))
+    fonts = get_fonts()
+    if fonts.path is None:
+        errors.append(checks.Warning(
+            'لم يُعثر على خط يدعم العربية، ستستخدم تقارير PDF خط Helvetica.',
+            hint='ضع Cairo-Regular.ttf و Cairo-Bold.ttf في static/fonts أو اضبط PDF_ARABIC_FONT.',
+            id='units.W002',
+        ))
+    return errors
+
+
+# عرض الأعمدة لتقرير المدفوعات: مساحة أكبر للتاريخ (مع يوم الأسبوع) ورقم الهاتف
+PAGE_MARGIN = 1 * cm
+AVAILABLE_WIDTH = A4[0] - (PAGE_MARGIN * 2)
+PAYMENT_COLUMN_RATIOS = [1.0, 1.5, 1.2, 1.4, 0.9, 0.9, 0.9]
+PAYMENT_COLUMN_WIDTHS = [
+    AVAILABLE_WIDTH * ratio / sum(PAYMENT_COLUMN_RATIOS) for ratio in PAYMENT_COLUMN_RATIOS
+]
+PAYMENT_HEADERS = ['الوحدة', 'التاريخ', 'اسم العميل', 'رقم الهاتف', 'الكاش', 'التحويل', 'الإجمالي']
+PROFITS_HEADERS = ['الوحدة', 'المالك', 'إجمالي الحجوزات', 'إجمالي المصروفات', 'الصافي', 'نسبة الأرباح', 'الأرباح']
+
+
+def pdf_segment_rows():
+    """عدد الصفوف في كل مقطع جدول بوضع التقارير الكبيرة"""
+    return getattr(settings, 'PDF_TABLE_SEGMENT_ROWS', 500)
+
+
+def pdf_large_report_rows():
+    """عدد الحجوزات الذي يبدأ عنده وضع التقارير الكبيرة"""
+    return getattr(settings, 'PDF_LARGE_REPORT_ROWS', 1000)
+
+
+def pdf_max_sync_rows():
+    """أقصى عدد حجوزات يُولَّد داخل الطلب، وما فوقه يُوجَّه لمهام الخلفية"""
+    return getattr(settings, 'PDF_MAX_SYNC_ROWS', 5000)
+
+
+def _money(value):
+    return f"{float(value or 0):,.2f} ر.س"
+
+
+def _payment_header(styles):
+    return [Paragraph(reshape_arabic_text(header), styles.header) for header in PAYMENT_HEADERS]
+
+
+def _payment_row(booking, cell):
+    return [
+        Paragraph(reshape_arabic_text(booking.unit_name), cell),
+        Paragraph(reshape_arabic_text(format_date_arabic(booking.start_date)), cell),
+        Paragraph(reshape_arabic_text(booking.customer_name or '-'), cell),
+        Paragraph(reshape_arabic_text(booking.customer_phone or '-'), cell),
+        Paragraph(reshape_arabic_text(_money(booking.cash_amount)), cell),
+        Paragraph(reshape_arabic_text(_money(booking.transfer_amount)), cell),
+        Paragraph(reshape_arabic_text(_money(booking.total_amount)), cell),
+    ]
+
+
+def _payment_total_row(totals, cell):
+    return [
+        Paragraph(reshape_arabic_text('الإجمالي'), cell),
+        Paragraph('', cell),
+        Paragraph('', cell),
+        Paragraph('', cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_cash'])), cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_transfer'])), cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_all'])), cell),
+    ]
+
+
+def _segment_table(styles, rows, with_total=False):
+    table = LongTable([_payment_header(styles)] + rows, colWidths=PAYMENT_COLUMN_WIDTHS, repeatRows=1)
+    table.setStyle(styles.payment_table if with_total else styles.payment_segment)
+    return table
+
+
+def _payment_segments(query, styles):
+    """مولّد جداول LongTable بعدد ثابت من الصفوف، وصف الإجمالي في المقطع الأخير"""
+    segment_rows = pdf_segment_rows()
+    rows = []
+    for booking in query.iter_rows(chunk_size=export_chunk_size()):
+        rows.append(_payment_row(booking, styles.cell))
+        if len(rows) >= segment_rows:
+            yield _segment_table(styles, rows)
+            rows = []
+    rows.append(_payment_total_row(query.totals, styles.cell))
+    yield _segment_table(styles, rows, with_total=True)
+
+
+class FlowableStream:
+    """قائمة flowables لـ doc.build تُملأ من مولّد عند الحاجة
+
+    doc.build يأخذ العنصر الأول ويحذفه بعد رسمه ويعيد بقية الجدول المقسوم إلى
+    أول القائمة، فلا يُبنى المقطع التالي إلا بعد رسم السابق، ويبقى في الذاكرة
+    مقطع واحد مهما كان عدد الصفوف.
+    """
+
+    def __init__(self, flowables):
+        self._buffer = []
+        self._source = iter(flowables)
+
+    def _fill(self, count):
+        while len(self._buffer) < count:
+            try:
+                self._buffer.append(next(self._source))
+            except StopIteration:
+                return
+
+    def __len__(self):
+        self._fill(1)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            self._fill(index + 1)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        del self._buffer[index]
+
+    def insert(self, index, value):
+        self._buffer.insert(index, value)
+
+
+class PageCompressingCanvas(Canvas):
+    """يضغط محتوى كل صفحة عند إغلاقها
+
+    ReportLab يحتفظ بنص كل الصفحات حتى حفظ الملف ثم يضغطها، فيُضغط هنا نص
+    الصفحة فور انتهائها ويبقى في الذاكرة مضغوطاً فقط.
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and not page.Contents:
+            # وجود Filter في القاموس يمنع ReportLab من ضغط المحتوى مرة أخرى
+            page.Contents = PDFStream(
+                PDFDictionary({'Filter': PDFName('FlateDecode')}),
+                zlib.compress(page.stream.encode('utf-8')),
+            )
+            page.stream = None
+
+
+def write_payment_report_pdf(query, fileobj, large=None):
+    """كتابة تقرير المدفوعات (PaymentReportQuery) إلى fileobj
+
+    large=None يختار وضع التقارير الكبيرة تلقائياً حسب عدد الحجوزات.
+    """
+    styles = report_styles()
+    totals = query.totals
+
+    doc = SimpleDocTemplate(
+        fileobj,
+        pagesize=A4,
+        rightMargin=PAGE_MARGIN,
+        leftMargin=PAGE_MARGIN,
+        topMargin=1.5*cm,
+        bottomMargin=1.5*cm,
+        title="تقارير المدفوعات"
+    )
+    header = [
+        Paragraph(reshape_arabic_text("تقارير المدفوعات"), styles.title),
+        Paragraph(reshape_arabic_text("القمة العقارية"), styles.subtitle),
+        Spacer(1, 0.3*cm),
+    ]
+
+    # معلومات الفلترة
+    filter_info = []
+    unit_label, report_label = query.describe(format_date_arabic)
+    if unit_label:
+        filter_info.append(reshape_arabic_text(unit_label))
+    if report_label:
+        filter_info.append(reshape_arabic_text(f"التقرير: {report_label}"))
+    elif query.report_type == 'all':
+        filter_info.append(reshape_arabic_text("التقرير: جميع الحجوزات"))
+
+    # تاريخ التصدير
+    export_date = format_date_arabic(datetime.now().date())
+    filter_info.append(reshape_arabic_text(f"تاريخ التصدير: {export_date}"))
+    header.append(Paragraph(" | ".join(filter_info), styles.subtitle))
+    header.append(Spacer(1, 0.5*cm))
+
+    if large is None:
+        large = totals['booking_count'] > pdf_large_report_rows()
+    if large:
+        # مقاطع LongTable متتالية بنفس الرأس تُبنى أثناء الرسم بدلاً من جدول واحد ضخم
+        body = _payment_segments(query, styles)
+    else:
+        data = [_payment_header(styles)]
+        data.extend(_payment_row(booking, styles.cell) for booking in query.iter_rows())
+        data.append(_payment_total_row(totals, styles.cell))
+        table = Table(data, colWidths=PAYMENT_COLUMN_WIDTHS, repeatRows=1)
+        table.setStyle(styles.payment_table)
+        body = [table]
+
+    # ملخص الإجماليات
+    summary_text = f"""
+    <b>ملخص الإجماليات:</b><br/>
+    • إجمالي المدفوعات نقداً: {_money(totals['total_cash'])}<br/>
+    • إجمالي المدفوعات تحويل: {_money(totals['total_transfer'])}<br/>
+    • <b>الإجمالي الكلي: {_money(totals['total_all'])}</b><br/>
+    • عدد الحجوزات: {totals['booking_count']} حجز
+    """
+    footer = [Spacer(1, 0.5*cm), Paragraph(reshape_arabic_text(summary_text), styles.summary)]
+
+    doc.build(FlowableStream(itertools.chain(header, body, footer)), canvasmaker=PageCompressingCanvas)
+
+
+def payment_report_pdf_tempfile(query, large=None):
+    """بناء تقرير المدفوعات في ملف مؤقت على القرص وإرجاعه مفتوحاً من البداية"""
+    tmp = tempfile.TemporaryFile(suffix='.pdf')
+    try:
+        write_payment_report_pdf(query, tmp, large=large)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    return tmp
+
+
+def write_profits_pdf(profits_data, totals, fileobj):
+    """كتابة تقرير الأرباح (نتيجة profits.unit_profits) إلى fileobj"""
+    styles = report_styles()
+    cell = styles.profits_cell
+
+    doc = SimpleDocTemplate(fileobj, pagesize=A4, rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                            topMargin=1*cm, bottomMargin=1*cm)
+    elements = [
+        Paragraph(reshape_arabic_text('تقرير الأرباح'), styles.profits_title),
+        Spacer(1, 0.5*cm),
+    ]
+
+    data = [[Paragraph(reshape_arabic_text(header), styles.profits_header) for header in PROFITS_HEADERS]]
+    for item in profits_data:
+        data.append([
+            Paragraph(reshape_arabic_text(item['unit'].name), cell),
+            Paragraph(reshape_arabic_text(item['owner'].username if item['owner'] else '-'), cell),
+            Paragraph(reshape_arabic_text(_money(item['total_bookings'])), cell),
+            Paragraph(reshape_arabic_text(_money(item['total_expenses'])), cell),
+            Paragraph(reshape_arabic_text(_money(item['net_total'])), cell),
+            Paragraph(reshape_arabic_text(f"{item['percentage']}%"), cell),
+            Paragraph(reshape_arabic_text(_money(item['profit'])), cell),
+        ])
+    data.append([
+        Paragraph(reshape_arabic_text('الإجمالي'), cell),
+        Paragraph('', cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_bookings'])), cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_expenses'])), cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_net'])), cell),
+        Paragraph('', cell),
+        Paragraph(reshape_arabic_text(_money(totals['total_profit'])), cell),
+    ])
+
+    table = Table(data, colWidths=[AVAILABLE_WIDTH / len(PROFITS_HEADERS)] * len(PROFITS_HEADERS))
+    table.setStyle(styles.profits_table)
+    elements.append(table)
+    doc.build(elements)
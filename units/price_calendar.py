@@ -0,0 +1,154 @@
+"""
+تقويم أسعار سنوي لكل وحدة: 366 خانة (خانة لكل يوم من السنة) بسعر اليوم ومصدره
+
+يُبنى من جدول أسعار الوحدة (pricing.py) دون أسعار الحجوزات، ويُحفظ في ذاكرة
+الأسعار المشتركة (pricing_cache) مع قائمة السنوات المحفوظة للوحدة. عند تعديل
+سعر (signals.py) لا يُعاد بناء التقويم كله، بل تُعاد حساب الأيام التي يمسها
+السعر فقط في السنوات المحفوظة:
+أيام ذلك اليوم من الأسبوع، أو تاريخ الإجازة (الخاصة أو العامة)، أو تاريخ ليلة العيد.
+
+الأسعار بالهللة في array('q') (و -1 لليوم بلا سعر)، والمصدر حرف لكل يوم
+(SOURCE_CODES)، فيُرسل شهر أو سنة كاملة دون أي استعلام لكل يوم.
+"""
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+
+from .holidays import public_holidays
+from .pricing import eid_calendar, price_table_cache_seconds, price_tables, pricing_cache
+
+CALENDAR_DAYS = 366
+NO_PRICE = -1
+SOURCE_CODES = {'holiday': 'h', 'eid': 'e', 'weekday': 'w', None: '-'}
+
+PRICE_CALENDAR_CACHE_KEY = 'units:price_calendar:{}:{}'
+PRICE_CALENDAR_YEARS_KEY = 'units:price_calendar_years:{}'
+
+
+def _to_halalas(price):
+    return NO_PRICE if price is None else int(price * 100)
+
+
+class PriceCalendar:
+    """أسعار سنة واحدة لوحدة، الخانة i لليوم الأول من السنة + i"""
+
+    __slots__ = ('unit_id', 'year', 'prices', 'sources')
+
+    def __init__(self, unit_id, year):
+        self.unit_id = unit_id
+        self.year = year
+        self.prices = array('q', [NO_PRICE] * CALENDAR_DAYS)
+        self.sources = bytearray(SOURCE_CODES[None].encode() * CALENDAR_DAYS)
+
+    @property
+    def start(self):
+        return date(self.year, 1, 1)
+
+    def days(self):
+        """أيام السنة الفعلية (365 أو 366)"""
+        return (date(self.year + 1, 1, 1) - self.start).days
+
+    def fill(self, table, eid_nights, public, match=None):
+        """حساب الأيام (كلها، أو التي يقبلها match فقط) من جدول الأسعار"""
+        day = self.start
+        for index in range(self.days()):
+            if match is None or match(day):
+                price, source = table.price(day, eid_nights, public)
+                self.prices[index] = _to_halalas(price)
+                self.sources[index] = ord(SOURCE_CODES[source])
+            day += timedelta(days=1)
+
+    def get(self, day):
+        """(السعر Decimal أو None، حرف المصدر)"""
+        index = (day - self.start).days
+        halalas = self.prices[index]
+        price = None if halalas == NO_PRICE else Decimal(halalas) / 100
+        return price, chr(self.sources[index])
+
+    def values(self, start=None, end=None):
+        """(الأسعار كأرقام JSON، أحرف المصادر) للأيام من start إلى end داخل السنة"""
+        first = 0 if start is None else (start - self.start).days
+        last = self.days() - 1 if end is None else (end - self.start).days
+        prices = [
+            None if halalas == NO_PRICE else (halalas // 100 if halalas % 100 == 0 else halalas / 100)
+            for halalas in self.prices[first:last + 1]
+        ]
+        return prices, self.sources[first:last + 1].decode()
+
+
+def _cached_years(unit_id):
+    return pricing_cache().get(PRICE_CALENDAR_YEARS_KEY.format(unit_id), set())
+
+
+def _store(calendar):
+    timeout = price_table_cache_seconds()
+    cache = pricing_cache()
+    cache.set(PRICE_CALENDAR_CACHE_KEY.format(calendar.unit_id, calendar.year), calendar, timeout)
+    years = set(_cached_years(calendar.unit_id))
+    years.add(calendar.year)
+    cache.set(PRICE_CALENDAR_YEARS_KEY.format(calendar.unit_id), years, timeout)
+
+
+def price_calendar(unit_id, year):
+    """تقويم أسعار سنة لوحدة من الذاكرة المؤقتة، أو بناؤه مرة واحدة"""
+    calendar = pricing_cache().get(PRICE_CALENDAR_CACHE_KEY.format(unit_id, year))
+    if calendar is None:
+        calendar = PriceCalendar(unit_id, year)
+        calendar.fill(price_tables([unit_id])[unit_id], eid_calendar(), public_holidays())
+        _store(calendar)
+    return calendar
+
+
+def window_prices(unit_id, start, end):
+    """(الأسعار، المصادر) لفترة قد تمتد على أكثر من سنة"""
+    prices = []
+    sources = ''
+    for year in range(start.year, end.year + 1):
+        calendar = price_calendar(unit_id, year)
+        year_prices, year_sources = calendar.values(
+            max(start, calendar.start), min(end, date(year, 12, 31))
+        )
+        prices.extend(year_prices)
+        sources += year_sources
+    return prices, sources
+
+
+def pricing_key(instance):
+    """ما يحدد أيام السعر: ('weekday', يوم) أو ('holiday', تاريخ) أو ('eid', نوع، ليلة)"""
+    model_name = instance._meta.model_name
+    if model_name == 'unitpricing':
+        return ('weekday', instance.day_of_week)
+    if model_name == 'holiday':
+        # التاريخ قد يكون نصاً إن أُنشئ الكائن بقيمة نصية
+        return ('holiday', instance._meta.get_field('holiday_date').to_python(instance.holiday_date))
+    return ('eid', instance.pricing_type, instance.night_number)
+
+
+def _matcher(keys):
+    weekdays = {key[1] for key in keys if key[0] == 'weekday'}
+    dates = {key[1] for key in keys if key[0] == 'holiday'}
+    eid_nights = {key[1:] for key in keys if key[0] == 'eid'}
+    if eid_nights:
+        dates.update(day for day, night in eid_calendar().items() if night in eid_nights)
+    return lambda day: day.weekday() in weekdays or day in dates
+
+
+def patch_price_calendars(unit_id, keys):
+    """إعادة حساب أيام الأسعار المعدّلة (keys من pricing_key) في السنوات المحفوظة"""
+    years = _cached_years(unit_id)
+    if not years or not keys:
+        return
+    table = price_tables([unit_id])[unit_id]
+    eid_nights = eid_calendar()
+    public = public_holidays()
+    match = _matcher(keys)
+    cache = pricing_cache()
+    remaining = set()
+    for year in years:
+        calendar = cache.get(PRICE_CALENDAR_CACHE_KEY.format(unit_id, year))
+        if calendar is None:
+            continue
+        calendar.fill(table, eid_nights, public, match)
+        cache.set(PRICE_CALENDAR_CACHE_KEY.format(unit_id, year), calendar, price_table_cache_seconds())
+        remaining.add(year)
+    cache.set(PRICE_CALENDAR_YEARS_KEY.format(unit_id), remaining, price_table_cache_seconds())
@@ -0,0 +1,216 @@
+"""
+محرك أسعار الليالي: سعر أي وحدة في أي ليلة أو فترة
+
+أولوية السعر لليلة (الأعلى أولاً):
+1. booking: سعر اليوم في حجز قائم على الليلة (Booking.price_per_day).
+2. eid: سعر ليلة العيد (SpecialPricing) إن كانت الليلة من ليالي عيد الفطر أو
+   الأضحى حسب EID_START_DATES (الليلة الأولى = يوم العيد الأول).
+3. holiday: سعر إجازة بتاريخها للوحدة (Holiday)، وإلا سعر الإجازة العامة للوحدة
+   (PublicHoliday مع استثناءات الوحدة أو مضاعفها، انظر holidays.py).
+4. weekday: سعر يوم الأسبوع (UnitPricing).
+وإلا فالليلة بلا سعر (None).
+
+أسعار الإجازات والأعياد والأيام تُجمع لكل وحدة في جدول (PriceTable) يُحفظ في
+ذاكرة الأسعار المؤقتة (PRICING_CACHE_ALIAS) لمدة PRICE_TABLE_CACHE_SECONDS،
+ويُحذف عند حفظ أو حذف أي سعر للوحدة (signals.py). ذاكرة الأسعار ملفات مشتركة
+بين عمليات الخادم، فيظهر التعديل في كل العمليات فوراً لا بعد انتهاء المدة
+(مع ذاكرة محلية لكل عملية تبقى العمليات الأخرى على السعر القديم حتى تنتهي
+المدة). أسعار الحجوزات لا تُخزن لأنها تتغير مع كل حجز، وتُقرأ في استعلام نطاق
+واحد لكل دفعة تسعير. الإجازات العامة مشتركة بين الوحدات فلا تدخل في جدول
+الوحدة، وتُمرر لـ PriceTable.price من عرضها المدمج المخزن (public_holidays).
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+from .holidays import holiday_price, public_holidays
+
+PRICE_SOURCES = ('booking', 'eid', 'holiday', 'weekday')
+EID_TYPES = ('eid_al_fitr', 'eid_al_adha')
+EID_NIGHTS = 6
+
+PRICE_TABLE_CACHE_KEY = 'units:price_table:{}'
+
+
+def price_table_cache_seconds():
+    return getattr(settings, 'PRICE_TABLE_CACHE_SECONDS', 300)
+
+
+def pricing_cache():
+    """ذاكرة جداول الأسعار والتقاويم والإجازات العامة (مشتركة بين العمليات)"""
+    return caches[getattr(settings, 'PRICING_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+
+def eid_calendar():
+    """{التاريخ: (نوع العيد، رقم الليلة)} من EID_START_DATES"""
+    calendar = {}
+    for pricing_type, start_dates in getattr(settings, 'EID_START_DATES', {}).items():
+        if pricing_type not in EID_TYPES:
+            continue
+        for start in start_dates:
+            if isinstance(start, str):
+                start = date.fromisoformat(start)
+            for night_number in range(1, EID_NIGHTS + 1):
+                calendar[start + timedelta(days=night_number - 1)] = (pricing_type, night_number)
+    return calendar
+
+
+class PriceTable:
+    """أسعار وحدة واحدة: أيام الأسبوع، الإجازات بتاريخها، ليالي الأعياد"""
+
+    __slots__ = ('unit_id', 'weekday', 'holidays', 'eid')
+
+    def __init__(self, unit_id, weekday=None, holidays=None, eid=None):
+        self.unit_id = unit_id
+        self.weekday = weekday or {}
+        self.holidays = holidays or {}
+        self.eid = eid or {}
+
+    def price(self, night, eid_nights, public=None):
+        """(السعر، المصدر) لليلة بدون الحجوزات، أو (None, None)
+
+        public: الإجازات العامة {التاريخ: PublicHolidayEntry} من public_holidays().
+        """
+        eid_night = eid_nights.get(night)
+        if eid_night is not None and eid_night in self.eid:
+            return self.eid[eid_night], 'eid'
+        if night in self.holidays:
+            return self.holidays[night], 'holiday'
+        entry = public.get(night) if public else None
+        if entry is not None:
+            price = holiday_price(entry, self.unit_id, self.weekday.get(night.weekday()))
+            if price is not None:
+                return price, 'holiday'
+        if night.weekday() in self.weekday:
+            return self.weekday[night.weekday()], 'weekday'
+        return None, None
+
+
+def compile_price_tables(unit_ids):
+    """بناء جداول الأسعار لعدة وحدات من قاعدة البيانات (ثلاثة استعلامات)"""
+    from .models import Holiday, SpecialPricing, UnitPricing
+
+    tables = {unit_id: PriceTable(unit_id) for unit_id in unit_ids}
+    for unit_id, day_of_week, price in UnitPricing.objects.filter(unit_id__in=unit_ids).values_list(
+        'unit_id', 'day_of_week', 'price'
+    ):
+        tables[unit_id].weekday[day_of_week] = price
+    for unit_id, holiday_date, price in Holiday.objects.filter(unit_id__in=unit_ids).values_list(
+        'unit_id', 'holiday_date', 'price'
+    ):
+        tables[unit_id].holidays[holiday_date] = price
+    for unit_id, pricing_type, night_number, price in SpecialPricing.objects.filter(
+        unit_id__in=unit_ids, pricing_type__in=EID_TYPES
+    ).values_list('unit_id', 'pricing_type', 'night_number', 'price'):
+        tables[unit_id].eid[(pricing_type, night_number)] = price
+    return tables
+
+
+def price_tables(unit_ids):
+    """{رقم الوحدة: PriceTable} من الذاكرة المؤقتة، وبناء الناقص في دفعة واحدة"""
+    unit_ids = list(dict.fromkeys(unit_ids))
+    keys = {PRICE_TABLE_CACHE_KEY.format(unit_id): unit_id for unit_id in unit_ids}
+    cache = pricing_cache()
+    cached = cache.get_many(keys)
+    tables = {keys[key]: table for key, table in cached.items()}
+    missing = [unit_id for unit_id in unit_ids if unit_id not in tables]
+    if missing:
+        compiled = compile_price_tables(missing)
+        cache.set_many(
+            {PRICE_TABLE_CACHE_KEY.format(unit_id): table for unit_id, table in compiled.items()},
+            price_table_cache_seconds(),
+        )
+        tables.update(compiled)
+    return tables
+
+
+def invalidate_price_table(unit_id):
+    pricing_cache().delete(PRICE_TABLE_CACHE_KEY.format(unit_id))
+
+
+def booking_prices(unit_ids, start, end):
+    """{رقم الوحدة: {الليلة: سعر الحجز}} للحجوزات المسعّرة في [start, end]"""
+    from .models import Booking
+
+    prices = defaultdict(dict)
+    bookings = Booking.objects.filter(
+        unit_id__in=unit_ids, start_date__lte=end, end_date__gte=start, price_per_day__isnull=False
+    ).values_list('unit_id', 'start_date', 'end_date', 'price_per_day')
+    for unit_id, start_date, end_date, price in bookings:
+        night = max(start_date, start)
+        while night <= min(end_date, end):
+            prices[unit_id][night] = price
+            night += timedelta(days=1)
+    return prices
+
+
+def _price_nights(table, start, end, booked, eid_nights, public):
+    nights = []
+    night = start
+    while night <= end:
+        if night in booked:
+            price, source = booked[night], 'booking'
+        else:
+            price, source = table.price(night, eid_nights, public)
+        nights.append((night, price, source))
+        night += timedelta(days=1)
+    return nights
+
+
+def quote_many(items, include_bookings=True, detail=False):
+    """تسعير عدة (رقم الوحدة، من، إلى) دفعة واحدة
+
+    تُرجع قائمة بنفس الترتيب: total مجموع أسعار الليالي (None إن كانت ليلة
+    بلا سعر)، missing عدد الليالي بلا سعر، sources عدد الليالي لكل مصدر، و
+    nights [{date, price, source}] عند detail=True.
+    """
+    items = list(items)
+    if not items:
+        return []
+    unit_ids = [unit_id for unit_id, _, _ in items]
+    tables = price_tables(unit_ids)
+    eid_nights = eid_calendar()
+    public = public_holidays()
+    booked = defaultdict(dict)
+    if include_bookings:
+        booked = booking_prices(
+            unit_ids, min(start for _, start, _ in items), max(end for _, _, end in items)
+        )
+
+    quotes = []
+    for unit_id, start, end in items:
+        nights = _price_nights(tables[unit_id], start, end, booked[unit_id], eid_nights, public)
+        missing = sum(1 for _, price, _ in nights if price is None)
+        sources = dict.fromkeys(PRICE_SOURCES, 0)
+        for _, _, source in nights:
+            if source is not None:
+                sources[source] += 1
+        quote = {
+            'unit': unit_id,
+            'from': start,
+            'to': end,
+            'nights': len(nights),
+            'total': None if missing else sum((price for _, price, _ in nights), Decimal('0')),
+            'missing': missing,
+            'sources': sources,
+        }
+        if detail:
+            quote['detail'] = [
+                {'date': night, 'price': price, 'source': source} for night, price, source in nights
+            ]
+        quotes.append(quote)
+    return quotes
+
+
+def quote(unit_id, start, end, include_bookings=True, detail=False):
+    """تسعير فترة واحدة لوحدة (انظر quote_many)"""
+    return quote_many([(unit_id, start, end)], include_bookings, detail)[0]
+
+
+def night_price(unit_id, night):
+    """(السعر، المصدر) لليلة واحدة"""
+    detail = quote(unit_id, night, night, detail=True)['detail'][0]
+    return detail['price'], detail['source']
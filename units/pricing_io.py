@@ -0,0 +1,500 @@
+"""
+استيراد وتصدير أسعار كل الوحدات (CSV و Excel) دفعة واحدة
+
+الملف سطر لكل سعر بالأعمدة PRICING_COLUMNS، والعمود type يحدد الجدول ومعنى key:
+- weekday: سعر يوم الأسبوع (UnitPricing)، key من 0 (الإثنين) إلى 6 (الأحد).
+- eid_al_fitr / eid_al_adha / special_holiday: سعر ليلة (SpecialPricing)، key رقم الليلة.
+- holiday: سعر إجازة بتاريخها (Holiday)، key التاريخ YYYY-MM-DD و holiday_name اسمها.
+- public_holiday: إجازة عامة لكل الوحدات (PublicHoliday)، unit_id فارغ و key التاريخ،
+  والسعر ثابت (price) أو مضاعف لسعر يوم الأسبوع (multiplier).
+- holiday_override: سعر إجازة عامة لوحدة (PublicHolidayOverride)، key تاريخ الإجازة
+  العامة، و price أو multiplier أو is_excluded=1 لاستثناء الوحدة منها.
+
+الاستيراد يقرأ الملف ويتحقق منه كاملاً في الذاكرة ويقارنه بالأسعار الحالية
+(ثلاثة استعلامات)، ثم يكتب الجديد والمعدّل فقط بـ bulk_create(update_conflicts=True)
+على مفاتيح unique_together في معاملة واحدة. التجربة (dry run) تُرجع التقرير فقط.
+الأسطر غير الموجودة في الملف لا تُحذف.
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .excel import escape_formula, unescape_formula
+from .exports import Echo
+from .holidays import invalidate_public_holidays
+from .models import Holiday, PublicHoliday, PublicHolidayOverride, SpecialPricing, Unit, UnitPricing
+from .price_calendar import patch_price_calendars
+from .pricing import invalidate_price_table
+
+try:
+    from openpyxl import Workbook, load_workbook
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+PRICING_COLUMNS = ['unit_id', 'unit_name', 'type', 'key', 'holiday_name', 'price', 'multiplier', 'is_excluded']
+REQUIRED_COLUMNS = {'unit_id', 'type', 'key', 'price'}
+
+# نوع السطر في الملف -> pricing_type في SpecialPricing
+SPECIAL_TYPES = {
+    'eid_al_fitr': 'eid_al_fitr',
+    'eid_al_adha': 'eid_al_adha',
+    'special_holiday': 'holiday',
+}
+PRICING_TYPES = ('weekday',) + tuple(SPECIAL_TYPES) + ('holiday', 'public_holiday', 'holiday_override')
+# الأنواع التي key فيها تاريخ، والتي تقبل المضاعف والاستثناء بدل السعر
+DATE_TYPES = ('holiday', 'public_holiday', 'holiday_override')
+PUBLIC_TYPES = ('public_holiday', 'holiday_override')
+NAMED_TYPES = ('holiday', 'public_holiday')
+
+PRICE_MAX = Decimal('99999999.99')
+MULTIPLIER_MAX = Decimal('999.99')
+EXCLUDED_VALUES = {'1': True, 'true': True, 'yes': True, '0': False, 'false': False, 'no': False, '': False}
+
+
+def import_max_rows():
+    return getattr(settings, 'PRICING_IMPORT_MAX_ROWS', 20000)
+
+
+def _price_text(price, multiplier=None, is_excluded=False):
+    if is_excluded:
+        return 'مستثناة'
+    if price is None and multiplier is not None:
+        return f'×{multiplier}'
+    return None if price is None else str(price)
+
+
+# ------------------------------------------------------------------
+# التصدير
+# ------------------------------------------------------------------
+
+def export_rows():
+    """أسطر الأسعار الحالية بترتيب PRICING_COLUMNS: الإجازات العامة أولاً ثم كل وحدة
+    حسب النوع ثم المفتاح"""
+    rows = []
+    for unit_id, unit_name, day_of_week, price in UnitPricing.objects.values_list(
+        'unit_id', 'unit__name', 'day_of_week', 'price'
+    ):
+        rows.append((unit_id, unit_name, 'weekday', day_of_week, '', price, None, False))
+    file_types = {pricing_type: file_type for file_type, pricing_type in SPECIAL_TYPES.items()}
+    for unit_id, unit_name, pricing_type, night_number, price in SpecialPricing.objects.values_list(
+        'unit_id', 'unit__name', 'pricing_type', 'night_number', 'price'
+    ):
+        rows.append((unit_id, unit_name, file_types[pricing_type], night_number, '', price, None, False))
+    for unit_id, unit_name, holiday_date, holiday_name, price in Holiday.objects.values_list(
+        'unit_id', 'unit__name', 'holiday_date', 'holiday_name', 'price'
+    ):
+        rows.append((unit_id, unit_name, 'holiday', holiday_date, holiday_name, price, None, False))
+    for holiday_date, holiday_name, price, multiplier in PublicHoliday.objects.values_list(
+        'holiday_date', 'holiday_name', 'price', 'multiplier'
+    ):
+        rows.append(('', '', 'public_holiday', holiday_date, holiday_name, price, multiplier, False))
+    for unit_id, unit_name, holiday_date, price, multiplier, is_excluded in PublicHolidayOverride.objects.values_list(
+        'unit_id', 'unit__name', 'holiday__holiday_date', 'price', 'multiplier', 'is_excluded'
+    ):
+        rows.append((unit_id, unit_name, 'holiday_override', holiday_date, '', price, multiplier, is_excluded))
+    rows.sort(key=lambda row: (row[0] or 0, PRICING_TYPES.index(row[2]), str(row[3])))
+    return rows
+
+
+def _export_values(row):
+    """قيم السطر كما تُكتب في الملف (التاريخ نصاً والاستثناء 1 أو فارغ)"""
+    unit_id, unit_name, file_type, key, holiday_name, price, multiplier, is_excluded = row
+    if isinstance(key, date):
+        key = key.isoformat()
+    return [
+        unit_id, escape_formula(unit_name), file_type, key, escape_formula(holiday_name),
+        price, multiplier, 1 if is_excluded else '',
+    ]
+
+
+def iter_pricing_csv():
+    """أسطر CSV للتصدير (مع BOM حتى يفتح Excel النص العربي)"""
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(PRICING_COLUMNS)
+    for row in export_rows():
+        yield writer.writerow(_export_values(row))
+
+
+def write_pricing_xlsx(fileobj):
+    """كتابة الأسعار في ملف Excel (ورقة واحدة بنفس أعمدة CSV)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('الأسعار')
+    ws.sheet_view.rightToLeft = True
+    ws.append(PRICING_COLUMNS)
+    for row in export_rows():
+        ws.append(_export_values(row))
+    wb.save(fileobj)
+
+
+# ------------------------------------------------------------------
+# الاستيراد
+# ------------------------------------------------------------------
+
+def read_pricing_file(uploaded):
+    """[(رقم السطر، {العمود: القيمة})] من ملف CSV أو xlsx، وترفع ValueError عند خطأ الملف"""
+    name = (getattr(uploaded, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        if not EXCEL_AVAILABLE:
+            raise ValueError('استيراد Excel يتطلب مكتبة openpyxl')
+        try:
+            wb = load_workbook(uploaded, read_only=True, data_only=True)
+        except Exception:
+            raise ValueError('تعذر قراءة ملف Excel')
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+    elif name.endswith('.csv'):
+        try:
+            text = uploaded.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError('ملف CSV يجب أن يكون بترميز UTF-8')
+        rows = csv.reader(io.StringIO(text))
+    else:
+        raise ValueError('نوع الملف غير مدعوم (CSV أو xlsx)')
+
+    header = next(rows, None)
+    columns = [str(column).strip() if column is not None else '' for column in header or []]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ValueError(f'أعمدة ناقصة: {", ".join(sorted(missing))}')
+
+    parsed = []
+    for line, row in enumerate(rows, start=2):
+        values = dict(zip(columns, row))
+        if all(value in (None, '') for value in values.values()):
+            continue
+        parsed.append((line, values))
+        if len(parsed) > import_max_rows():
+            raise ValueError(f'أقصى عدد للأسطر {import_max_rows()}')
+    return parsed
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return unescape_formula(str(value).strip())
+
+
+def _parse_int(value, low, high, label):
+    try:
+        number = int(_text(value))
+    except ValueError:
+        raise ValueError(f'{label} يجب أن يكون رقماً')
+    if not low <= number <= high:
+        raise ValueError(f'{label} يجب أن يكون بين {low} و {high}')
+    return number
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(_text(value))
+    except ValueError:
+        raise ValueError('تاريخ الإجازة يجب أن يكون YYYY-MM-DD')
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(_text(value).replace(',', ''))
+    except InvalidOperation:
+        raise ValueError('السعر يجب أن يكون رقماً')
+    if not price.is_finite() or price < 0 or price > PRICE_MAX:
+        raise ValueError('السعر خارج الحدود المسموحة')
+    if price != price.quantize(Decimal('0.01')):
+        raise ValueError('السعر بحد أقصى منزلتين عشريتين')
+    return price.quantize(Decimal('0.01'))
+
+
+def _parse_optional_price(value):
+    return None if _text(value) == '' else _parse_price(value)
+
+
+def _parse_multiplier(value):
+    if _text(value) == '':
+        return None
+    try:
+        multiplier = Decimal(_text(value))
+    except InvalidOperation:
+        raise ValueError('المضاعف يجب أن يكون رقماً')
+    if not multiplier.is_finite() or multiplier < 0 or multiplier > MULTIPLIER_MAX:
+        raise ValueError('المضاعف خارج الحدود المسموحة')
+    if multiplier != multiplier.quantize(Decimal('0.01')):
+        raise ValueError('المضاعف بحد أقصى منزلتين عشريتين')
+    return multiplier.quantize(Decimal('0.01'))
+
+
+def _parse_excluded(value):
+    text = _text(value).lower()
+    if text not in EXCLUDED_VALUES:
+        raise ValueError('is_excluded يجب أن يكون 1 أو 0')
+    return EXCLUDED_VALUES[text]
+
+
+class PricingImport:
+    """نتيجة قراءة ملف الأسعار ومقارنته بالحالي، والتطبيق عند عدم وجود أخطاء
+
+    changes: [{line, unit_id, unit_name, type, key, holiday_name, old, new, multiplier,
+    is_excluded, action}] حيث action إحدى create / update / unchanged، و unit_id
+    فارغ (None) للإجازة العامة، و errors: [(رقم السطر، الرسالة)].
+    """
+
+    def __init__(self, rows):
+        self.errors = []
+        self.changes = []
+        self._parse(rows)
+        self._diff()
+        self.errors.sort()
+
+    @property
+    def counts(self):
+        counts = {'create': 0, 'update': 0, 'unchanged': 0}
+        for change in self.changes:
+            if 'action' in change:
+                counts[change['action']] += 1
+        return counts
+
+    def _parse(self, rows):
+        unit_ids = set()
+        for _, values in rows:
+            try:
+                unit_ids.add(int(_text(values.get('unit_id'))))
+            except ValueError:
+                pass
+        self.units = dict(Unit.objects.filter(id__in=unit_ids).values_list('id', 'name'))
+
+        seen = {}
+        for line, values in rows:
+            try:
+                change = self._parse_row(values)
+            except ValueError as e:
+                self.errors.append((line, str(e)))
+                continue
+            identity = (change['unit_id'], change['type'], change['key'])
+            if identity in seen:
+                self.errors.append((line, f'السعر مكرر (السطر {seen[identity]})'))
+                continue
+            seen[identity] = line
+            change['line'] = line
+            self.changes.append(change)
+
+    def _parse_row(self, values):
+        file_type = _text(values.get('type'))
+        if file_type not in PRICING_TYPES:
+            raise ValueError(f'نوع السعر غير معروف: {file_type} ({", ".join(PRICING_TYPES)})')
+        if file_type == 'public_holiday':
+            if _text(values.get('unit_id')):
+                raise ValueError('الإجازة العامة لكل الوحدات: اترك رقم الوحدة فارغاً')
+            unit_id = None
+        else:
+            unit_id = _parse_int(values.get('unit_id'), 1, 2 ** 63 - 1, 'رقم الوحدة')
+            if unit_id not in self.units:
+                raise ValueError(f'الوحدة {unit_id} غير موجودة')
+        if file_type == 'weekday':
+            key = _parse_int(values.get('key'), 0, 6, 'يوم الأسبوع')
+        elif file_type in DATE_TYPES:
+            key = _parse_date(values.get('key'))
+        else:
+            key = _parse_int(values.get('key'), 1, len(SpecialPricing.NIGHT_CHOICES), 'رقم الليلة')
+        holiday_name = _text(values.get('holiday_name'))
+        if len(holiday_name) > Holiday._meta.get_field('holiday_name').max_length:
+            raise ValueError('اسم الإجازة طويل جداً')
+        if file_type in PUBLIC_TYPES:
+            # سعر الإجازة العامة اختياري: المضاعف أو الاستثناء بدلاً منه
+            price = _parse_optional_price(values.get('price'))
+            multiplier = _parse_multiplier(values.get('multiplier'))
+            is_excluded = _parse_excluded(values.get('is_excluded')) if file_type == 'holiday_override' else False
+        else:
+            price = _parse_price(values.get('price'))
+            multiplier = None
+            is_excluded = False
+            if _text(values.get('multiplier')) or _parse_excluded(values.get('is_excluded')):
+                raise ValueError('المضاعف والاستثناء للإجازات العامة فقط')
+        return {
+            'unit_id': unit_id,
+            'unit_name': self.units.get(unit_id, ''),
+            'type': file_type,
+            'key': key,
+            'holiday_name': holiday_name,
+            'new': price,
+            'multiplier': multiplier,
+            'is_excluded': is_excluded,
+        }
+
+    def _existing(self):
+        """{(الوحدة، النوع، المفتاح): (السعر، اسم الإجازة، المضاعف، مستثناة)} للوحدات
+        في الملف وكل الإجازات العامة"""
+        unit_ids = {change['unit_id'] for change in self.changes}
+        existing = {}
+        for unit_id, day_of_week, price in UnitPricing.objects.filter(unit_id__in=unit_ids).values_list(
+            'unit_id', 'day_of_week', 'price'
+        ):
+            existing[(unit_id, 'weekday', day_of_week)] = (price, '', None, False)
+        file_types = {pricing_type: file_type for file_type, pricing_type in SPECIAL_TYPES.items()}
+        for unit_id, pricing_type, night_number, price in SpecialPricing.objects.filter(
+            unit_id__in=unit_ids
+        ).values_list('unit_id', 'pricing_type', 'night_number', 'price'):
+            existing[(unit_id, file_types[pricing_type], night_number)] = (price, '', None, False)
+        for unit_id, holiday_date, holiday_name, price in Holiday.objects.filter(
+            unit_id__in=unit_ids
+        ).values_list('unit_id', 'holiday_date', 'holiday_name', 'price'):
+            existing[(unit_id, 'holiday', holiday_date)] = (price, holiday_name, None, False)
+        for holiday_date, holiday_name, price, multiplier in PublicHoliday.objects.values_list(
+            'holiday_date', 'holiday_name', 'price', 'multiplier'
+        ):
+            existing[(None, 'public_holiday', holiday_date)] = (price, holiday_name, multiplier, False)
+        for unit_id, holiday_date, price, multiplier, is_excluded in PublicHolidayOverride.objects.filter(
+            unit_id__in=unit_ids
+        ).values_list('unit_id', 'holiday__holiday_date', 'price', 'multiplier', 'is_excluded'):
+            existing[(unit_id, 'holiday_override', holiday_date)] = (price, '', multiplier, is_excluded)
+        return existing
+
+    def _diff(self):
+        existing = self._existing()
+        public_dates = {key for _, file_type, key in existing if file_type == 'public_holiday'}
+        public_dates.update(change['key'] for change in self.changes if change['type'] == 'public_holiday')
+        for change in self.changes:
+            if change['type'] == 'holiday_override' and change['key'] not in public_dates:
+                self.errors.append((change['line'], f'لا توجد إجازة عامة بتاريخ {change["key"].isoformat()}'))
+            current = existing.get((change['unit_id'], change['type'], change['key']))
+            if current is None:
+                change['old'] = change['old_multiplier'] = None
+                change['old_excluded'] = False
+                change['action'] = 'create'
+                if change['type'] in NAMED_TYPES and not change['holiday_name']:
+                    self.errors.append((change['line'], 'اسم الإجازة مطلوب للإجازة الجديدة'))
+                continue
+            old_price, old_name, old_multiplier, old_excluded = current
+            change['old'] = old_price
+            change['old_multiplier'] = old_multiplier
+            change['old_excluded'] = old_excluded
+            if change['type'] in NAMED_TYPES and not change['holiday_name']:
+                # بدون اسم في الملف يبقى الاسم الحالي
+                change['holiday_name'] = old_name
+            changed = (
+                old_price != change['new']
+                or old_multiplier != change['multiplier']
+                or old_excluded != change['is_excluded']
+                or (change['type'] in NAMED_TYPES and old_name != change['holiday_name'])
+            )
+            change['action'] = 'update' if changed else 'unchanged'
+
+    def report(self):
+        """التغييرات كقيم نصية للعرض (بدون الأسطر غير المتغيرة)"""
+        return [
+            {
+                'line': change['line'],
+                'unit_id': change['unit_id'],
+                'unit_name': change['unit_name'],
+                'type': change['type'],
+                'key': change['key'].isoformat() if isinstance(change['key'], date) else change['key'],
+                'holiday_name': change['holiday_name'],
+                'old': _price_text(change['old'], change['old_multiplier'], change['old_excluded']),
+                'new': _price_text(change['new'], change['multiplier'], change['is_excluded']),
+                'action': change['action'],
+            }
+            for change in self.changes
+            if change['action'] != 'unchanged'
+        ]
+
+    def apply(self):
+        """كتابة الجديد والمعدّل في معاملة واحدة، وتحديث جداول الأسعار المخزنة بعد الالتزام"""
+        if self.errors:
+            raise ValueError('لا يمكن تطبيق ملف فيه أخطاء')
+        pending = [change for change in self.changes if change['action'] != 'unchanged']
+        weekday, special, holidays, public, overrides = [], [], [], [], []
+        for change in pending:
+            if change['type'] == 'weekday':
+                weekday.append(UnitPricing(
+                    unit_id=change['unit_id'], day_of_week=change['key'], price=change['new'],
+                ))
+            elif change['type'] == 'holiday':
+                holidays.append(Holiday(
+                    unit_id=change['unit_id'], holiday_date=change['key'],
+                    holiday_name=change['holiday_name'], price=change['new'],
+                ))
+            elif change['type'] == 'public_holiday':
+                public.append(PublicHoliday(
+                    holiday_date=change['key'], holiday_name=change['holiday_name'],
+                    price=change['new'], multiplier=change['multiplier'],
+                ))
+            elif change['type'] == 'holiday_override':
+                overrides.append(change)
+            else:
+                special.append(SpecialPricing(
+                    unit_id=change['unit_id'], pricing_type=SPECIAL_TYPES[change['type']],
+                    night_number=change['key'], price=change['new'],
+                ))
+
+        with transaction.atomic():
+            UnitPricing.objects.bulk_create(
+                weekday, update_conflicts=True,
+                unique_fields=['unit', 'day_of_week'], update_fields=['price', 'updated_at'],
+            )
+            SpecialPricing.objects.bulk_create(
+                special, update_conflicts=True,
+                unique_fields=['unit', 'pricing_type', 'night_number'], update_fields=['price', 'updated_at'],
+            )
+            Holiday.objects.bulk_create(
+                holidays, update_conflicts=True,
+                unique_fields=['unit', 'holiday_date'], update_fields=['holiday_name', 'price', 'updated_at'],
+            )
+            PublicHoliday.objects.bulk_create(
+                public, update_conflicts=True,
+                unique_fields=['holiday_date'], update_fields=['holiday_name', 'price', 'multiplier', 'updated_at'],
+            )
+            # الاستثناءات بعد الإجازات العامة حتى تجد إجازات الملف الجديدة
+            holiday_ids = dict(PublicHoliday.objects.filter(
+                holiday_date__in={change['key'] for change in overrides}
+            ).values_list('holiday_date', 'id'))
+            PublicHolidayOverride.objects.bulk_create(
+                [
+                    PublicHolidayOverride(
+                        holiday_id=holiday_ids[change['key']], unit_id=change['unit_id'], price=change['new'],
+                        multiplier=change['multiplier'], is_excluded=change['is_excluded'],
+                    )
+                    for change in overrides
+                ],
+                update_conflicts=True, unique_fields=['holiday', 'unit'],
+                update_fields=['price', 'multiplier', 'is_excluded', 'updated_at'],
+            )
+            # bulk_create لا يرسل signals: تحديث الجداول والتقاويم المخزنة يدوياً
+            transaction.on_commit(lambda: refresh_cached_prices(pending))
+        return self.counts
+
+
+def refresh_cached_prices(changes):
+    """حذف جداول الأسعار وإعادة حساب أيام التقاويم التي تغيرت لكل وحدة
+
+    الإجازة العامة (unit_id فارغ) تمس تاريخها في كل الوحدات.
+    """
+    keys = {}
+    for change in changes:
+        if change['type'] == 'weekday':
+            key = ('weekday', change['key'])
+        elif change['type'] in DATE_TYPES:
+            key = ('holiday', change['key'])
+        else:
+            key = ('eid', SPECIAL_TYPES[change['type']], change['key'])
+        keys.setdefault(change['unit_id'], set()).add(key)
+    if any(change['type'] in PUBLIC_TYPES for change in changes):
+        invalidate_public_holidays()
+    public_keys = keys.pop(None, set())
+    if public_keys:
+        for unit_id in Unit.objects.values_list('id', flat=True):
+            keys.setdefault(unit_id, set()).update(public_keys)
+    for unit_id, unit_keys in keys.items():
+        invalidate_price_table(unit_id)
+        patch_price_calendars(unit_id, unit_keys)
+
+
+def export_filename(extension):
+    return f'pricing_{timezone.localdate().strftime("%Y%m%d")}.{extension}'
@@ -0,0 +1,138 @@
+"""
+خدمة حساب الأرباح للوحدات باستعلامات مجمّعة
+
+تُحسب إيرادات الحجوزات في قاعدة البيانات مباشرة بقاعدة:
+الكاش + التحويل إن وُجدا، وإلا سعر اليوم × عدد الأيام،
+مع ضم المصروفات ونسبة أرباح المالك في نفس الاستعلام، وبدقة Decimal.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, Func, IntegerField,
+    OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+
+from .models import Unit, Booking, Expense
+
+DEFAULT_PROFIT_PERCENTAGE = 50
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+class DaysBetween(Func):
+    """عدد الأيام بين تاريخين (end - start) كعدد صحيح"""
+    output_field = IntegerField()
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+def booking_revenue_expression(prefix=''):
+    """تعبير SQL لقيمة الحجز (يطابق finance.booking_revenue)"""
+    cash = F(f'{prefix}cash_amount')
+    transfer = F(f'{prefix}transfer_amount')
+    price_per_day = F(f'{prefix}price_per_day')
+    nights = Greatest(
+        DaysBetween(F(f'{prefix}end_date'), F(f'{prefix}start_date')) + 1,
+        Value(1),
+        output_field=IntegerField(),
+    )
+    cash_transfer = ExpressionWrapper(
+        Coalesce(cash, Value(Decimal('0'))) + Coalesce(transfer, Value(Decimal('0'))),
+        output_field=MONEY_FIELD,
+    )
+    return Case(
+        When(GreaterThan(cash_transfer, Value(Decimal('0'))), then=cash_transfer),
+        When(Q(**{f'{prefix}price_per_day__isnull': False}),
+             then=ExpressionWrapper(price_per_day * nights, output_field=MONEY_FIELD)),
+        default=Value(Decimal('0')),
+        output_field=MONEY_FIELD,
+    )
+
+
+def annotate_unit_financials(units):
+    """إضافة total_revenue و total_expenses و booking_count و percentage لكل وحدة
+
+    كل القيم تُحسب في استعلام واحد عبر subqueries مجمّعة.
+    """
+    bookings = Booking.objects.filter(unit=OuterRef('pk')).order_by().values('unit')
+    revenue = bookings.annotate(total=Sum(booking_revenue_expression())).values('total')
+    booking_count = bookings.annotate(total=Count('id')).values('total')
+    expenses = (
+        Expense.objects.filter(unit=OuterRef('pk')).order_by().values('unit')
+        .annotate(total=Sum('price')).values('total')
+    )
+    return units.annotate(
+        total_revenue=Coalesce(Subquery(revenue, output_field=MONEY_FIELD), Value(Decimal('0')),
+                               output_field=MONEY_FIELD),
+        total_expenses=Coalesce(Subquery(expenses, output_field=MONEY_FIELD), Value(Decimal('0')),
+                                output_field=MONEY_FIELD),
+        booking_count=Coalesce(Subquery(booking_count, output_field=IntegerField()), Value(0)),
+        percentage=Coalesce(F('owner__profit_percentage__percentage'),
+                            Value(DEFAULT_PROFIT_PERCENTAGE)),
+    )
+
+
+def calculate_profit(net_total, percentage):
+    """حصة المالك من الصافي مقرّبة إلى هللة"""
+    return (net_total * percentage / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def unit_profits(units=None):
+    """بيانات الأرباح لكل وحدة في استعلام واحد
+
+    تُرجع قائمة قواميس بالمفاتيح: unit, owner, total_bookings, total_expenses,
+    net_total, percentage, profit (القيم المالية Decimal).
+    """
+    if units is None:
+        units = Unit.objects.all()
+    units = annotate_unit_financials(units.select_related('owner')).order_by('name')
+
+    profits_data = []
+    for unit in units:
+        total_bookings = unit.total_revenue.quantize(CENT)
+        total_expenses = unit.total_expenses.quantize(CENT)
+        net_total = total_bookings - total_expenses
+        profits_data.append({
+            'unit': unit,
+            'owner': unit.owner,
+            'total_bookings': total_bookings,
+            'total_expenses': total_expenses,
+            'net_total': net_total,
+            'percentage': unit.percentage,
+            'profit': calculate_profit(net_total, unit.percentage),
+        })
+    return profits_data
+
+
+def profits_totals(profits_data):
+    """إجماليات جدول الأرباح"""
+    return {
+        'total_bookings': sum((item['total_bookings'] for item in profits_data), Decimal('0.00')),
+        'total_expenses': sum((item['total_expenses'] for item in profits_data), Decimal('0.00')),
+        'total_net': sum((item['net_total'] for item in profits_data), Decimal('0.00')),
+        'total_profit': sum((item['profit'] for item in profits_data), Decimal('0.00')),
+    }
+
+
+def top_units_by_bookings(start_date, end_date, limit=10):
+    """أعلى الوحدات بعدد الحجوزات خلال فترة (مع قيمة الحجوزات) في استعلام واحد"""
+    return list(
+        Booking.objects.filter(start_date__gte=start_date, start_date__lte=end_date)
+        .order_by()
+        .values('unit__name')
+        .annotate(booking_count=Count('id'), total_amount=Sum(booking_revenue_expression()))
+        .order_by('-booking_count')[:limit]
+    )
@@ -0,0 +1,156 @@
+"""
+طبقة استعلام تقارير المدفوعات المشتركة بين صفحة HTML وتصدير PDF و Excel
+
+تُبنى الفلترة (الوحدة + يومي/أسبوعي/شهري) مرة واحدة، وتُحسب الإجماليات
+في استعلام تجميع شرطي واحد، وتُقرأ الصفوف في استعلام ثانٍ فقط.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils.functional import cached_property
+
+from .models import Booking, Unit
+
+REPORT_TYPES = ('all', 'daily', 'weekly', 'monthly')
+REPORT_TYPE_LABELS = {
+    'all': 'جميع الحجوزات',
+    'daily': 'يومي',
+    'weekly': 'أسبوعي',
+    'monthly': 'شهري',
+}
+
+ROW_FIELDS = (
+    'unit__name', 'start_date', 'customer_name', 'customer_phone',
+    'cash_amount', 'transfer_amount',
+)
+
+
+class PaymentRow(namedtuple('PaymentRow', [
+    'unit_name', 'start_date', 'customer_name', 'customer_phone',
+    'cash_amount', 'transfer_amount',
+])):
+    """صف حجز خفيف (بدون كائن Booking كامل)"""
+    __slots__ = ()
+
+    @property
+    def total_amount(self):
+        """إجمالي المبلغ (كاش + تحويل)"""
+        return (self.cash_amount or 0) + (self.transfer_amount or 0)
+
+
+def report_date_range(report_type, selected_date):
+    """حساب فترة التقرير (من، إلى) حسب نوعه، أو None لجميع الحجوزات"""
+    if report_type not in ('daily', 'weekly', 'monthly') or not selected_date:
+        return None
+    try:
+        target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+    if report_type == 'daily':
+        return target_date, target_date
+    if report_type == 'weekly':
+        week_start = target_date - timedelta(days=target_date.weekday())
+        return week_start, week_start + timedelta(days=6)
+
+    month_start = target_date.replace(day=1)
+    if month_start.month == 12:
+        month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
+    else:
+        month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
+    return month_start, month_end
+
+
+class PaymentReportQuery:
+    """فلاتر تقرير المدفوعات مع الإجماليات والصفوف"""
+
+    def __init__(self, unit_id='', report_type='all', selected_date=''):
+        self.unit_id = unit_id or 'all'
+        self.report_type = report_type if report_type in REPORT_TYPES else 'all'
+        self.selected_date = selected_date or ''
+        self.date_range = report_date_range(self.report_type, self.selected_date)
+
+        self.unit_pk = None
+        if self.unit_id != 'all':
+            try:
+                self.unit_pk = int(self.unit_id)
+            except (TypeError, ValueError):
+                self.unit_pk = None
+
+    @classmethod
+    def from_request(cls, request):
+        data = request.POST if request.method == 'POST' else request.GET
+        return cls(
+            unit_id=data.get('unit_id', ''),
+            report_type=data.get('report_type', 'all'),
+            selected_date=data.get('date', ''),
+        )
+
+    def params(self):
+        """معاملات الفلترة كقاموس (لإعادة بناء الرابط أو حفظ المهمة)"""
+        return {
+            'unit_id': self.unit_id,
+            'report_type': self.report_type,
+            'date': self.selected_date,
+        }
+
+    def apply(self, queryset, date_field='start_date'):
+        """تطبيق فلاتر الوحدة والفترة على أي queryset يحتوي unit وحقل تاريخ"""
+        if self.unit_pk is not None:
+            queryset = queryset.filter(unit_id=self.unit_pk)
+        if self.date_range is not None:
+            start, end = self.date_range
+            queryset = queryset.filter(**{
+                f'{date_field}__gte': start,
+                f'{date_field}__lte': end,
+            })
+        return queryset
+
+    @cached_property
+    def bookings(self):
+        """الحجوزات المفلترة مرتبة من الأحدث"""
+        return self.apply(Booking.objects.all()).order_by('-start_date')
+
+    @cached_property
+    def totals(self):
+        """الإجماليات وعدد الحجوزات في استعلام تجميع شرطي واحد"""
+        zero = Decimal('0')
+        result = self.bookings.order_by().aggregate(
+            total_cash=Sum('cash_amount', default=zero),
+            total_transfer=Sum('transfer_amount', default=zero),
+            booking_count=Count('id'),
+            cash_count=Count('id', filter=Q(cash_amount__gt=0)),
+            transfer_count=Count('id', filter=Q(transfer_amount__gt=0)),
+        )
+        result['total_all'] = result['total_cash'] + result['total_transfer']
+        return result
+
+    def iter_rows(self, chunk_size=2000):
+        """مكرّر صفوف خفيف يُقرأ على دفعات (للتصدير)"""
+        for values in self.bookings.values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size):
+            yield PaymentRow(*values)
+
+    @cached_property
+    def rows(self):
+        """جميع الصفوف كقائمة (تُقرأ مرة واحدة ويُعاد استخدامها)"""
+        return list(self.iter_rows())
+
+    @cached_property
+    def unit_name(self):
+        """اسم الوحدة المحددة في الفلتر (إن وُجدت)"""
+        if self.unit_pk is None:
+            return None
+        rows = self.__dict__.get('rows')
+        if rows:
+            return rows[0].unit_name
+        return Unit.objects.filter(pk=self.unit_pk).values_list('name', flat=True).first()
+
+    def describe(self, date_formatter):
+        """وصف الفلاتر للعناوين: (وصف الوحدة، وصف نوع التقرير) أو None لكل منهما"""
+        unit_label = f'الوحدة: {self.unit_name}' if self.unit_name else None
+        report_label = None
+        if self.report_type != 'all' and self.selected_date:
+            report_label = f'{REPORT_TYPE_LABELS[self.report_type]} - {date_formatter(self.selected_date)}'
+        return unit_label, report_label
@@ -0,0 +1,186 @@
+"""
+الاحتفاظ بسجل الزيارات: أرشفة الأيام القديمة ثم حذفها وضغط قاعدة البيانات
+
+لكل يوم أقدم من فترة الاحتفاظ:
+1. تُجمّع زياراته في ملخصات VisitDailyRollup (حتى تبقى الإحصائيات صحيحة).
+2. تُكتب في ملف أرشيف مضغوط JSON Lines مقسّم حسب التاريخ:
+   VISIT_ARCHIVE_DIR/YYYY/MM/visits-YYYY-MM-DD.jsonl.gz
+3. تُحذف من قاعدة البيانات على دفعات صغيرة (كل دفعة معاملة مستقلة)
+   حتى لا يُقفل الملف طويلاً أمام الحجوزات.
+
+إعادة التشغيل بعد انقطاع آمنة: اليوم الذي له ملف أرشيف لا يُجمّع مرة أخرى،
+ويُحذف فقط ما أُرشف فعلاً (حسب أكبر رقم زيارة في الأرشيف).
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Visit
+from .rollups import add_rollup_counts, compute_rollups, day_start, replace_rollups
+
+# اسم الحقل في الأرشيف -> مصدره في قاعدة البيانات (النصوص تُكتب كاملة وليس أرقامها)
+ARCHIVE_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'user_id': 'user_id',
+    'session_key': 'session_key',
+    'ip_address': 'ip_address',
+    'user_agent': 'user_agent__value',
+    'path': 'path__value',
+    'referer': 'referer__value',
+    'weight': 'weight',
+}
+
+VACUUM_MODES = ('auto', 'incremental', 'convert', 'full', 'none')
+
+
+def retention_days():
+    """عدد الأيام التي تبقى فيها الزيارات الخام في قاعدة البيانات"""
+    return getattr(settings, 'VISIT_RETENTION_DAYS', 90)
+
+
+def archive_dir():
+    return str(getattr(settings, 'VISIT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive', 'visits')))
+
+
+def archive_batch_size():
+    """عدد الزيارات المحذوفة في كل معاملة"""
+    return getattr(settings, 'VISIT_ARCHIVE_BATCH_SIZE', 1000)
+
+
+def archive_cutoff(days=None):
+    """أول يوم يُحتفظ به (كل ما قبله يُؤرشف)"""
+    return timezone.localdate() - timedelta(days=retention_days() if days is None else days)
+
+
+def archive_path(day, part=0):
+    suffix = f'.part{part}' if part else ''
+    return os.path.join(archive_dir(), f'{day:%Y}', f'{day:%m}', f'visits-{day.isoformat()}{suffix}.jsonl.gz')
+
+
+def _existing_parts(day):
+    parts = []
+    while os.path.exists(archive_path(day, len(parts))):
+        parts.append(archive_path(day, len(parts)))
+    return parts
+
+
+def _archived_max_id(paths):
+    max_id = 0
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    max_id = max(max_id, json.loads(line)['id'])
+    return max_id
+
+
+def _serialize(row):
+    record = dict(zip(ARCHIVE_FIELDS, row))
+    record['created_at'] = record['created_at'].isoformat()
+    return record
+
+
+def _write_archive(path, visits):
+    """كتابة الزيارات إلى ملف gzip (عبر ملف مؤقت ثم إعادة تسمية): (العدد، أكبر رقم)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    count = 0
+    max_id = 0
+    rows = visits.order_by('id').values_list(*ARCHIVE_FIELDS.values()).iterator(chunk_size=archive_batch_size())
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+        for row in rows:
+            fh.write(json.dumps(_serialize(row), ensure_ascii=False) + '\n')
+            count += 1
+            max_id = row[0]
+    os.replace(tmp_path, path)
+    return count, max_id
+
+
+def delete_in_batches(visits, batch_size=None, pause=0):
+    """حذف الزيارات على دفعات بترتيب الرقم، كل دفعة في معاملة قصيرة"""
+    batch_size = batch_size or archive_batch_size()
+    deleted = 0
+    while True:
+        ids = list(visits.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic(using=router.db_for_write(Visit)):
+            Visit.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if pause:
+            time.sleep(pause)
+
+
+def days_to_archive(cutoff):
+    """الأيام (بالتوقيت المحلي) التي لها زيارات أقدم من cutoff"""
+    return list(
+        Visit.objects.filter(created_at__lt=day_start(cutoff))
+        .annotate(day=TruncDate('created_at'))
+        .values_list('day', flat=True)
+        .distinct()
+        .order_by('day')
+    )
+
+
+def day_visits(day):
+    return Visit.objects.filter(created_at__gte=day_start(day), created_at__lt=day_start(day + timedelta(days=1)))
+
+
+def archive_day(day, batch_size=None, pause=0):
+    """أرشفة يوم واحد: تجميع، ثم كتابة الأرشيف، ثم الحذف. تُرجع (المؤرشف، المحذوف)"""
+    visits = day_visits(day)
+    existing = _existing_parts(day)
+
+    if not existing:
+        # تجميع اليوم كاملاً في الملخصات قبل أن يُحذف من السجل
+        replace_rollups(day, day + timedelta(days=1))
+        archived, max_id = _write_archive(archive_path(day), visits)
+    else:
+        # يوم أُرشف سابقاً وانقطع حذفه: لا إعادة تجميع، فقط ما لم يُؤرشف بعد
+        max_id = _archived_max_id(existing)
+        archived = 0
+        extra = visits.filter(id__gt=max_id)
+        if extra.exists():
+            add_rollup_counts(compute_rollups(extra))
+            archived, extra_max_id = _write_archive(archive_path(day, len(existing)), extra)
+            max_id = max(max_id, extra_max_id)
+
+    deleted = delete_in_batches(visits.filter(id__lte=max_id), batch_size, pause)
+    return archived, deleted
+
+
+def reclaim_space(mode='auto'):
+    """استرجاع المساحة بعد الحذف في SQLite
+
+    auto: incremental_vacuum إن كانت القاعدة بوضع auto_vacuum=INCREMENTAL، وإلا
+    لا شيء ('skipped') وتُعاد الصفحات المحررة للاستخدام داخل الملف.
+    convert: تحويل لمرة واحدة إلى auto_vacuum=INCREMENTAL ثم VACUUM.
+    full: VACUUM. الخياران الأخيران يعيدان كتابة الملف كله بقفل حصري طوال
+    التنفيذ، فلا يُستخدمان إلا عند طلبهما صراحة في وقت صيانة.
+    القواعد الجديدة تُنشأ بوضع INCREMENTAL (SQLITE_OPTIONS في الإعدادات).
+    """
+    connection = connections[router.db_for_write(Visit)]
+    if mode == 'none' or connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        if mode == 'auto':
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] != 2:
+                return 'skipped'
+            mode = 'incremental'
+        if mode == 'incremental':
+            cursor.execute('PRAGMA incremental_vacuum')
+            cursor.fetchall()  # كل خطوة تحرر صفحة، فيجب استهلاك النتيجة كاملة
+        else:
+            if mode == 'convert':
+                cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cursor.execute('VACUUM')
+    return mode
@@ -0,0 +1,187 @@
+"""
+ملخصات الزيارات اليومية (التاريخ، المستخدم، مجموعة المسار، العدد)
+
+تقرأ لوحة التحكم إحصائيات الزيارات من هذا الجدول الصغير مع ذاكرة مؤقتة
+قصيرة بدلاً من عدّ سجل الزيارات الخام مع كل صفحة. يُحدّث الجدول تدريجياً
+مع كل دفعة زيارات تُكتب، ويعيد أمر `rollup_visits` حساب الأيام الأخيرة من
+السجل الخام لتصحيح أي فرق.
+"""
+from collections import Counter
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Visit, VisitDailyRollup
+
+STATS_CACHE_KEY = 'units:visit_rollup_stats'
+
+PATH_BUCKET_DEPTH = 3
+PATH_BUCKET_MAX_LENGTH = 100
+
+
+def path_bucket(path):
+    """تجميع المسارات المتشابهة: الأرقام تصبح * ويُكتفى بأول ثلاثة أجزاء
+
+    /unit/12/pricing/ -> /unit/*/pricing/
+    """
+    segments = [segment for segment in (path or '').split('/') if segment][:PATH_BUCKET_DEPTH]
+    if not segments:
+        return '/'
+    segments = ['*' if segment.isdigit() else segment for segment in segments]
+    return ('/' + '/'.join(segments) + '/')[:PATH_BUCKET_MAX_LENGTH]
+
+
+def visit_date(value):
+    """تاريخ الزيارة بالتوقيت المحلي (مثل TruncDate)"""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def stats_cache_seconds():
+    return getattr(settings, 'VISIT_STATS_CACHE_SECONDS', 60)
+
+
+def add_visits_to_rollups(records):
+    """إضافة دفعة زيارات (قواميس حقول Visit) إلى الملخصات بتحديثات ذرية"""
+    counts = Counter()
+    for record in records:
+        user = record.get('user')
+        user_id = record.get('user_id', getattr(user, 'pk', None))
+        counts[(visit_date(record['created_at']), user_id, path_bucket(record.get('path')))] += record.get('weight', 1)
+    add_rollup_counts(counts)
+
+
+def _add_rollup_count(using, day, user_id, bucket, count):
+    rollup = VisitDailyRollup.objects.filter(date=day, user_id=user_id, path_bucket=bucket)
+    if rollup.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic(using=using):
+            VisitDailyRollup.objects.create(date=day, user_id=user_id, path_bucket=bucket, count=count)
+    except IntegrityError:
+        # عامل آخر أنشأ الصف بين التحديث والإدراج (القيد unique_visit_rollup_bucket)
+        rollup.update(count=F('count') + count)
+
+
+def add_rollup_counts(counts):
+    """إضافة {(التاريخ، المستخدم، المجموعة): العدد} إلى الملخصات بتحديثات ذرية"""
+    using = router.db_for_write(VisitDailyRollup)
+    with transaction.atomic(using=using):
+        for (day, user_id, bucket), count in counts.items():
+            _add_rollup_count(using, day, user_id, bucket, count)
+
+
+def compute_rollups(visits):
+    """تجميع queryset زيارات إلى {(التاريخ، المستخدم، المجموعة): العدد} (مجموع الأوزان)"""
+    rows = (
+        visits.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'user_id', 'path__value')
+        .annotate(visit_count=Sum('weight'))
+    )
+    counts = Counter()
+    for row in rows.iterator():
+        counts[(row['day'], row['user_id'], path_bucket(row['path__value']))] += row['visit_count']
+    return counts
+
+
+def day_start(day):
+    """بداية اليوم بالتوقيت المحلي"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def replace_rollups(since, until=None):
+    """إعادة حساب ملخصات الأيام [since, until) من السجل الخام وإرجاع عدد الصفوف
+
+    العدّ والحذف والإنشاء في معاملة واحدة (BEGIN IMMEDIATE يأخذ قفل الكتابة من
+    بدايتها)، فدفعة زيارات تُكتب أثناء إعادة الحساب تنتظر حتى تنتهي ثم تُضاف
+    إلى الصفوف الجديدة، فلا تضيع ولا تُحسب مرتين.
+    """
+    visits = Visit.objects.filter(created_at__gte=day_start(since))
+    rollups = VisitDailyRollup.objects.filter(date__gte=since)
+    if until is not None:
+        visits = visits.filter(created_at__lt=day_start(until))
+        rollups = rollups.filter(date__lt=until)
+
+    with transaction.atomic(using=router.db_for_write(VisitDailyRollup)):
+        counts = compute_rollups(visits)
+        rollups.delete()
+        VisitDailyRollup.objects.bulk_create(
+            [
+                VisitDailyRollup(date=day, user_id=user_id, path_bucket=bucket, count=count)
+                for (day, user_id, bucket), count in counts.items()
+            ],
+            batch_size=500,
+        )
+    cache.delete(STATS_CACHE_KEY)
+    return len(counts)
+
+
+def rebuild_rollups(since=None):
+    """إعادة حساب الأيام من since حتى اليوم من سجل الزيارات الخام
+
+    الافتراضي: من آخر يوم مُجمّع (قد يكون جزئياً). لا تُمس الأيام الأقدم من
+    أول زيارة خام موجودة، لأنها قد تكون أُرشفت وبقيت في الملخصات فقط.
+    تُرجع (أول يوم أُعيد حسابه، عدد الصفوف) أو (None, 0) إن لم توجد زيارات.
+    """
+    first_visit = Visit.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first_visit is None:
+        return None, 0
+
+    if since is None:
+        since = VisitDailyRollup.objects.aggregate(last=Max('date'))['last']
+    earliest = visit_date(first_visit)
+    if since is None or since < earliest:
+        since = earliest
+
+    return since, replace_rollups(since)
+
+
+def _compute_stats():
+    # فقط المستثمرين والزوار (بدون admin/staff). الملخصات قد تكون في قاعدة بيانات
+    # أخرى (routers.py)، فلا ربط مع جدول المستخدمين في نفس الاستعلام
+    User = get_user_model()
+    staff_ids = list(User.objects.filter(Q(is_staff=True) | Q(is_superuser=True)).values_list('id', flat=True))
+    rollups = VisitDailyRollup.objects.exclude(user_id__in=staff_ids)
+    totals = rollups.aggregate(
+        total=Sum('count', default=0),
+        registered=Sum('count', filter=Q(user__isnull=False), default=0),
+        anonymous=Sum('count', filter=Q(user__isnull=True), default=0),
+        today=Sum('count', filter=Q(date=timezone.localdate()), default=0),
+    )
+    per_user = list(
+        rollups.filter(user__isnull=False)
+        .values('user_id')
+        .annotate(visit_count=Sum('count'))
+        .order_by('-visit_count')
+    )
+    users = User.objects.in_bulk([row['user_id'] for row in per_user])
+    # مستخدم محذوف بقيت ملخصاته (قبل تنظيفها) لا يظهر في القائمة
+    per_user = [row for row in per_user if row['user_id'] in users]
+    for row in per_user:
+        user = users[row['user_id']]
+        row['user__username'] = user.username
+        row['user__email'] = user.email
+    return {
+        'total_visits': totals['total'],
+        'registered_visits': totals['registered'],
+        'anonymous_visits': totals['anonymous'],
+        'today_visits': totals['today'],
+        'per_user': per_user,
+    }
+
+
+def visit_rollup_stats():
+    """إحصائيات الزيارات من الملخصات مع ذاكرة مؤقتة قصيرة (VISIT_STATS_CACHE_SECONDS)"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = _compute_stats()
+        cache.set(STATS_CACHE_KEY, stats, stats_cache_seconds())
+    return stats
@@ -0,0 +1,63 @@
+"""
+توجيه جداول سجل الزيارات إلى قاعدة بيانات منفصلة
+
+SQLite يسمح بكاتب واحد فقط لكل ملف، فكتابة الزيارات في نفس ملف الحجوزات
+تجعل الحجز ينتظر خلف تسجيل الصفحات. هذا الموجّه يرسل الزيارات وجداولها
+(الملخصات اليومية وجداول القيم) إلى قاعدة ANALYTICS_DATABASE (الافتراضي
+'analytics') إن كانت معرّفة في DATABASES، وإلا تبقى في القاعدة الافتراضية.
+
+العلاقة بالمستخدم بين القاعدتين بدون قيد مفتاح أجنبي، ولا تُستخدم الاستعلامات
+التي تربط جداول القاعدتين (انظر rollups.py و admin.py).
+
+بعد الإعداد:
+    python manage.py migrate --database=analytics
+    python manage.py move_visits_to_analytics
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+ANALYTICS_MODELS = frozenset({
+    'visit', 'visitdailyrollup', 'visituseragent', 'visitpath', 'visitreferer',
+})
+
+
+def analytics_alias():
+    """اسم قاعدة بيانات الزيارات، أو None إن لم تكن معرّفة"""
+    alias = getattr(settings, 'ANALYTICS_DATABASE', 'analytics')
+    return alias if alias in settings.DATABASES else None
+
+
+def is_analytics_model(model):
+    """النموذج أو الكائن (يقبل request.user الكسول لأن _meta يمر عبره)"""
+    return model._meta.app_label == 'units' and model._meta.model_name in ANALYTICS_MODELS
+
+
+class AnalyticsRouter:
+    """إرسال نماذج الزيارات إلى قاعدة التحليلات وبقية النماذج إلى الافتراضية"""
+
+    def db_for_read(self, model, **hints):
+        if is_analytics_model(model):
+            return analytics_alias()
+        # مثل visit.user: بدون هذا يقرأ Django المستخدم من قاعدة الزيارة نفسها
+        instance = hints.get('instance')
+        if instance is not None and is_analytics_model(instance) and analytics_alias():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # الزيارة تشير إلى المستخدم في القاعدة الأخرى (بدون قيد)
+        if is_analytics_model(obj1) or is_analytics_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = analytics_alias()
+        if alias is None:
+            return None
+        if app_label == 'units' and model_name in ANALYTICS_MODELS:
+            return db == alias
+        if db == alias:
+            return False
+        return None
@@ -1,7 +1,16 @@
-from django.db.models.signals import class_prepared
+from django.db import transaction
+from django.db.models.signals import class_prepared, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.contrib.auth.validators import ASCIIUsernameValidator, UnicodeUsernameValidator
+from .finance import ZERO, adjust_unit_summary, booking_instance_revenue
+from .holidays import invalidate_public_holidays
+from .models import (
+    Booking, Expense, Holiday, PublicHoliday, PublicHolidayOverride, SpecialPricing, Unit,
+    UnitFinancialSummary, UnitPricing, Visit, VisitDailyRollup,
+)
+from .price_calendar import patch_price_calendars, pricing_key
+from .pricing import invalidate_price_table
 from .validators import validate_arabic_username
 
 
@@ -19,3 +28,191 @@ def remove_default_username_validator(sender, **kwargs):
         # إضافة الـ validator المخصص
         username_field.validators.append(validate_arabic_username)
 
+
+
+# ------------------------------------------------------------------
+# تحديث الملخص المالي للوحدات تدريجياً مع كل حجز أو مصروف
+# ------------------------------------------------------------------
+
+
+@receiver(post_save, sender=Unit)
+def create_unit_financial_summary(sender, instance, created, raw=False, **kwargs):
+    """إنشاء ملخص فارغ لكل وحدة جديدة"""
+    if created and not raw:
+        UnitFinancialSummary.objects.get_or_create(unit=instance)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_revenue(sender, instance, raw=False, **kwargs):
+    """حفظ القيمة السابقة للحجز قبل التعديل لحساب الفرق"""
+    instance._summary_previous = None
+    if raw or not instance.pk:
+        return
+    previous = Booking.objects.filter(pk=instance.pk).only(
+        'unit_id', 'cash_amount', 'transfer_amount', 'price_per_day', 'start_date', 'end_date'
+    ).first()
+    if previous is not None:
+        instance._summary_previous = (previous.unit_id, booking_instance_revenue(previous))
+
+
+@receiver(post_save, sender=Booking)
+def update_summary_on_booking_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    revenue = booking_instance_revenue(instance)
+    previous = getattr(instance, '_summary_previous', None)
+    if previous is None:
+        adjust_unit_summary(instance.unit_id, revenue=revenue, bookings=1)
+        return
+    previous_unit_id, previous_revenue = previous
+    if previous_unit_id == instance.unit_id:
+        adjust_unit_summary(instance.unit_id, revenue=revenue - previous_revenue)
+    else:
+        adjust_unit_summary(previous_unit_id, revenue=-previous_revenue, bookings=-1)
+        adjust_unit_summary(instance.unit_id, revenue=revenue, bookings=1)
+
+
+@receiver(post_delete, sender=Booking)
+def update_summary_on_booking_delete(sender, instance, **kwargs):
+    adjust_unit_summary(instance.unit_id, revenue=-booking_instance_revenue(instance), bookings=-1)
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_price(sender, instance, raw=False, **kwargs):
+    """حفظ سعر المصروف السابق قبل التعديل لحساب الفرق"""
+    instance._summary_previous = None
+    if raw or not instance.pk:
+        return
+    previous = Expense.objects.filter(pk=instance.pk).values_list('unit_id', 'price').first()
+    if previous is not None:
+        instance._summary_previous = previous
+
+
+@receiver(post_save, sender=Expense)
+def update_summary_on_expense_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    price = instance.price or ZERO
+    previous = getattr(instance, '_summary_previous', None)
+    if previous is None:
+        adjust_unit_summary(instance.unit_id, expenses=price)
+        return
+    previous_unit_id, previous_price = previous
+    previous_price = previous_price or ZERO
+    if previous_unit_id == instance.unit_id:
+        adjust_unit_summary(instance.unit_id, expenses=price - previous_price)
+    else:
+        adjust_unit_summary(previous_unit_id, expenses=-previous_price)
+        adjust_unit_summary(instance.unit_id, expenses=price)
+
+
+@receiver(post_delete, sender=Expense)
+def update_summary_on_expense_delete(sender, instance, **kwargs):
+    adjust_unit_summary(instance.unit_id, expenses=-(instance.price or ZERO))
+
+
+# ------------------------------------------------------------------
+# حذف زيارات المستخدم وملخصاتها عند حذفه (قد تكون في قاعدة بيانات أخرى)
+# ------------------------------------------------------------------
+
+
+@receiver(post_delete, sender=User)
+def delete_user_visits(sender, instance, **kwargs):
+    Visit.objects.filter(user_id=instance.pk).delete()
+    VisitDailyRollup.objects.filter(user_id=instance.pk).delete()
+
+
+# ------------------------------------------------------------------
+# حذف جدول أسعار الوحدة المخزن وتحديث أيام تقويم الأسعار عند تعديل أي سعر
+# ------------------------------------------------------------------
+
+PRICING_MODELS = (UnitPricing, SpecialPricing, Holiday)
+
+
+def remember_pricing_previous(sender, instance, raw=False, **kwargs):
+    """حفظ الوحدة والأيام السابقة للسعر قبل التعديل (قد يُنقل لوحدة أو يوم آخر)"""
+    instance._pricing_previous = None
+    if raw or not instance.pk:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._pricing_previous = (previous.unit_id, pricing_key(previous))
+
+
+def refresh_unit_prices(sender, instance, **kwargs):
+    changes = {instance.unit_id: {pricing_key(instance)}}
+    previous = getattr(instance, '_pricing_previous', None)
+    if previous is not None:
+        changes.setdefault(previous[0], set()).add(previous[1])
+
+    def refresh():
+        for unit_id, keys in changes.items():
+            invalidate_price_table(unit_id)
+            patch_price_calendars(unit_id, keys)
+
+    # الحذف فوراً، ثم مرة أخرى بعد الالتزام: قراءة داخل المعاملة قد تخزن الجدول قبل اكتمالها
+    for unit_id in changes:
+        invalidate_price_table(unit_id)
+    transaction.on_commit(refresh)
+
+
+for pricing_model in PRICING_MODELS:
+    pre_save.connect(remember_pricing_previous, sender=pricing_model, dispatch_uid=f'pricing_pre_save_{pricing_model.__name__}')
+    post_save.connect(refresh_unit_prices, sender=pricing_model, dispatch_uid=f'pricing_post_save_{pricing_model.__name__}')
+    post_delete.connect(refresh_unit_prices, sender=pricing_model, dispatch_uid=f'pricing_post_delete_{pricing_model.__name__}')
+
+
+# ------------------------------------------------------------------
+# حذف الإجازات العامة المخزنة وتحديث أيامها في تقاويم الأسعار عند تعديلها
+# ------------------------------------------------------------------
+
+
+def _public_holiday_date(holiday_id):
+    return PublicHoliday.objects.filter(pk=holiday_id).values_list('holiday_date', flat=True).first()
+
+
+def remember_public_holiday_previous(sender, instance, raw=False, **kwargs):
+    """حفظ تاريخ الإجازة العامة (ووحدة الاستثناء) قبل التعديل"""
+    instance._pricing_previous = None
+    if raw or not instance.pk:
+        return
+    if sender is PublicHoliday:
+        instance._pricing_previous = _public_holiday_date(instance.pk)
+    else:
+        instance._pricing_previous = sender.objects.filter(pk=instance.pk).values_list(
+            'unit_id', 'holiday__holiday_date'
+        ).first()
+
+
+def refresh_public_holiday_prices(sender, instance, **kwargs):
+    """الإجازة العامة تمس كل الوحدات، والاستثناء يمس وحدته فقط"""
+    previous = getattr(instance, '_pricing_previous', None)
+    if sender is PublicHoliday:
+        holiday_date = instance._meta.get_field('holiday_date').to_python(instance.holiday_date)
+        changes = {None: {('holiday', holiday_date)}}
+        if previous is not None:
+            changes[None].add(('holiday', previous))
+    else:
+        changes = {}
+        # عند حذف الإجازة العامة تُحذف استثناءاتها وتتكفل إشارة الإجازة بكل الوحدات
+        holiday_date = _public_holiday_date(instance.holiday_id)
+        if holiday_date is not None:
+            changes[instance.unit_id] = {('holiday', holiday_date)}
+        if previous is not None and previous[1] is not None:
+            changes.setdefault(previous[0], set()).add(('holiday', previous[1]))
+
+    def refresh():
+        invalidate_public_holidays()
+        for unit_id, keys in changes.items():
+            unit_ids = Unit.objects.values_list('id', flat=True) if unit_id is None else [unit_id]
+            for changed_unit_id in unit_ids:
+                patch_price_calendars(changed_unit_id, keys)
+
+    invalidate_public_holidays()
+    transaction.on_commit(refresh)
+
+
+for public_model in (PublicHoliday, PublicHolidayOverride):
+    pre_save.connect(remember_public_holiday_previous, sender=public_model, dispatch_uid=f'pricing_pre_save_{public_model.__name__}')
+    post_save.connect(refresh_public_holiday_prices, sender=public_model, dispatch_uid=f'pricing_post_save_{public_model.__name__}')
+    post_delete.connect(refresh_public_holiday_prices, sender=public_model, dispatch_uid=f'pricing_post_delete_{public_model.__name__}')
@@ -0,0 +1,160 @@
+"""
+إعادة محاولة الكتابة عند "database is locked" في SQLite
+
+مع WAL و BEGIN IMMEDIATE (انظر SQLITE_OPTIONS في الإعدادات) ينتظر الكاتب القفل
+حتى SQLITE_BUSY_TIMEOUT ثانية. إن انتهت المهلة تُعاد المعاملة كاملة حتى
+DB_LOCK_RETRIES مرة مع انتظار يتضاعف (مع قليل من العشوائية) بين المحاولات.
+
+يجب أن تُلف المعاملة كلها (وليس جزءاً منها) ولا تكون داخل معاملة خارجية،
+لأن المعاملة التي فشلت لا يمكن إكمالها.
+
+العدادات: lock_wait_ms وقت المحاولات الفاشلة بالقفل وفترات الانتظار بينها فقط،
+و wall_ms الوقت الكلي لكل استدعاء بكل محاولاته بما فيها الناجحة. انتظار SQLite
+داخل busy timeout في محاولة نجحت لا يمكن فصله عن وقت تنفيذها، فيظهر في wall_ms.
+"""
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+_lock = threading.Lock()
+stats = {
+    'calls': 0,
+    'locked_errors': 0,
+    'retries': 0,
+    'gave_up': 0,
+    'lock_wait_ms': 0,
+    'max_lock_wait_ms': 0,
+    'wall_ms': 0,
+    'max_wall_ms': 0,
+    'by_operation': {},
+}
+
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and any(text in str(exc).lower() for text in LOCKED_MESSAGES)
+
+
+def lock_retries():
+    return getattr(settings, 'DB_LOCK_RETRIES', 3)
+
+
+def lock_backoff():
+    """أول فترة انتظار بين المحاولات (بالثواني)"""
+    return getattr(settings, 'DB_LOCK_BACKOFF_MS', 50) / 1000
+
+
+def _record(name, locked_errors, retries, waited, elapsed, gave_up):
+    waited_ms = int(waited * 1000)
+    elapsed_ms = int(elapsed * 1000)
+    with _lock:
+        stats['calls'] += 1
+        stats['locked_errors'] += locked_errors
+        stats['retries'] += retries
+        stats['gave_up'] += int(gave_up)
+        stats['lock_wait_ms'] += waited_ms
+        stats['max_lock_wait_ms'] = max(stats['max_lock_wait_ms'], waited_ms)
+        stats['wall_ms'] += elapsed_ms
+        stats['max_wall_ms'] = max(stats['max_wall_ms'], elapsed_ms)
+        operation = stats['by_operation'].setdefault(
+            name, {'calls': 0, 'retries': 0, 'gave_up': 0, 'lock_wait_ms': 0, 'wall_ms': 0, 'max_wall_ms': 0}
+        )
+        operation['calls'] += 1
+        operation['retries'] += retries
+        operation['gave_up'] += int(gave_up)
+        operation['lock_wait_ms'] += waited_ms
+        operation['wall_ms'] += elapsed_ms
+        operation['max_wall_ms'] = max(operation['max_wall_ms'], elapsed_ms)
+
+
+def call_with_retry(func, *args, name=None, retries=None, **kwargs):
+    """تنفيذ func مع إعادة المحاولة عند قفل القاعدة، وإعادة الخطأ بعد آخر محاولة"""
+    name = name or getattr(func, '__qualname__', repr(func))
+    retries = lock_retries() if retries is None else retries
+    if any(connections[alias].in_atomic_block for alias in connections):
+        # داخل معاملة خارجية لا فائدة من الإعادة: المعاملة كلها فشلت
+        retries = 0
+    delay = lock_backoff()
+    locked_errors = 0
+    waited = 0.0
+    attempt = 0
+    gave_up = False
+    called = time.monotonic()
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if not is_locked_error(exc):
+                    raise
+                # الوقت الذي انتظرته المحاولة الفاشلة على القفل (busy timeout)
+                waited += time.monotonic() - started
+                locked_errors += 1
+                if attempt >= retries:
+                    gave_up = True
+                    raise
+                sleep = delay * (2 ** attempt) * (1 + random.random() / 2)
+                time.sleep(sleep)
+                waited += sleep
+                attempt += 1
+    finally:
+        _record(name, locked_errors, attempt, waited, time.monotonic() - called, gave_up)
+
+
+def retry_on_locked(func=None, *, name=None, retries=None):
+    """مزخرف: @retry_on_locked أو @retry_on_locked(name='...')"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return call_with_retry(func, *args, name=name or func.__qualname__, retries=retries, **kwargs)
+        return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+class RetryOnLockedAdminMixin:
+    """إعادة محاولة حفظ/حذف النماذج في لوحة التحكم عند قفل القاعدة
+
+    تُعاد الصفحة كاملة لأن Django يلف save_model و save_related في معاملة واحدة
+    لا يمكن إكمالها بعد فشلها. الطلب الذي فيه ملفات مرفوعة لا يُعاد: الملفات
+    قُرئت وربما حُفظت في المحاولة الأولى، فإعادتها تترك نسخة يتيمة أو تكتب ثانية.
+    """
+
+    def _admin_retries(self, request):
+        return 0 if request.FILES else None
+
+    def changeform_view(self, request, *args, **kwargs):
+        return call_with_retry(
+            super().changeform_view, request, *args,
+            name=f'admin:{self.opts.label_lower}:save', retries=self._admin_retries(request), **kwargs
+        )
+
+    def delete_view(self, request, *args, **kwargs):
+        return call_with_retry(
+            super().delete_view, request, *args,
+            name=f'admin:{self.opts.label_lower}:delete', retries=self._admin_retries(request), **kwargs
+        )
+
+
+def sqlite_stats():
+    """عدادات القفل مع وضع journal لكل قاعدة بيانات SQLite مفتوحة"""
+    with _lock:
+        data = dict(stats)
+        data['by_operation'] = {key: dict(value) for key, value in stats['by_operation'].items()}
+    data['retries_limit'] = lock_retries()
+    data['databases'] = {}
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite' or connection.connection is None:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            data['databases'][alias] = {'journal_mode': cursor.fetchone()[0]}
+    return data
@@ -0,0 +1,158 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+
+from units.models import Booking, BookingNight, Unit, UnitPricing
+from units.pricing import pricing_cache
+
+DAY = date(2025, 5, 10)
+
+
+class BookingNightTests(TestCase):
+    """التعارض يكتشفه القيد الفريد (الوحدة، الليلة) في BookingNight"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=cls.owner)
+        cls.other_unit = Unit.objects.create(name='وحدة أخرى', owner=cls.owner)
+
+    def book(self, day, unit=None):
+        return Booking.objects.create(unit=unit or self.unit, user=self.owner, start_date=day, end_date=day)
+
+    def nights(self, booking):
+        return list(BookingNight.objects.filter(booking=booking).values_list('unit_id', 'night'))
+
+    def test_overlapping_booking_is_rejected(self):
+        self.book(DAY)
+        with self.assertRaises(ValidationError) as raised:
+            self.book(DAY)
+        self.assertEqual(raised.exception.message_dict, {'start_date': [Booking.CONFLICT_MESSAGE]})
+        # الخطأ يلغي الحجز نفسه وليس لياليه فقط
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(BookingNight.objects.count(), 1)
+
+    def test_clean_reports_conflict(self):
+        self.book(DAY)
+        booking = Booking(unit=self.unit, user=self.owner, start_date=DAY, end_date=DAY)
+        with self.assertRaises(ValidationError):
+            booking.full_clean()
+
+    def test_back_to_back_and_other_units_are_allowed(self):
+        first = self.book(DAY)
+        second = self.book(DAY + timedelta(days=1))
+        third = self.book(DAY, unit=self.other_unit)
+        self.assertEqual(self.nights(first), [(self.unit.pk, DAY)])
+        self.assertEqual(self.nights(second), [(self.unit.pk, DAY + timedelta(days=1))])
+        self.assertEqual(self.nights(third), [(self.other_unit.pk, DAY)])
+
+    def test_deleting_booking_frees_night(self):
+        self.book(DAY).delete()
+        self.assertFalse(BookingNight.objects.exists())
+        self.book(DAY)
+
+    def test_date_change_rewrites_nights(self):
+        booking = self.book(DAY)
+        booking.start_date = booking.end_date = DAY + timedelta(days=5)
+        booking.save()
+        self.assertEqual(self.nights(booking), [(self.unit.pk, DAY + timedelta(days=5))])
+        # الليلة القديمة أصبحت متاحة
+        self.book(DAY)
+
+    def test_unit_change_moves_nights(self):
+        booking = self.book(DAY)
+        booking.unit = self.other_unit
+        booking.save()
+        self.assertEqual(self.nights(booking), [(self.other_unit.pk, DAY)])
+        self.book(DAY)
+
+    def test_saving_unchanged_booking_keeps_its_night(self):
+        booking = self.book(DAY)
+        booking.customer_name = 'عميل'
+        booking.save()
+        self.assertEqual(self.nights(booking), [(self.unit.pk, DAY)])
+
+    def test_edit_into_conflict_keeps_old_dates(self):
+        self.book(DAY)
+        booking = self.book(DAY + timedelta(days=1))
+        booking.start_date = booking.end_date = DAY
+        with self.assertRaises(ValidationError):
+            booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.start_date, DAY + timedelta(days=1))
+        self.assertEqual(self.nights(booking), [(self.unit.pk, DAY + timedelta(days=1))])
+
+
+class BookingApiTests(TestCase):
+    """الحجز والإلغاء من واجهة التقويم"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=cls.owner)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def post(self, name):
+        return self.client.post(reverse(f'units:{name}', args=[self.unit.pk]), {'date': DAY.isoformat()})
+
+    def test_conflict_then_cancel_then_book_again(self):
+        self.assertEqual(self.post('create_booking').status_code, 200)
+        response = self.post('create_booking')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(Booking.CONFLICT_MESSAGE, response.json()['error'])
+
+        self.assertEqual(self.post('cancel_booking').status_code, 200)
+        self.assertFalse(BookingNight.objects.exists())
+        self.assertEqual(self.post('create_booking').status_code, 200)
+        self.assertEqual(BookingNight.objects.get().night, DAY)
+
+
+class UnitBookingsQueryTests(TestCase):
+    """عدد استعلامات حجوزات التقويم ثابت مهما كثرت حجوزات الوحدة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        # 0 و 10 و 20 حجزاً في الشهر
+        cls.units = [Unit.objects.create(name=f'وحدة {i}', owner=cls.owner) for i in range(3)]
+        for count, unit in enumerate(cls.units):
+            for day in range(count * 10):
+                Booking.objects.create(
+                    unit=unit, user=cls.owner, start_date=DAY + timedelta(days=day),
+                    end_date=DAY + timedelta(days=day), notes='ملاحظة', price_per_day=100,
+                )
+            UnitPricing.objects.create(unit=unit, day_of_week=DAY.weekday(), price=100)
+
+    def setUp(self):
+        pricing_cache().clear()
+        self.client.force_login(self.owner)
+        self.month = {'month': DAY.strftime('%Y-%m'), 'totals': '1', 'prices': '1'}
+
+    def get(self, unit, **params):
+        response = self.client.get(reverse('units:unit_bookings', args=[unit.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        for unit in self.units:
+            self.get(unit, **self.month)
+        for count, unit in enumerate(self.units):
+            # الوحدة، المستخدم، الحجوزات، الملخص المالي (الأسعار من الذاكرة المؤقتة)
+            with self.assertNumQueries(4):
+                data = self.get(unit, **self.month)
+            self.assertEqual(len(data['events']), count * 10)
+            with self.assertNumQueries(4):
+                data = self.get(unit)
+            self.assertEqual(len(data['events']), count * 10)
+
+    def test_price_calendar_build_does_not_grow_with_bookings(self):
+        # الطلب الأول يملأ الجلسة والإجازات العامة في الذاكرة المؤقتة
+        self.get(self.units[0], **self.month)
+        for unit in self.units[1:]:
+            with self.assertNumQueries(7):
+                self.get(unit, **self.month)
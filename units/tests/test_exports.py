@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import unittest
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from units.excel import EXCEL_AVAILABLE, escape_formula, unescape_formula, write_payment_report_xlsx
+from units.exports import BOOKING_EXPORT_FIELDS, export_bookings_queryset, iter_export
+from units.models import Booking, Unit
+from units.reports import PaymentReportQuery
+
+DAY = date(2025, 4, 1)
+
+
+class FormulaEscapeTests(TestCase):
+    """النصوص التي يقرؤها Excel معادلة تُسبق بـ ' في CSV و Excel"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        unit = Unit.objects.create(name='=HYPERLINK("http://x")', owner=owner)
+        Booking.objects.create(
+            unit=unit, user=owner, start_date=DAY, end_date=DAY,
+            customer_name='@SUM(A1:A9)', customer_phone='+966500000000', notes='-2+3',
+            cash_amount=100, transfer_amount=-40,
+        )
+
+    def export(self, fmt):
+        values_qs = export_bookings_queryset(PaymentReportQuery())
+        return ''.join(iter_export(values_qs, BOOKING_EXPORT_FIELDS, fmt))
+
+    def test_escape_formula(self):
+        for value in ('=1+1', '+1', '-1', '@A1', '\tx', '\rx'):
+            self.assertEqual(escape_formula(value), "'" + value)
+            self.assertEqual(unescape_formula(escape_formula(value)), value)
+        for value in ('محمد', "'quoted", '', None, -5):
+            self.assertEqual(escape_formula(value), value)
+        self.assertEqual(unescape_formula("'quoted"), "'quoted")
+
+    def test_csv_cells_are_escaped(self):
+        [row] = list(csv.DictReader(io.StringIO(self.export('csv').lstrip('\ufeff'))))
+        self.assertEqual(row['unit_name'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['customer_name'], "'@SUM(A1:A9)")
+        self.assertEqual(row['customer_phone'], "'+966500000000")
+        self.assertEqual(row['notes'], "'-2+3")
+        # الأرقام السالبة ليست نصوصاً فتبقى كما هي
+        self.assertEqual(row['transfer_amount'], '-40.00')
+
+    def test_jsonl_is_not_escaped(self):
+        record = json.loads(self.export('jsonl'))
+        self.assertEqual(record['customer_name'], '@SUM(A1:A9)')
+
+    @unittest.skipUnless(EXCEL_AVAILABLE, 'openpyxl غير مثبتة')
+    def test_xlsx_cells_are_escaped(self):
+        from openpyxl import load_workbook
+
+        buffer = io.BytesIO()
+        write_payment_report_xlsx(PaymentReportQuery(), 'تقرير', str, buffer)
+        buffer.seek(0)
+        rows = list(load_workbook(buffer).active.iter_rows(min_row=4, max_row=4, values_only=True))
+        unit_name, _, customer_name, customer_phone = rows[0][:4]
+        self.assertEqual(unit_name, '\'=HYPERLINK("http://x")')
+        self.assertEqual(customer_name, "'@SUM(A1:A9)")
+        self.assertEqual(customer_phone, "'+966500000000")
@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from units.finance import compute_unit_totals, verify_unit_summaries
+from units.models import Booking, Expense, Unit, UnitFinancialSummary
+
+DAY = date(2025, 1, 1)
+
+
+class UnitFinancialSummaryTests(TestCase):
+    """الملخص المالي يُحدّث بالفروق مع كل حجز ومصروف ويطابق الحساب الكامل"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الأولى', owner=cls.owner)
+        cls.other_unit = Unit.objects.create(name='الثانية', owner=cls.owner)
+
+    def book(self, unit=None, days=0, **amounts):
+        return Booking.objects.create(
+            unit=unit or self.unit, user=self.owner,
+            start_date=DAY + timedelta(days=days), end_date=DAY + timedelta(days=days), **amounts
+        )
+
+    def spend(self, price, unit=None):
+        return Expense.objects.create(unit=unit or self.unit, owner=self.owner, price=price)
+
+    def summary(self, unit=None):
+        summary = UnitFinancialSummary.objects.get(unit=unit or self.unit)
+        return summary.total_revenue, summary.total_expenses, summary.net_total, summary.booking_count
+
+    def assertMatchesRecompute(self):
+        self.assertEqual(verify_unit_summaries(), [])
+
+    def test_new_unit_has_empty_summary(self):
+        self.assertEqual(self.summary(), (0, 0, 0, 0))
+
+    def test_booking_create_update_delete(self):
+        booking = self.book(cash_amount=100, transfer_amount=50)
+        self.book(days=1, price_per_day=Decimal('80.00'))
+        self.assertEqual(self.summary(), (230, 0, 230, 2))
+
+        booking.cash_amount = 200
+        booking.save()
+        self.assertEqual(self.summary(), (330, 0, 330, 2))
+
+        booking.delete()
+        self.assertEqual(self.summary(), (80, 0, 80, 1))
+        self.assertMatchesRecompute()
+
+    def test_booking_unit_change_moves_totals(self):
+        booking = self.book(cash_amount=100)
+        booking.unit = self.other_unit
+        booking.cash_amount = 120
+        booking.save()
+        self.assertEqual(self.summary(), (0, 0, 0, 0))
+        self.assertEqual(self.summary(self.other_unit), (120, 0, 120, 1))
+        self.assertMatchesRecompute()
+
+    def test_expense_create_update_unit_change_delete(self):
+        self.book(cash_amount=500)
+        expense = self.spend(100)
+        self.assertEqual(self.summary(), (500, 100, 400, 1))
+
+        expense.price = 150
+        expense.save()
+        self.assertEqual(self.summary(), (500, 150, 350, 1))
+
+        expense.unit = self.other_unit
+        expense.save()
+        self.assertEqual(self.summary(), (500, 0, 500, 1))
+        self.assertEqual(self.summary(self.other_unit), (0, 150, -150, 0))
+
+        expense.delete()
+        self.assertEqual(self.summary(self.other_unit), (0, 0, 0, 0))
+        self.assertMatchesRecompute()
+
+    def test_incremental_totals_match_full_recompute(self):
+        for i in range(5):
+            self.book(days=i, cash_amount=10 * i, price_per_day=Decimal('75.50'))
+            self.book(unit=self.other_unit, days=i, transfer_amount=30)
+            self.spend(Decimal('12.25'), unit=self.unit if i % 2 else self.other_unit)
+        Booking.objects.filter(unit=self.other_unit, start_date=DAY).get().delete()
+
+        totals = compute_unit_totals()
+        for unit in (self.unit, self.other_unit):
+            item = totals[unit.pk]
+            self.assertEqual(self.summary(unit), (
+                item['total_revenue'], item['total_expenses'],
+                item['total_revenue'] - item['total_expenses'], item['booking_count'],
+            ))
+        call_command('rebuild_unit_summaries', verify=True, stdout=StringIO())
+
+    def test_verify_command_reports_drift_and_rebuild_fixes_it(self):
+        self.book(cash_amount=100)
+        UnitFinancialSummary.objects.filter(unit=self.unit).update(total_revenue=1, booking_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_unit_summaries', verify=True, stdout=StringIO())
+
+        call_command('rebuild_unit_summaries', unit_ids=[self.unit.pk], stdout=StringIO())
+        self.assertEqual(self.summary(), (100, 0, 100, 1))
+        self.assertMatchesRecompute()
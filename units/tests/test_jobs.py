@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from units.jobs import run_report_job, submit_report_job
+from units.models import Booking, Report, ReportJob, Unit
+from units.reports import PaymentReportQuery
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='report-jobs-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, REPORT_JOBS_BACKEND='command')
+class ReportJobFileTests(TestCase):
+    """ملف المهمة الفاشلة لا يبقى في مساحة التخزين"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=cls.owner)
+        Booking.objects.create(
+            unit=cls.unit, user=cls.owner, start_date=date(2025, 1, 5), end_date=date(2025, 1, 5), cash_amount=100
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(os.path.join(MEDIA_ROOT, 'report_jobs'), ignore_errors=True)
+
+    def run_job(self):
+        job, _ = submit_report_job('pdf', PaymentReportQuery(unit_id=str(self.unit.pk)), attach_to_owner=True)
+        return run_report_job(job.pk)
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(os.path.join(MEDIA_ROOT, 'report_jobs')) for name in names]
+
+    def assertFailedWithoutFile(self, job):
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_FAILED)
+        self.assertFalse(job.file)
+        self.assertIsNone(job.report_id)
+        self.assertFalse(Report.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_done_job_keeps_file_and_report(self):
+        job = self.run_job()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertEqual(job.report.file.name, job.file.name)
+        self.assertEqual(self.stored_files(), [os.path.basename(job.file.name)])
+
+    def test_attach_failure_deletes_file(self):
+        with mock.patch('units.jobs._attach_report', side_effect=RuntimeError('attach')), \
+                self.assertLogs('units.jobs', 'ERROR'):
+            job = self.run_job()
+        self.assertFailedWithoutFile(job)
+        self.assertEqual(job.error, 'attach')
+
+    def test_save_failure_rolls_back_report_and_deletes_file(self):
+        save = ReportJob.save
+
+        def locked_when_done(job, *args, **kwargs):
+            if job.status == ReportJob.STATUS_DONE:
+                raise OperationalError('database is locked')
+            return save(job, *args, **kwargs)
+
+        with mock.patch.object(ReportJob, 'save', locked_when_done), self.assertLogs('units.jobs', 'ERROR'):
+            job = self.run_job()
+        self.assertFailedWithoutFile(job)
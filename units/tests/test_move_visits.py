@@ -0,0 +1,99 @@
+from datetime import date, datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+
+from units.dimensions import intern_maps
+from units.models import Visit, VisitDailyRollup, VisitPath, VisitUserAgent
+from units.rollups import path_bucket
+
+# جدول الزيارات كما أنشأته 0002 (قبل 0016): النصوص داخل الزيارة ولا يوجد weight
+LEGACY_VISIT_TABLE = '''
+CREATE TABLE "units_visit" (
+    "id" integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "session_key" varchar(40) NULL,
+    "ip_address" char(39) NULL,
+    "user_agent" text NULL,
+    "path" varchar(500) NOT NULL,
+    "referer" varchar(200) NULL,
+    "created_at" datetime NOT NULL,
+    "user_id" integer NULL
+)
+'''
+
+
+class MoveLegacyVisitsTests(TestCase):
+    """نقل الزيارات من قاعدة افتراضية لم تمر عليها 0016 وما بعدها"""
+
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        # أرقام جداول القيم في ذاكرة العملية تُلغى مع تراجع كل اختبار
+        for intern_map in intern_maps.values():
+            intern_map.clear()
+        with connections['default'].cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS "units_visit"')
+            cursor.execute(LEGACY_VISIT_TABLE)
+            cursor.executemany(
+                'INSERT INTO "units_visit" (session_key, ip_address, user_agent, path, referer, created_at, user_id) '
+                'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                [
+                    ('s1', '10.0.0.1', 'Firefox', '/units/1/', None, '2024-03-01 08:00:00', 7),
+                    ('s1', '10.0.0.1', 'Firefox', '/units/1/', '/', '2024-03-01 09:30:00', 7),
+                    ('s2', '10.0.0.2', '', '/', None, '2024-03-02 10:00:00', None),
+                ],
+            )
+
+    def _source_count(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM "units_visit"')
+            return cursor.fetchone()[0]
+
+    def test_moves_raw_text_visits_into_dimensions(self):
+        call_command('move_visits_to_analytics', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self._source_count(), 0)
+        visits = list(Visit.objects.order_by('created_at').select_related('user_agent', 'path', 'referer'))
+        self.assertEqual(len(visits), 3)
+        self.assertEqual([visit.path.value for visit in visits], ['/units/1/', '/units/1/', '/'])
+        self.assertEqual([visit.user_agent and visit.user_agent.value for visit in visits], ['Firefox', 'Firefox', None])
+        self.assertEqual([visit.referer and visit.referer.value for visit in visits], [None, '/', None])
+        self.assertEqual({visit.weight for visit in visits}, {1})
+        self.assertEqual(visits[0].user_id, 7)
+        self.assertEqual(visits[0].created_at, datetime(2024, 3, 1, 8, 0, tzinfo=timezone.utc))
+        self.assertEqual(VisitPath.objects.count(), 2)
+        self.assertEqual(VisitUserAgent.objects.count(), 1)
+
+        rollups = VisitDailyRollup.objects.filter(date=date(2024, 3, 1), user_id=7)
+        self.assertEqual(rollups.get(path_bucket=path_bucket('/units/1/')).count, 2)
+
+    def test_keep_source(self):
+        call_command('move_visits_to_analytics', keep_source=True, stdout=StringIO())
+
+        self.assertEqual(self._source_count(), 3)
+        self.assertEqual(Visit.objects.count(), 3)
+
+    def test_rerun_after_copy_does_not_duplicate(self):
+        # كأن الأمر توقف بعد النسخ وقبل الحذف من المصدر
+        call_command('move_visits_to_analytics', keep_source=True, stdout=StringIO())
+        call_command('move_visits_to_analytics', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self._source_count(), 0)
+        self.assertEqual(Visit.objects.count(), 3)
+        rollups = VisitDailyRollup.objects.filter(date=date(2024, 3, 1), user_id=7)
+        self.assertEqual(rollups.get(path_bucket=path_bucket('/units/1/')).count, 2)
+
+    def test_identical_visits_and_live_visits_are_kept(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO "units_visit" (session_key, ip_address, user_agent, path, referer, created_at, user_id) '
+                "VALUES ('s2', '10.0.0.2', '', '/', NULL, '2024-03-02 10:00:00', NULL)"
+            )
+        # زيارة سُجلت في قاعدة التحليلات بنفس الوقت لا تمنع نسخ زيارات المصدر
+        Visit.objects.create(session_key='live', created_at=datetime(2024, 3, 2, 10, 0, tzinfo=timezone.utc))
+
+        call_command('move_visits_to_analytics', stdout=StringIO())
+        self.assertEqual(Visit.objects.filter(session_key='s2').count(), 2)
+        self.assertEqual(Visit.objects.count(), 5)
@@ -0,0 +1,107 @@
+import io
+import tempfile
+import tracemalloc
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from reportlab.pdfgen.canvas import Canvas
+
+from units.models import Booking, Unit
+from units.pdf import report_styles, write_payment_report_pdf
+from units.reports import PaymentReportQuery
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+@override_settings(PDF_TABLE_SEGMENT_ROWS=100, REPORT_EXPORT_CHUNK_SIZE=200)
+class LargePaymentReportPdfTests(TestCase):
+    """التقرير الكبير يُرسم مقطعاً بعد مقطع فلا تزيد الذاكرة مع عدد الصفوف"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        cls.small_unit = Unit.objects.create(name='صغيرة', owner=owner)
+        cls.large_unit = Unit.objects.create(name='كبيرة', owner=owner)
+        start = date(2020, 1, 1)
+        Booking.objects.bulk_create([
+            Booking(
+                unit=unit, user=owner, start_date=start + timedelta(days=i),
+                end_date=start + timedelta(days=i), customer_name=f'عميل {i}',
+                customer_phone='0500000000', cash_amount=100, transfer_amount=50,
+            )
+            for unit, count in ((cls.small_unit, 200), (cls.large_unit, 1200))
+            for i in range(count)
+        ])
+
+    def _peak_memory(self, unit):
+        query = PaymentReportQuery(unit_id=str(unit.pk))
+        query.totals  # الإجماليات والخطوط خارج القياس
+        report_styles()
+        with tempfile.TemporaryFile() as tmp:
+            tracemalloc.start()
+            try:
+                write_payment_report_pdf(query, tmp, large=True)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    def test_peak_memory_does_not_grow_with_rows(self):
+        small = self._peak_memory(self.small_unit)
+        large = self._peak_memory(self.large_unit)
+        # ستة أضعاف الصفوف: يتراكم نص الصفحات المضغوط فقط، لا جداول المقاطع
+        self.assertLess(large, small * 2)
+
+
+@unittest.skipUnless(pypdf, 'pypdf غير مثبتة')
+@override_settings(PDF_TABLE_SEGMENT_ROWS=100)
+class PaymentReportPdfOutputTests(TestCase):
+    """ملف التقرير الكبير (صفحات مضغوطة عند إغلاقها) صالح ومطابق لرسم ReportLab العادي"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=owner)
+        start = date(2020, 1, 1)
+        Booking.objects.bulk_create([
+            Booking(
+                unit=cls.unit, user=owner, start_date=start + timedelta(days=i),
+                end_date=start + timedelta(days=i), customer_name=f'عميل {i}',
+                customer_phone=f'05{i:08d}', cash_amount=100, transfer_amount=50,
+            )
+            for i in range(250)
+        ])
+
+    def _read(self, large):
+        output = io.BytesIO()
+        write_payment_report_pdf(PaymentReportQuery(unit_id=str(self.unit.pk)), output, large=large)
+        return pypdf.PdfReader(io.BytesIO(output.getvalue()), strict=True)
+
+    def test_large_report_is_readable(self):
+        reader = self._read(large=True)
+        self.assertGreater(len(reader.pages), 1)
+        for page in reader.pages:
+            contents = page['/Contents'].get_object()
+            self.assertEqual(contents['/Filter'], '/FlateDecode')
+            self.assertTrue(contents.get_data())
+        text = '\n'.join(page.extract_text() for page in reader.pages)
+        for i in range(250):
+            self.assertEqual(text.count(f'05{i:08d}'), 1)
+
+    def test_compressed_pages_match_plain_canvas(self):
+        compressed = self._read(large=True)
+        with mock.patch('units.pdf.PageCompressingCanvas', Canvas):
+            plain = self._read(large=True)
+        self.assertEqual(
+            [page.extract_text() for page in compressed.pages],
+            [page.extract_text() for page in plain.pages],
+        )
+        self.assertEqual(
+            [page['/Contents'].get_object().get_data() for page in compressed.pages],
+            [page['/Contents'].get_object().get_data() for page in plain.pages],
+        )
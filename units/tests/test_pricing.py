@@ -0,0 +1,126 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from units.models import (
+    Booking, Holiday, PublicHoliday, PublicHolidayOverride, SpecialPricing, Unit, UnitPricing,
+)
+from units.pricing import PRICE_TABLE_CACHE_KEY, night_price, pricing_cache, quote
+
+EID_DAY = date(2025, 3, 30)  # الليلة الأولى من عيد الفطر في الاختبار
+NATIONAL_DAY = date(2025, 9, 23)
+PLAIN_DAY = date(2025, 5, 5)  # الإثنين
+
+
+@override_settings(EID_START_DATES={'eid_al_fitr': [EID_DAY.isoformat()]})
+class PricePrecedenceTests(TestCase):
+    """ليلة العيد، ثم إجازة الوحدة، ثم الإجازة العامة (استثناء أو مضاعف)، ثم يوم الأسبوع"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=owner)
+        cls.other_unit = Unit.objects.create(name='وحدة أخرى', owner=owner)
+        cls.owner = owner
+        for unit in (cls.unit, cls.other_unit):
+            UnitPricing.objects.bulk_create([
+                UnitPricing(unit=unit, day_of_week=day, price=100 + day) for day in range(7)
+            ])
+        SpecialPricing.objects.create(unit=cls.unit, pricing_type='eid_al_fitr', night_number=1, price=900)
+
+    def setUp(self):
+        pricing_cache().clear()
+
+    def weekday_price(self, day):
+        return Decimal(100 + day.weekday())
+
+    def test_weekday(self):
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY), (self.weekday_price(PLAIN_DAY), 'weekday'))
+
+    def test_public_holiday_multiplier_and_price(self):
+        PublicHoliday.objects.create(holiday_name='اليوم الوطني', holiday_date=NATIONAL_DAY, multiplier=Decimal('1.5'))
+        self.assertEqual(
+            night_price(self.unit.pk, NATIONAL_DAY),
+            ((self.weekday_price(NATIONAL_DAY) * Decimal('1.5')).quantize(Decimal('0.01')), 'holiday'),
+        )
+        PublicHoliday.objects.filter(holiday_date=NATIONAL_DAY).update(multiplier=None, price=400)
+        pricing_cache().clear()
+        self.assertEqual(night_price(self.unit.pk, NATIONAL_DAY), (Decimal('400.00'), 'holiday'))
+
+    def test_override_beats_public_holiday(self):
+        holiday = PublicHoliday.objects.create(holiday_name='اليوم الوطني', holiday_date=NATIONAL_DAY, price=400)
+        PublicHolidayOverride.objects.create(holiday=holiday, unit=self.unit, price=650)
+        PublicHolidayOverride.objects.create(holiday=holiday, unit=self.other_unit, is_excluded=True)
+        self.assertEqual(night_price(self.unit.pk, NATIONAL_DAY), (Decimal('650.00'), 'holiday'))
+        # الوحدة المستثناة تُسعّر الليلة بيوم الأسبوع
+        self.assertEqual(
+            night_price(self.other_unit.pk, NATIONAL_DAY), (self.weekday_price(NATIONAL_DAY), 'weekday')
+        )
+
+    def test_unit_holiday_beats_public_holiday(self):
+        holiday = PublicHoliday.objects.create(holiday_name='اليوم الوطني', holiday_date=NATIONAL_DAY, price=400)
+        PublicHolidayOverride.objects.create(holiday=holiday, unit=self.unit, price=650)
+        Holiday.objects.create(unit=self.unit, holiday_name='خاصة', holiday_date=NATIONAL_DAY, price=777)
+        self.assertEqual(night_price(self.unit.pk, NATIONAL_DAY), (Decimal('777.00'), 'holiday'))
+
+    def test_eid_night_beats_holidays(self):
+        PublicHoliday.objects.create(holiday_name='عامة', holiday_date=EID_DAY, price=400)
+        Holiday.objects.create(unit=self.unit, holiday_name='خاصة', holiday_date=EID_DAY, price=777)
+        self.assertEqual(night_price(self.unit.pk, EID_DAY), (Decimal('900.00'), 'eid'))
+        # الوحدة بلا سعر لهذه الليلة من العيد تنتقل للإجازات
+        self.assertEqual(night_price(self.other_unit.pk, EID_DAY), (Decimal('400.00'), 'holiday'))
+
+    def test_booking_price_beats_everything(self):
+        Booking.objects.create(
+            unit=self.unit, user=self.owner, start_date=EID_DAY, end_date=EID_DAY, price_per_day=Decimal('55.00')
+        )
+        self.assertEqual(night_price(self.unit.pk, EID_DAY), (Decimal('55.00'), 'booking'))
+        result = quote(self.unit.pk, EID_DAY, EID_DAY, include_bookings=False)
+        self.assertEqual(result['total'], Decimal('900.00'))
+
+    def test_missing_price(self):
+        UnitPricing.objects.filter(unit=self.unit, day_of_week=PLAIN_DAY.weekday()).delete()
+        result = quote(self.unit.pk, PLAIN_DAY, PLAIN_DAY)
+        self.assertIsNone(result['total'])
+        self.assertEqual(result['missing'], 1)
+
+
+class PriceTableInvalidationTests(TestCase):
+    """جدول الوحدة المخزن في ذاكرة الأسعار المشتركة يُحذف مع كل تعديل سعر"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=owner)
+        cls.weekday = UnitPricing.objects.create(unit=cls.unit, day_of_week=PLAIN_DAY.weekday(), price=100)
+
+    def setUp(self):
+        pricing_cache().clear()
+
+    def cached_table(self):
+        return pricing_cache().get(PRICE_TABLE_CACHE_KEY.format(self.unit.pk))
+
+    def test_table_is_shared_and_dropped_on_save(self):
+        night_price(self.unit.pk, PLAIN_DAY)
+        self.assertIsNotNone(self.cached_table())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.weekday.price = 120
+            self.weekday.save()
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY), (Decimal('120'), 'weekday'))
+
+    def test_holiday_save_and_delete(self):
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY)[1], 'weekday')
+        with self.captureOnCommitCallbacks(execute=True):
+            holiday = Holiday.objects.create(unit=self.unit, holiday_name='خاصة', holiday_date=PLAIN_DAY, price=300)
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY), (Decimal('300'), 'holiday'))
+        with self.captureOnCommitCallbacks(execute=True):
+            holiday.delete()
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY), (Decimal('100.00'), 'weekday'))
+
+    def test_public_holiday_save(self):
+        night_price(self.unit.pk, PLAIN_DAY)
+        with self.captureOnCommitCallbacks(execute=True):
+            PublicHoliday.objects.create(holiday_name='عامة', holiday_date=PLAIN_DAY, price=250)
+        self.assertEqual(night_price(self.unit.pk, PLAIN_DAY), (Decimal('250.00'), 'holiday'))
@@ -0,0 +1,99 @@
+import io
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from units.holidays import collapse_unit_holidays
+from units.models import Holiday, PublicHoliday, PublicHolidayOverride, Unit, UnitPricing
+from units.pricing_io import (
+    EXCEL_AVAILABLE, PricingImport, export_rows, iter_pricing_csv, read_pricing_file, write_pricing_xlsx,
+)
+
+NATIONAL_DAY = date(2025, 9, 23)
+FOUNDING_DAY = date(2025, 2, 22)
+
+
+class PricingRoundTripTests(TestCase):
+    """ملف التصدير بعد دمج الإجازات يُستورد كما هو بدون أي فرق"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('مالك', password='x')
+        cls.units = [Unit.objects.create(name=f'وحدة {i}', owner=owner) for i in range(4)]
+        UnitPricing.objects.bulk_create([
+            UnitPricing(unit=unit, day_of_week=day, price=200 + day)
+            for unit in cls.units
+            for day in range(7)
+        ])
+        # اليوم الوطني لكل الوحدات (واحدة بسعر آخر)، ويوم التأسيس لثلاث وحدات فقط
+        Holiday.objects.bulk_create(
+            [
+                Holiday(unit=unit, holiday_name='اليوم الوطني', holiday_date=NATIONAL_DAY,
+                        price=700 if unit == cls.units[3] else 500)
+                for unit in cls.units
+            ]
+            + [
+                Holiday(unit=unit, holiday_name='يوم التأسيس', holiday_date=FOUNDING_DAY, price=300)
+                for unit in cls.units[:3]
+            ]
+        )
+        collapse_unit_holidays(Holiday, PublicHoliday, PublicHolidayOverride, Unit)
+        ramadan = PublicHoliday.objects.create(
+            holiday_name='رمضان', holiday_date=date(2025, 3, 1), multiplier=Decimal('1.5')
+        )
+        PublicHolidayOverride.objects.create(holiday=ramadan, unit=cls.units[0], multiplier=Decimal('2'))
+
+    def _csv_upload(self):
+        return SimpleUploadedFile('pricing.csv', ''.join(iter_pricing_csv()).encode('utf-8'))
+
+    def test_collapse_is_exported(self):
+        types = [row[2] for row in export_rows()]
+        self.assertEqual(types.count('public_holiday'), 3)
+        self.assertEqual(types.count('holiday_override'), 3)
+        self.assertNotIn('holiday', types)
+
+    def test_csv_round_trip_has_no_changes(self):
+        importer = PricingImport(read_pricing_file(self._csv_upload()))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(importer.report(), [])
+        self.assertEqual(importer.counts['unchanged'], len(export_rows()))
+
+    @unittest.skipUnless(EXCEL_AVAILABLE, 'openpyxl غير مثبتة')
+    def test_xlsx_round_trip_has_no_changes(self):
+        buffer = io.BytesIO()
+        write_pricing_xlsx(buffer)
+        importer = PricingImport(read_pricing_file(SimpleUploadedFile('pricing.xlsx', buffer.getvalue())))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(importer.report(), [])
+
+    def test_import_restores_public_holidays(self):
+        exported = export_rows()
+        upload = self._csv_upload()
+        PublicHoliday.objects.all().delete()
+
+        importer = PricingImport(read_pricing_file(upload))
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.apply()
+
+        self.assertEqual(importer.counts['create'], 6)
+        self.assertEqual(export_rows(), exported)
+
+    def test_override_needs_public_holiday(self):
+        rows = [(2, {
+            'unit_id': str(self.units[0].pk), 'type': 'holiday_override', 'key': '2025-12-01',
+            'price': '', 'is_excluded': '1',
+        })]
+        importer = PricingImport(rows)
+        self.assertEqual(importer.errors, [(2, 'لا توجد إجازة عامة بتاريخ 2025-12-01')])
+
+    def test_formula_like_holiday_name_round_trips(self):
+        Holiday.objects.create(unit=self.units[0], holiday_name='=إجازة', holiday_date=date(2025, 6, 1), price=400)
+        content = ''.join(iter_pricing_csv())
+        self.assertIn("'=إجازة", content)
+        importer = PricingImport(read_pricing_file(self._csv_upload()))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(importer.report(), [])
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from units.finance import booking_instance_revenue
+from units.models import Booking, Unit
+from units.profits import DaysBetween, booking_revenue_expression, unit_profits
+
+DAY = date(2025, 2, 27)
+
+
+class BookingRevenueExpressionTests(TestCase):
+    """تعبير SQL لقيمة الحجز يطابق قاعدة finance.booking_revenue في بايثون"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+        cls.unit = Unit.objects.create(name='الوحدة', owner=cls.owner)
+
+    def book(self, days=1, offset=0, **amounts):
+        start = DAY + timedelta(days=offset)
+        booking = Booking.objects.create(unit=self.unit, user=self.owner, start_date=start, end_date=start, **amounts)
+        if days > 1:
+            # الحجوزات الجديدة ليوم واحد، لكن السجلات القديمة قد تمتد لعدة أيام
+            Booking.objects.filter(pk=booking.pk).update(end_date=start + timedelta(days=days - 1))
+            booking.refresh_from_db()
+        return booking
+
+    def sql_revenue(self, booking):
+        return Booking.objects.annotate(revenue=booking_revenue_expression()).get(pk=booking.pk).revenue
+
+    def assertSameRevenue(self, booking, expected):
+        self.assertEqual(booking_instance_revenue(booking), expected)
+        self.assertEqual(self.sql_revenue(booking), expected)
+
+    def test_full_payment(self):
+        self.assertSameRevenue(self.book(days=3, cash_amount=300, transfer_amount=150), Decimal('450'))
+
+    def test_deposit_wins_over_price_per_day(self):
+        # العربون المدفوع هو قيمة الحجز وإن كان أقل من سعر الأيام
+        self.assertSameRevenue(self.book(days=3, transfer_amount=100, price_per_day=200), Decimal('100'))
+
+    def test_unpaid_booking_uses_price_per_day(self):
+        self.assertSameRevenue(self.book(days=3, price_per_day=Decimal('120.50')), Decimal('361.50'))
+
+    def test_refund_cancelling_payment_falls_back_to_price_per_day(self):
+        # المجموع هو المعتبر لا كل مبلغ وحده
+        self.assertSameRevenue(self.book(cash_amount=100, transfer_amount=-100, price_per_day=80), Decimal('80'))
+
+    def test_unpaid_without_price_is_zero(self):
+        self.assertSameRevenue(self.book(), Decimal('0'))
+
+    def test_cancelled_booking_is_not_counted(self):
+        # الإلغاء يحذف الحجز، فلا حالة ملغاة تُستثنى في الاستعلام
+        self.book(cash_amount=500)
+        self.book(offset=5, price_per_day=100).delete()
+        [row] = unit_profits(Unit.objects.filter(pk=self.unit.pk))
+        self.assertEqual(row['total_bookings'], Decimal('500.00'))
+
+    def test_totals_match_python_rule(self):
+        bookings = [
+            self.book(days=2, offset=0, cash_amount=200),
+            self.book(days=4, offset=2, price_per_day=Decimal('99.99')),
+            self.book(days=1, offset=6, transfer_amount=50, price_per_day=300),
+            self.book(days=1, offset=7),
+        ]
+        [row] = unit_profits(Unit.objects.filter(pk=self.unit.pk))
+        expected = sum(booking_instance_revenue(booking) for booking in bookings)
+        self.assertEqual(row['total_bookings'], expected.quantize(Decimal('0.01')))
+
+
+class DaysBetweenTests(TestCase):
+    """DaysBetween على SQLite عبر julianday (بما فيها عبور نهاية فبراير والسنة)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('مالك', password='x')
+
+    def test_days_between(self):
+        ranges = [
+            (DAY, DAY),
+            (DAY, DAY + timedelta(days=1)),
+            (date(2024, 2, 28), date(2024, 3, 1)),
+            (date(2024, 12, 30), date(2025, 1, 2)),
+            (date(2025, 1, 1), date(2025, 12, 31)),
+        ]
+        for offset, (start, end) in enumerate(ranges):
+            unit = Unit.objects.create(name=f'وحدة {offset}', owner=self.owner)
+            booking = Booking.objects.create(unit=unit, user=self.owner, start_date=start, end_date=start)
+            Booking.objects.filter(pk=booking.pk).update(end_date=end)
+        days = Booking.objects.annotate(days=DaysBetween('end_date', 'start_date')).order_by('pk')
+        self.assertEqual(
+            [booking.days for booking in days],
+            [(end - start).days for start, end in ranges],
+        )
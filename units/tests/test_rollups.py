@@ -0,0 +1,72 @@
+import threading
+import time
+from unittest import mock
+
+from django.db import connections
+from django.db.models import Sum
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from units import rollups
+from units.dimensions import intern_maps
+from units.models import Visit, VisitDailyRollup
+from units.visits import VisitBuffer, write_visits
+
+
+def visit(path='/units/1/'):
+    return {'session_key': 's', 'ip_address': '10.0.0.1', 'path': path, 'created_at': timezone.now()}
+
+
+@override_settings(DB_LOCK_RETRIES=20)
+class RebuildDuringFlushTests(TransactionTestCase):
+    """دفعة زيارات تُكتب أثناء إعادة حساب الملخصات تُحسب مرة واحدة"""
+
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        for intern_map in intern_maps.values():
+            intern_map.clear()
+
+    def _total(self):
+        return VisitDailyRollup.objects.aggregate(total=Sum('count'))['total']
+
+    def test_flush_between_count_and_replace(self):
+        write_visits([visit() for _ in range(3)])
+        buffer = VisitBuffer(batch_size=10)
+        counted = threading.Event()
+        flushing = threading.Event()
+        compute_rollups = rollups.compute_rollups
+
+        def count_then_let_flush_in(visits):
+            counts = compute_rollups(visits)
+            counted.set()
+            flushing.wait(5)
+            # وقت كافٍ لتكتمل الدفعة لو لم تكن إعادة الحساب ممسكة بقفل الكتابة
+            time.sleep(0.3)
+            return counts
+
+        def flush():
+            counted.wait(5)
+            flushing.set()
+            try:
+                buffer._write([visit() for _ in range(2)])
+            finally:
+                for connection in connections.all():
+                    connection.close()
+
+        flusher = threading.Thread(target=flush)
+        flusher.start()
+        with mock.patch.object(rollups, 'compute_rollups', count_then_let_flush_in):
+            rollups.replace_rollups(timezone.localdate())
+        flusher.join(10)
+
+        self.assertEqual(buffer.stats['written'], 2)
+        self.assertEqual(Visit.objects.count(), 5)
+        self.assertEqual(self._total(), 5)
+
+    def test_failed_rollup_update_rolls_back_visits(self):
+        with mock.patch('units.visits.add_visits_to_rollups', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                write_visits([visit()])
+        self.assertEqual(Visit.objects.count(), 0)
+        self.assertIsNone(self._total())
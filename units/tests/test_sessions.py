@@ -0,0 +1,68 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from units.middleware import ThrottledSessionMiddleware
+
+REFRESHED_KEY = ThrottledSessionMiddleware.REFRESHED_KEY
+
+
+class ThrottledSessionMiddlewareTests(TestCase):
+    """الجلسة لا تُحفظ مع كل طلب، وتُمدد بعد SESSION_REFRESH_FRACTION من مدتها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('مستثمر', password='x')
+
+    def login(self, remember=True):
+        data = {'username': 'مستثمر', 'password': 'x'}
+        if remember:
+            data['remember'] = 'on'
+        self.client.post(reverse('units:login'), data)
+        return self.client.session[REFRESHED_KEY]
+
+    def visit_later(self, seconds, refreshed_at):
+        """طلب صفحة بعد seconds من آخر تمديد"""
+        with mock.patch('units.middleware.time') as clock:
+            clock.time.return_value = refreshed_at + seconds
+            return self.client.get(reverse('units:units'))
+
+    def window(self):
+        return int(settings.SESSION_REFRESH_FRACTION * settings.SESSION_COOKIE_AGE)
+
+    def test_session_inside_window_is_not_saved(self):
+        refreshed_at = self.login()
+        with mock.patch('django.contrib.sessions.backends.cached_db.SessionStore.save') as save:
+            response = self.visit_later(self.window() - 1, refreshed_at)
+        self.assertEqual(response.status_code, 200)
+        save.assert_not_called()
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(self.client.session[REFRESHED_KEY], refreshed_at)
+
+    def test_session_past_window_is_saved_with_new_expiry(self):
+        refreshed_at = self.login()
+        response = self.visit_later(self.window(), refreshed_at)
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME]
+        self.assertEqual(cookie['max-age'], settings.SESSION_COOKIE_AGE)
+        session = self.client.session
+        self.assertEqual(session[REFRESHED_KEY], refreshed_at + self.window())
+        self.assertFalse(session.get_expire_at_browser_close())
+        self.assertGreater(session.get_expiry_age(), settings.SESSION_COOKIE_AGE - 60)
+
+    def test_browser_session_still_ends_at_browser_close(self):
+        refreshed_at = self.login(remember=False)
+        response = self.visit_later(self.window(), refreshed_at)
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME]
+        # كوكي جلسة المتصفح: بلا مدة ولا تاريخ انتهاء
+        self.assertEqual(cookie['max-age'], '')
+        self.assertEqual(cookie['expires'], '')
+        self.assertTrue(self.client.session.get_expire_at_browser_close())
+        self.assertGreater(self.client.session[REFRESHED_KEY], refreshed_at)
+
+    def test_login_sets_refresh_time(self):
+        before = int(time.time())
+        self.assertGreaterEqual(self.login(), before)
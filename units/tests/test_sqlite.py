@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from units.models import UnitImage
+from units.sqlite import RetryOnLockedAdminMixin, call_with_retry, stats
+
+
+class Locked:
+    """دالة تفشل بالقفل عدداً من المرات ثم تنجح"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OperationalError('database is locked')
+        return 'ok'
+
+
+@override_settings(DB_LOCK_RETRIES=3, DB_LOCK_BACKOFF_MS=0)
+class CallWithRetryTests(TransactionTestCase):
+    # خارج معاملة الاختبار: داخل أي معاملة لا تُعاد المحاولة
+    databases = {'default', 'analytics'}
+
+    def test_retries_locked_errors(self):
+        func = Locked(failures=2)
+        self.assertEqual(call_with_retry(func, name='test:retry'), 'ok')
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(stats['by_operation']['test:retry']['retries'], 2)
+
+    def test_gives_up_after_last_retry(self):
+        func = Locked(failures=10)
+        with self.assertRaises(OperationalError):
+            call_with_retry(func, name='test:give_up')
+        self.assertEqual(func.calls, 4)
+        self.assertEqual(stats['by_operation']['test:give_up']['gave_up'], 1)
+
+    def test_no_retry_inside_atomic(self):
+        # المعاملة الخارجية فشلت كلها، فإعادة جزء منها لا معنى لها
+        func = Locked(failures=1)
+        with transaction.atomic():
+            with self.assertRaises(OperationalError):
+                call_with_retry(func, name='test:atomic')
+        self.assertEqual(func.calls, 1)
+
+    def test_other_errors_are_not_retried(self):
+        def broken():
+            broken.calls += 1
+            raise OperationalError('no such table: units_nothing')
+        broken.calls = 0
+        with self.assertRaises(OperationalError):
+            call_with_retry(broken, name='test:other')
+        self.assertEqual(broken.calls, 1)
+
+
+class BusyTimeoutTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def test_connections_wait_for_busy_timeout(self):
+        self.assertEqual(settings.SQLITE_BUSY_TIMEOUT, 30)
+        for alias in ('default', 'analytics'):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT * 1000)
+
+
+class LockedView:
+    calls = 0
+
+    def changeform_view(self, request, *args, **kwargs):
+        self.calls += 1
+        raise OperationalError('database is locked')
+
+    delete_view = changeform_view
+
+
+class RetryingAdmin(RetryOnLockedAdminMixin, LockedView):
+    opts = UnitImage._meta
+
+
+@override_settings(DB_LOCK_RETRIES=2, DB_LOCK_BACKOFF_MS=0)
+class RetryOnLockedAdminMixinTests(SimpleTestCase):
+    def test_form_without_files_is_retried(self):
+        admin = RetryingAdmin()
+        with self.assertRaises(OperationalError):
+            admin.changeform_view(RequestFactory().post('/', {'caption': 'x'}))
+        self.assertEqual(admin.calls, 3)
+
+    def test_upload_is_not_retried(self):
+        admin = RetryingAdmin()
+        request = RequestFactory().post('/', {'image': SimpleUploadedFile('a.jpg', b'x')})
+        with self.assertRaises(OperationalError):
+            admin.changeform_view(request)
+        self.assertEqual(admin.calls, 1)
+
+    def test_delete_is_retried(self):
+        admin = RetryingAdmin()
+        with self.assertRaises(OperationalError):
+            admin.delete_view(RequestFactory().post('/', {'post': 'yes'}))
+        self.assertEqual(admin.calls, 3)
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase, override_settings
+
+from units import tracking
+
+BROWSER = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Safari/604.1'
+
+
+class TrackingFilterTests(SimpleTestCase):
+    def setUp(self):
+        tracking.reset_patterns()
+        self.addCleanup(tracking.reset_patterns)
+
+    def test_defaults_come_from_tracking_module(self):
+        self.assertTrue(tracking.is_bot('Googlebot/2.1 (+http://www.google.com/bot.html)'))
+        self.assertFalse(tracking.is_bot(BROWSER))
+        self.assertFalse(tracking.path_tracked('/static/app.css'))
+        self.assertTrue(tracking.path_tracked('/units/1/'))
+
+    def test_empty_user_agent_is_recorded_by_default(self):
+        self.assertFalse(tracking.is_bot(''))
+        self.assertEqual(tracking.visit_weight(None), 1)
+
+    @override_settings(VISIT_EMPTY_USER_AGENT_IS_BOT=True)
+    def test_empty_user_agent_as_bot_when_enabled(self):
+        self.assertTrue(tracking.is_bot(''))
+        self.assertEqual(tracking.visit_weight(None), 0)
+
+    @override_settings(VISIT_BOT_USER_AGENT_PATTERNS=[r'iphone'], VISIT_EXCLUDE_PATHS=[r'^/units/'])
+    def test_settings_replace_defaults(self):
+        self.assertTrue(tracking.is_bot(BROWSER))
+        self.assertFalse(tracking.is_bot('Googlebot/2.1'))
+        self.assertFalse(tracking.path_tracked('/units/1/'))
+        self.assertTrue(tracking.path_tracked('/static/app.css'))
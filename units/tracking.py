@@ -0,0 +1,105 @@
+"""
+اختيار الزيارات التي تُسجل: استبعاد الروبوتات والمسارات غير المهمة، وأخذ عينة من الزوار
+
+- المتصفحات التي تطابق أنماط الروبوتات (محركات البحث، أدوات المراقبة...) لا تُسجل.
+  الطلبات بلا User-Agent تُسجل إلا إذا فُعّل VISIT_EMPTY_USER_AGENT_IS_BOT.
+- المسارات تُفحص بأنماط الاستبعاد ثم أنماط التضمين (إن وُجدت).
+- زيارات الزوار غير المسجلين تُسجل بنسبة 1 من كل N، وتُحفظ الزيارة بوزن N
+  حتى تبقى الأعداد في الإحصائيات صحيحة في المتوسط. زيارات المستخدمين المسجلين تُسجل كلها.
+
+الأنماط تُترجم مرة واحدة لكل عملية، ونتيجة فحص المتصفح محفوظة في ذاكرة LRU
+لأن عدد المتصفحات المختلفة صغير.
+"""
+import random
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULT_BOT_USER_AGENT_PATTERNS = (
+    r'bot\b', r'crawl', r'spider', r'slurp', r'archiver', r'facebookexternalhit',
+    r'embedly', r'preview', r'monitor', r'uptime', r'pingdom', r'statuscake',
+    r'headless', r'phantomjs', r'python-requests', r'python-urllib', r'aiohttp',
+    r'curl/', r'wget/', r'go-http-client', r'okhttp', r'java/', r'libwww', r'httpclient',
+)
+
+DEFAULT_EXCLUDE_PATHS = (
+    r'^/static/', r'^/media/', r'^/admin/', r'^/api/',
+    r'^/metrics/', r'^/reports/jobs/', r'^/favicon\.ico$', r'^/robots\.txt$',
+)
+
+stats = {
+    'bots': 0,
+    'excluded_paths': 0,
+    'sampled_out': 0,
+}
+
+
+def _compile(patterns):
+    patterns = list(patterns or ())
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _patterns():
+    return {
+        'bots': _compile(getattr(settings, 'VISIT_BOT_USER_AGENT_PATTERNS', DEFAULT_BOT_USER_AGENT_PATTERNS)),
+        'exclude': _compile(getattr(settings, 'VISIT_EXCLUDE_PATHS', DEFAULT_EXCLUDE_PATHS)),
+        'include': _compile(getattr(settings, 'VISIT_INCLUDE_PATHS', ())),
+        'empty_is_bot': getattr(settings, 'VISIT_EMPTY_USER_AGENT_IS_BOT', False),
+    }
+
+
+def reset_patterns():
+    """إعادة ترجمة الأنماط بعد تغيير الإعدادات"""
+    _patterns.cache_clear()
+    is_bot.cache_clear()
+
+
+def sample_rate():
+    """تسجيل 1 من كل N زيارة لغير المسجلين (1 = تسجيل الكل)"""
+    return max(int(getattr(settings, 'VISIT_SAMPLE_RATE', 1)), 1)
+
+
+@lru_cache(maxsize=1024)
+def is_bot(user_agent):
+    """هل المتصفح روبوت؟ (المتصفح الفارغ حسب VISIT_EMPTY_USER_AGENT_IS_BOT)"""
+    if not user_agent:
+        return _patterns()['empty_is_bot']
+    pattern = _patterns()['bots']
+    return bool(pattern and pattern.search(user_agent))
+
+
+def path_tracked(path):
+    """هل يُسجل هذا المسار حسب أنماط الاستبعاد والتضمين؟"""
+    patterns = _patterns()
+    tracked = not (patterns['exclude'] and patterns['exclude'].search(path))
+    if tracked and patterns['include']:
+        tracked = bool(patterns['include'].search(path))
+    if not tracked:
+        stats['excluded_paths'] += 1
+    return tracked
+
+
+def visit_weight(user_agent, user=None):
+    """وزن الزيارة إن كانت ستُسجل، أو 0 لتجاهلها (روبوت أو خارج العينة)"""
+    if is_bot(user_agent):
+        stats['bots'] += 1
+        return 0
+    if user is not None:
+        return 1
+    rate = sample_rate()
+    if rate > 1 and random.randrange(rate):
+        stats['sampled_out'] += 1
+        return 0
+    return rate
+
+
+def tracking_stats():
+    data = dict(stats)
+    data['sample_rate'] = sample_rate()
+    info = is_bot.cache_info()
+    data['bot_cache'] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
+    return data
@@ -10,12 +10,22 @@ urlpatterns = [
     path('units/', views.units, name='units'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('api/unit/<int:unit_id>/bookings/', views.unit_bookings, name='unit_bookings'),
+    path('api/unit/<int:unit_id>/prices/<int:year>/', views.unit_price_calendar, name='unit_price_calendar'),
+    path('api/availability/', views.availability_search, name='availability_search'),
+    path('api/occupancy/', views.occupancy_grid_view, name='occupancy_grid'),
+    path('api/pricing/quote/', views.pricing_quote, name='pricing_quote'),
     path('api/unit/<int:unit_id>/bookings/create/', views.create_booking, name='create_booking'),
     path('api/unit/<int:unit_id>/bookings/cancel/', views.cancel_booking, name='cancel_booking'),
     # admin reports
     path('reports/payment-reports/', views.payment_reports, name='payment_reports'),
     path('reports/payment-reports/pdf/', views.payment_reports_pdf, name='payment_reports_pdf'),
     path('reports/payment-reports/excel/', views.payment_reports_excel, name='payment_reports_excel'),
+    path('reports/export/bookings.<str:fmt>', views.bookings_export, name='bookings_export'),
+    path('reports/export/expenses.<str:fmt>', views.expenses_export, name='expenses_export'),
+    path('reports/jobs/', views.report_job_submit, name='report_job_submit'),
+    path('reports/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
+    path('metrics/', views.metrics, name='metrics'),
     # auth
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -1,141 +1,45 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import messages
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse, HttpResponse
-from .models import Unit, Booking, Report, Contract, Expense, UnitPricing, SpecialPricing, ProfitPercentage, Holiday
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse, Http404
+from .models import Unit, Booking, Report, Contract, Expense, UnitPricing, SpecialPricing, ReportJob
+from .finance import get_unit_summary
+from .profits import unit_profits, profits_totals, top_units_by_bookings
+from .reports import PaymentReportQuery
+from .excel import EXCEL_AVAILABLE, payment_report_title, payment_report_xlsx_tempfile
+from .dimensions import intern_cache_stats
+from .availability import SORT_OPTIONS, search_availability
+from .occupancy import GRID_FLAGS, occupancy_grid
+from .holidays import unit_holidays
+from .pricing import quote_many
+from .price_calendar import SOURCE_CODES, price_calendar, window_prices
+from django.conf import settings
+from .sqlite import call_with_retry, is_locked_error, sqlite_stats
+from .tracking import tracking_stats
+from .visits import visit_buffer_stats
+from .jobs import JOB_KINDS, submit_report_job, job_payload, job_download_name, requeue_stale_jobs, schedule_report_job
+from .exports import (
+    EXPORT_FORMATS, BOOKING_EXPORT_FIELDS, EXPENSE_EXPORT_FIELDS,
+    export_bookings_queryset, export_expenses_queryset, iter_export, export_filename,
+)
+from django.db import OperationalError
 from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta
 from calendar import monthrange
+from decimal import Decimal, InvalidOperation
 from django.views.decorators.cache import never_cache
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.models import User
 from django.http import HttpResponseRedirect
 from django.views.decorators.http import require_POST
-from django.db.models import Sum
 import json
 from io import BytesIO
 
-def format_date_arabic(date_obj):
-    """تحويل التاريخ إلى صيغة عربية مع التقويم الميلادي ويوم الأسبوع"""
-    if not date_obj:
-        return ""
-    if isinstance(date_obj, str):
-        try:
-            date_obj = datetime.strptime(date_obj, '%Y-%m-%d').date()
-        except:
-            try:
-                date_obj = datetime.strptime(date_obj, '%Y-%m-%d %H:%M:%S').date()
-            except:
-                return date_obj
-    
-    # أيام الأسبوع بالعربي
-    weekdays_arabic = {
-        0: 'الإثنين', 1: 'الثلاثاء', 2: 'الأربعاء', 3: 'الخميس',
-        4: 'الجمعة', 5: 'السبت', 6: 'الأحد'
-    }
-    
-    months_arabic = {
-        1: 'يناير', 2: 'فبراير', 3: 'مارس', 4: 'أبريل',
-        5: 'مايو', 6: 'يونيو', 7: 'يوليو', 8: 'أغسطس',
-        9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
-    }
-    
-    weekday_num = date_obj.weekday()  # 0=Monday, 6=Sunday
-    weekday_name = weekdays_arabic[weekday_num]
-    day = date_obj.day
-    month = months_arabic[date_obj.month]
-    year = date_obj.year
-    
-    return f"{weekday_name} {day} {month} {year}"
-
-def setup_arabic_font():
-    """تسجيل خط يدعم العربية - الأفضلية للخطوط التي تدعم العربية بشكل كامل"""
-    try:
-        # ترتيب الخطوط حسب الأفضلية (الأفضل أولاً)
-        font_paths = [
-            # Windows - Tahoma و Arial Unicode أفضل للعربية
-            'C:/Windows/Fonts/tahoma.ttf',
-            'C:/Windows/Fonts/tahomabd.ttf',  # Tahoma Bold
-            'C:/Windows/Fonts/arialuni.ttf',  # Arial Unicode - يدعم العربية بشكل ممتاز
-            'C:/Windows/Fonts/arial.ttf',
-            'C:/Windows/Fonts/arialbd.ttf',    # Arial Bold
-            'C:/Windows/Fonts/Times New Roman.ttf',
-            # Linux - DejaVu Sans
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-            '/usr/share/fonts/TTF/DejaVuSans.ttf',
-            '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf',
-        ]
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    # تسجيل الخط العادي
-                    if 'bold' not in font_path.lower() and 'bd' not in font_path.lower():
-                        pdfmetrics.registerFont(TTFont('ArabicFont', font_path))
-                        # تسجيل الخط العريض أيضاً إن أمكن
-                        try:
-                            bold_path = font_path.replace('.ttf', 'bd.ttf')
-                            if not os.path.exists(bold_path):
-                                bold_path = font_path.replace('.ttf', 'Bold.ttf')
-                            if os.path.exists(bold_path):
-                                pdfmetrics.registerFont(TTFont('ArabicFont-Bold', bold_path))
-                        except:
-                            pass
-                        return 'ArabicFont'
-                    else:
-                        # إذا كان خط عريض، نحتاج أيضاً للعادي
-                        normal_path = font_path.replace('bd.ttf', '.ttf').replace('Bold.ttf', '.ttf')
-                        if os.path.exists(normal_path):
-                            pdfmetrics.registerFont(TTFont('ArabicFont', normal_path))
-                            pdfmetrics.registerFont(TTFont('ArabicFont-Bold', font_path))
-                            return 'ArabicFont'
-                except Exception as e:
-                    continue
-        
-        # إذا لم يتم العثور على خط يدعم العربية، استخدم Helvetica
-        return 'Helvetica'
-    except Exception:
-        return 'Helvetica'
-
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-import os
-
-# محاولة استيراد مكتبات إعادة تشكيل النص العربي
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-    ARABIC_SUPPORT = True
-except ImportError:
-    ARABIC_SUPPORT = False
-    arabic_reshaper = None
-    get_display = None
-
-def reshape_arabic_text(text):
-    """إعادة تشكيل النص العربي لعرضه بشكل صحيح من اليمين لليسار"""
-    if not text or not ARABIC_SUPPORT:
-        return text
-    
-    try:
-        # إعادة تشكيل النص العربي
-        reshaped_text = arabic_reshaper.reshape(text)
-        # تحويل الاتجاه من اليمين إلى اليسار
-        bidi_text = get_display(reshaped_text)
-        return bidi_text
-    except Exception:
-        return text
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    EXCEL_AVAILABLE = True
-except ImportError:
-    EXCEL_AVAILABLE = False
+from .arabic import format_date_arabic, cache_stats as arabic_cache_stats
+from .pdf import payment_report_pdf_tempfile, pdf_max_sync_rows, write_profits_pdf
 
 def home(request):
     """عرض الصفحة الرئيسية"""
@@ -167,27 +71,110 @@ def units(request):
     response['Pragma'] = 'no-cache'
     return response
 
+# أقصى مدة لنافذة التقويم حتى لا يعود الحمل غير محدود
+MAX_BOOKING_WINDOW_DAYS = 366
+
+
+def parse_booking_window(params):
+    """قراءة نافذة التقويم من معاملات الطلب (month=YYYY-MM أو from/to)
+
+    تُرجع (None, None) إذا لم تُحدد نافذة، وترفع ValueError عند خطأ التنسيق.
+    """
+    month = params.get('month')
+    date_from = params.get('from')
+    date_to = params.get('to')
+
+    if month:
+        try:
+            month_start = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            raise ValueError('تنسيق الشهر غير صحيح (YYYY-MM)')
+        days_in_month = monthrange(month_start.year, month_start.month)[1]
+        return month_start, month_start.replace(day=days_in_month)
+
+    if not date_from and not date_to:
+        return None, None
+    if not (date_from and date_to):
+        raise ValueError('يجب تحديد from و to معاً')
+
+    try:
+        window_start = datetime.strptime(date_from, '%Y-%m-%d').date()
+        window_end = datetime.strptime(date_to, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('تنسيق التاريخ غير صحيح')
+    if window_end < window_start:
+        raise ValueError('تاريخ النهاية قبل تاريخ البداية')
+    if (window_end - window_start).days + 1 > MAX_BOOKING_WINDOW_DAYS:
+        raise ValueError(f'أقصى مدة للنافذة {MAX_BOOKING_WINDOW_DAYS} يوماً')
+    return window_start, window_end
+
+
+def unit_financial_totals(unit):
+    """إجمالي الحجوزات والمصروفات والصافي لوحدة معينة (من الملخص المُجمّع)"""
+    summary = get_unit_summary(unit)
+    return {
+        'total_booking_amount': round(float(summary.total_revenue), 2),
+        'total_expenses': round(float(summary.total_expenses), 2),
+        'net_total': round(float(summary.net_total), 2),
+    }
+
+
+def can_view_unit_prices(user, unit):
+    return user.is_authenticated and (user.is_staff or unit.owner_id == user.id)
+
+
+@login_required
+@never_cache
+def unit_price_calendar(request, unit_id, year):
+    """تقويم أسعار سنة كاملة لوحدة: سعر كل يوم (أو null) وحرف مصدره بالترتيب من 1 يناير"""
+    unit = get_object_or_404(Unit, id=unit_id)
+    if not can_view_unit_prices(request.user, unit):
+        raise Http404
+    if not 1 <= year <= 9998:
+        return JsonResponse({'error': 'سنة غير صحيحة'}, status=400)
+    values, sources = price_calendar(unit.id, year).values()
+    return JsonResponse({
+        'unit': unit.id,
+        'year': year,
+        'values': values,
+        'sources': sources,
+        'source_codes': {code: source for source, code in SOURCE_CODES.items() if source},
+    })
+
+
 @never_cache
 def unit_bookings(request, unit_id):
-    """إرجاع الحجوزات لوحدة معينة بصيغة JSON للتقويم"""
+    """إرجاع الحجوزات لوحدة معينة بصيغة JSON للتقويم
+
+    يدعم نافذة زمنية عبر month=YYYY-MM أو from/to (YYYY-MM-DD) بحيث تُحمّل
+    حجوزات الفترة المعروضة فقط، ويُضاف ملخص الإجماليات عند طلب totals=1،
+    وأسعار أيام النافذة من تقويم الأسعار عند طلب prices=1 (للمالك والموظفين).
+    بدون نافذة يبقى السلوك القديم (كل الحجوزات مع الإجماليات).
+    """
     unit = get_object_or_404(Unit, id=unit_id)
+
+    try:
+        window_start, window_end = parse_booking_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
     bookings = Booking.objects.filter(unit=unit)
-    expenses_qs = Expense.objects.filter(unit=unit)
-    
+    if window_start is not None:
+        # استعلام نطاق على الفهرس (unit, start_date, end_date)
+        bookings = bookings.filter(start_date__lte=window_end, end_date__gte=window_start)
+
+    user_id = request.user.id if request.user.is_authenticated else None
     events = []
-    total_booking_amount = 0.0
-    for booking in bookings:
-        # إنشاء حدث لكل يوم في فترة الحجز
+    for booking in bookings.only(
+        'start_date', 'end_date', 'price_per_day', 'notes', 'is_owner_booking', 'user_id'
+    ):
+        # إنشاء حدث لكل يوم في فترة الحجز (داخل النافذة فقط)
         current_date = booking.start_date
-        # عدد الأيام في الحجز الحالي (يشمل اليوم الأخير)
-        total_days = (booking.end_date - booking.start_date).days + 1
-        # حساب قيمة الحجز (سعر اليوم * عدد الأيام) أو المبالغ المسجلة
-        cash_transfer_total = float((booking.cash_amount or 0) + (booking.transfer_amount or 0))
-        if cash_transfer_total > 0:
-            total_booking_amount += cash_transfer_total
-        elif booking.price_per_day is not None:
-            total_booking_amount += float(booking.price_per_day) * max(total_days, 1)
-        while current_date <= booking.end_date:
+        last_date = booking.end_date
+        if window_start is not None:
+            current_date = max(current_date, window_start)
+            last_date = min(last_date, window_end)
+        while current_date <= last_date:
             events.append({
                 'date': current_date.strftime('%Y-%m-%d'),
                 'title': 'محجوز من المالك' if booking.is_owner_booking else 'محجوز',
@@ -195,20 +182,29 @@ def unit_bookings(request, unit_id):
                 'price': float(booking.price_per_day) if booking.price_per_day is not None else None,
                 'notes': booking.notes or '',
                 'is_owner_booking': booking.is_owner_booking,
-                'is_user_booking': (request.user.is_authenticated and booking.user_id == request.user.id)
+                'is_user_booking': (user_id is not None and booking.user_id == user_id)
             })
             current_date += timedelta(days=1)
-    
-    total_expenses = expenses_qs.aggregate(total=Sum('price'))['total'] or 0
-    net_total = total_booking_amount - float(total_expenses)
 
-    resp = JsonResponse({
+    data = {
         'events': events,
         'unit_name': unit.name,
-        'total_booking_amount': round(total_booking_amount, 2),
-        'total_expenses': round(float(total_expenses), 2),
-        'net_total': round(net_total, 2),
-    })
+    }
+    if window_start is None:
+        # التوافق مع الاستدعاءات القديمة: الإجماليات في المستوى الأعلى
+        data.update(unit_financial_totals(unit))
+    else:
+        data['window'] = {
+            'from': window_start.strftime('%Y-%m-%d'),
+            'to': window_end.strftime('%Y-%m-%d'),
+        }
+        if request.GET.get('totals') in ('1', 'true'):
+            data['totals'] = unit_financial_totals(unit)
+        if request.GET.get('prices') in ('1', 'true') and can_view_unit_prices(request.user, unit):
+            values, sources = window_prices(unit.id, window_start, window_end)
+            data['prices'] = {'values': values, 'sources': sources}
+
+    resp = JsonResponse(data)
     resp['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
     resp['Pragma'] = 'no-cache'
     return resp
@@ -221,6 +217,194 @@ def dashboard(request):
     return redirect('units:units')
 
 
+@login_required
+@never_cache
+def availability_search(request):
+    """الوحدات المتاحة في فترة (from/to أو month) لكل الوحدات أو وحدات مالك
+
+    الموظف يبحث في كل الوحدات (أو owner=<id>)، والمستثمر في وحداته فقط.
+    اختياري: min_nights (أول مدة حرة متصلة بهذا الطول تكفي)، max_price (حد
+    أعلى لمتوسط سعر الليلة)، sort=price|name.
+    """
+    try:
+        window_start, window_end = parse_booking_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if window_start is None:
+        return JsonResponse({'error': 'يجب تحديد الفترة (from و to أو month)'}, status=400)
+
+    window_nights = (window_end - window_start).days + 1
+    try:
+        min_nights = int(request.GET['min_nights']) if request.GET.get('min_nights') else None
+        max_price = Decimal(request.GET['max_price']) if request.GET.get('max_price') else None
+        owner_id = int(request.GET['owner']) if request.GET.get('owner') else None
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'قيمة غير صحيحة في min_nights أو max_price أو owner'}, status=400)
+    if min_nights is not None and not 1 <= min_nights <= window_nights:
+        return JsonResponse({'error': f'min_nights يجب أن يكون بين 1 و {window_nights}'}, status=400)
+    sort = request.GET.get('sort', 'price')
+    if sort not in SORT_OPTIONS:
+        return JsonResponse({'error': 'sort يجب أن يكون price أو name'}, status=400)
+
+    units_qs = Unit.objects.filter(is_available=True)
+    if not request.user.is_staff:
+        units_qs = units_qs.filter(owner=request.user)
+    elif owner_id is not None:
+        units_qs = units_qs.filter(owner_id=owner_id)
+
+    results = search_availability(units_qs, window_start, window_end, min_nights, max_price, sort)
+    return JsonResponse({
+        'from': window_start.strftime('%Y-%m-%d'),
+        'to': window_end.strftime('%Y-%m-%d'),
+        'nights': window_nights,
+        'count': len(results),
+        'units': results,
+    })
+
+
+def _parse_quote_range(item):
+    """(من، إلى) من {from, to} في طلب التسعير"""
+    try:
+        start = datetime.strptime(item['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(item['to'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('كل فترة تحتاج from و to بتنسيق YYYY-MM-DD')
+    if end < start:
+        raise ValueError('تاريخ النهاية قبل تاريخ البداية')
+    if (end - start).days + 1 > MAX_BOOKING_WINDOW_DAYS:
+        raise ValueError(f'أقصى مدة للنافذة {MAX_BOOKING_WINDOW_DAYS} يوماً')
+    return start, end
+
+
+def _parse_quote_unit(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('رقم وحدة غير صحيح')
+
+
+def _quote_json(quote):
+    data = {
+        'unit': quote['unit'],
+        'from': quote['from'].strftime('%Y-%m-%d'),
+        'to': quote['to'].strftime('%Y-%m-%d'),
+        'nights': quote['nights'],
+        'total': float(quote['total']) if quote['total'] is not None else None,
+        'missing': quote['missing'],
+        'sources': quote['sources'],
+    }
+    if 'detail' in quote:
+        data['detail'] = [
+            {
+                'date': night['date'].strftime('%Y-%m-%d'),
+                'price': float(night['price']) if night['price'] is not None else None,
+                'source': night['source'],
+            }
+            for night in quote['detail']
+        ]
+    return data
+
+
+@login_required
+@require_POST
+@never_cache
+def pricing_quote(request):
+    """تسعير عدة وحدات × فترات في طلب واحد (JSON)
+
+    الجسم: {"quotes": [{"unit": 1, "from": "YYYY-MM-DD", "to": "YYYY-MM-DD"}, ...]}
+    أو {"units": [1, 2], "ranges": [{"from": ..., "to": ...}, ...]} لكل الوحدات في
+    كل الفترات. اختياري: detail (سعر ومصدر كل ليلة)، include_bookings (الافتراضي
+    true: الليالي المحجوزة بسعر الحجز). المستثمر يسعّر وحداته فقط.
+    """
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        if not isinstance(payload, dict):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'الطلب يجب أن يكون JSON'}, status=400)
+
+    try:
+        if 'quotes' in payload:
+            items = [
+                (_parse_quote_unit(item['unit']), *_parse_quote_range(item)) for item in payload['quotes']
+            ]
+        else:
+            ranges = [_parse_quote_range(item) for item in payload.get('ranges', [])]
+            items = [
+                (_parse_quote_unit(unit_id), start, end) for unit_id in payload.get('units', []) for start, end in ranges
+            ]
+    except (KeyError, TypeError):
+        return JsonResponse({'error': 'كل طلب تسعير يحتاج unit و from و to'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if not items:
+        return JsonResponse({'error': 'لا توجد طلبات تسعير'}, status=400)
+    max_items = getattr(settings, 'PRICING_QUOTE_MAX_ITEMS', 500)
+    if len(items) > max_items:
+        return JsonResponse({'error': f'أقصى عدد لطلبات التسعير {max_items}'}, status=400)
+
+    unit_ids = {unit_id for unit_id, _, _ in items}
+    allowed = Unit.objects.filter(id__in=unit_ids)
+    if not request.user.is_staff:
+        allowed = allowed.filter(owner=request.user)
+    missing_units = unit_ids - set(allowed.values_list('id', flat=True))
+    if missing_units:
+        return JsonResponse({'error': f'وحدات غير موجودة: {sorted(missing_units)}'}, status=400)
+
+    quotes = quote_many(
+        items,
+        include_bookings=payload.get('include_bookings', True) is not False,
+        detail=bool(payload.get('detail')),
+    )
+    return JsonResponse({'quotes': [_quote_json(quote) for quote in quotes]})
+
+
+# نافذة شبكة الإشغال الافتراضية (من اليوم)
+OCCUPANCY_DEFAULT_DAYS = 14
+
+
+@staff_member_required
+@never_cache
+def occupancy_grid_view(request):
+    """شبكة إشغال كل الوحدات (الوحدات × الأيام) للموظفين بصيغة JSON
+
+    النافذة من from/to أو month (الافتراضي أسبوعان من اليوم)، و owner=<id>
+    اختياري. كل وحدة سطر days بحرف ست عشري لكل يوم يجمع علامات flags.
+    """
+    try:
+        window_start, window_end = parse_booking_window(request.GET)
+        owner_id = int(request.GET['owner']) if request.GET.get('owner') else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if window_start is None:
+        window_start = datetime.now().date()
+        window_end = window_start + timedelta(days=OCCUPANCY_DEFAULT_DAYS - 1)
+
+    units_qs = Unit.objects.order_by('name')
+    if owner_id is not None:
+        units_qs = units_qs.filter(owner_id=owner_id)
+
+    return JsonResponse({
+        'from': window_start.strftime('%Y-%m-%d'),
+        'to': window_end.strftime('%Y-%m-%d'),
+        'days': (window_end - window_start).days + 1,
+        'flags': GRID_FLAGS,
+        'units': occupancy_grid(units_qs, window_start, window_end),
+    })
+
+
+@staff_member_required
+@never_cache
+def occupancy_view(request):
+    """صفحة شبكة الإشغال في لوحة التحكم (تُحمّل البيانات من occupancy_grid_view)"""
+    owners = User.objects.filter(owned_units__isnull=False).distinct().order_by('username')
+    return render(request, 'admin/occupancy.html', {
+        'owners': owners,
+        'default_days': OCCUPANCY_DEFAULT_DAYS,
+    })
+
+
 @login_required
 @require_POST
 @never_cache
@@ -262,7 +446,11 @@ def create_booking(request, unit_id):
     )
 
     try:
-        booking.save()
+        call_with_retry(booking.save, name='create_booking')
+    except OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        return JsonResponse({'error': 'النظام مشغول حالياً، حاول مرة أخرى'}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -326,7 +514,11 @@ def cancel_booking(request, unit_id):
         return JsonResponse({'error': 'غير مصرح لك بإلغاء هذا الحجز'}, status=403)
 
     try:
-        booking.delete()
+        call_with_retry(booking.delete, name='cancel_booking')
+    except OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        return JsonResponse({'error': 'النظام مشغول حالياً، حاول مرة أخرى'}, status=503)
     except Exception as e:
         return JsonResponse({'error': f'تعذر إلغاء الحجز: {str(e)}'}, status=400)
     return JsonResponse({'ok': True})
@@ -367,80 +559,33 @@ def logout_view(request):
 @never_cache
 def payment_reports(request):
     """تقارير المدفوعات - عرض مفصل للكاش والتحويل مع فلترة"""
-    from django.db.models import Q
-    
     # الحصول على جميع الوحدات للقائمة
-    all_units = Unit.objects.all().order_by('name')
+    all_units = list(Unit.objects.only('id', 'name').order_by('name'))
     
-    # معاملات الفلترة
-    unit_id = request.GET.get('unit_id', '')
-    report_type = request.GET.get('report_type', 'all')  # all, daily, weekly, monthly
-    selected_date = request.GET.get('date', '')
+    # الفلترة والإجماليات (استعلام للإجماليات وآخر للصفوف)
+    query = PaymentReportQuery.from_request(request)
+    totals = query.totals
+    rows = query.rows
     
-    # البدء بجميع الحجوزات
-    bookings = Booking.objects.all().select_related('unit', 'unit__owner')
+    selected_unit = next((u for u in all_units if u.pk == query.unit_pk), None)
     
-    # فلترة حسب الوحدة
-    if unit_id and unit_id != 'all':
-        try:
-            unit_filter = Unit.objects.get(id=unit_id)
-            bookings = bookings.filter(unit=unit_filter)
-            selected_unit = unit_filter
-        except Unit.DoesNotExist:
-            selected_unit = None
-    else:
-        selected_unit = None
-    
-    # فلترة حسب نوع التقرير
-    if report_type == 'daily' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            bookings = bookings.filter(start_date=target_date)
-        except ValueError:
-            pass
-    elif report_type == 'weekly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            week_start = target_date - timedelta(days=target_date.weekday())
-            week_end = week_start + timedelta(days=6)
-            bookings = bookings.filter(start_date__gte=week_start, start_date__lte=week_end)
-        except ValueError:
-            pass
-    elif report_type == 'monthly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            month_start = target_date.replace(day=1)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
-            bookings = bookings.filter(start_date__gte=month_start, start_date__lte=month_end)
-        except ValueError:
-            pass
-    
-    bookings = bookings.order_by('-start_date')
-    
-    # حساب الإجماليات
-    total_cash = bookings.aggregate(Sum('cash_amount'))['cash_amount__sum'] or 0
-    total_transfer = bookings.aggregate(Sum('transfer_amount'))['transfer_amount__sum'] or 0
-    total_all = total_cash + total_transfer
-    
-    # فصل الحجوزات حسب نوع الدفع
-    cash_bookings = bookings.filter(cash_amount__gt=0).order_by('-start_date')
-    transfer_bookings = bookings.filter(transfer_amount__gt=0).order_by('-start_date')
+    # فصل الحجوزات حسب نوع الدفع (من نفس الصفوف دون استعلامات إضافية)
+    cash_bookings = [row for row in rows if row.cash_amount and row.cash_amount > 0]
+    transfer_bookings = [row for row in rows if row.transfer_amount and row.transfer_amount > 0]
     
     context = {
-        'bookings': bookings,
+        'bookings': rows,
         'cash_bookings': cash_bookings,
         'transfer_bookings': transfer_bookings,
-        'total_cash': total_cash,
-        'total_transfer': total_transfer,
-        'total_all': total_all,
+        'total_cash': totals['total_cash'],
+        'total_transfer': totals['total_transfer'],
+        'total_all': totals['total_all'],
+        'booking_count': totals['booking_count'],
         'all_units': all_units,
-        'selected_unit_id': unit_id or 'all',
+        'selected_unit_id': query.unit_id,
         'selected_unit': selected_unit,
-        'selected_report_type': report_type,
-        'selected_date': selected_date,
+        'selected_report_type': query.report_type,
+        'selected_date': query.selected_date,
     }
     
     return render(request, 'admin/payment_reports.html', context)
@@ -450,310 +595,27 @@ def payment_reports(request):
 @never_cache
 def payment_reports_pdf(request):
     """تصدير تقارير المدفوعات كـ PDF مع فلترة"""
-    # نفس منطق الفلترة من payment_reports
-    unit_id = request.GET.get('unit_id', '')
-    report_type = request.GET.get('report_type', 'all')
-    selected_date = request.GET.get('date', '')
-    
-    bookings = Booking.objects.all().select_related('unit', 'unit__owner')
-    
-    # فلترة حسب الوحدة
-    if unit_id and unit_id != 'all':
-        try:
-            unit_filter = Unit.objects.get(id=unit_id)
-            bookings = bookings.filter(unit=unit_filter)
-        except Unit.DoesNotExist:
-            pass
-    
-    # فلترة حسب نوع التقرير
-    if report_type == 'daily' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            bookings = bookings.filter(start_date=target_date)
-        except ValueError:
-            pass
-    elif report_type == 'weekly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            week_start = target_date - timedelta(days=target_date.weekday())
-            week_end = week_start + timedelta(days=6)
-            bookings = bookings.filter(start_date__gte=week_start, start_date__lte=week_end)
-        except ValueError:
-            pass
-    elif report_type == 'monthly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            month_start = target_date.replace(day=1)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
-            bookings = bookings.filter(start_date__gte=month_start, start_date__lte=month_end)
-        except ValueError:
-            pass
-    
-    bookings = bookings.order_by('-start_date')
-    
-    total_cash = bookings.aggregate(Sum('cash_amount'))['cash_amount__sum'] or 0
-    total_transfer = bookings.aggregate(Sum('transfer_amount'))['transfer_amount__sum'] or 0
-    total_all = total_cash + total_transfer
-    
-    # تسجيل خط يدعم العربية
-    arabic_font = setup_arabic_font()
-    if arabic_font == 'ArabicFont':
-        # محاولة استخدام الخط العريض المسجل
-        try:
-            if 'ArabicFont-Bold' in pdfmetrics.getRegisteredFontNames():
-                arabic_font_bold = 'ArabicFont-Bold'
-            else:
-                arabic_font_bold = 'ArabicFont'
-        except:
-            arabic_font_bold = 'ArabicFont'
-    else:
-        arabic_font_bold = 'Helvetica-Bold'
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4, 
-        rightMargin=1*cm,  # هوامش أقل = مساحة أكثر
-        leftMargin=1*cm,
-        topMargin=1.5*cm,
-        bottomMargin=1.5*cm,
-        title="تقارير المدفوعات"
+    # نفس طبقة الاستعلام المستخدمة في payment_reports
+    query = PaymentReportQuery.from_request(request)
+
+    # التقارير الأكبر من الحد تُوجَّه لتوليدها في الخلفية بدلاً من حجز الطلب
+    booking_count = query.totals['booking_count']
+    if booking_count > pdf_max_sync_rows():
+        messages.warning(
+            request,
+            f'التقرير يحتوي {booking_count} حجز وهو أكبر من حد التصدير المباشر '
+            f'({pdf_max_sync_rows()}). استخدم زر "PDF في الخلفية" ثم حمّل الملف عند جاهزيته.'
+        )
+        return redirect(f"{reverse('units:payment_reports')}?{urlencode(query.params())}")
+
+    # البناء في ملف مؤقت على القرص ثم إرساله مباشرة (بدون نسخ في الذاكرة)
+    tmp = payment_report_pdf_tempfile(query)
+    response = FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f'payment_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+        content_type='application/pdf',
     )
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    
-    # نمط العنوان الرئيسي
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=15,
-        alignment=1,  # center للعناوين
-        fontName=arabic_font_bold,
-        encoding='utf-8',
-        rightIndent=0,
-        leftIndent=0
-    )
-    
-    # نمط العنوان الفرعي
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=10,
-        alignment=1,  # center للعناوين
-        fontName=arabic_font,
-        encoding='utf-8',
-        rightIndent=0,
-        leftIndent=0
-    )
-    
-    # العنوان الرئيسي
-    main_title = Paragraph(reshape_arabic_text("تقارير المدفوعات"), title_style)
-    elements.append(main_title)
-    
-    # معلومات الشركة
-    company_info = Paragraph(reshape_arabic_text("القمة العقارية"), subtitle_style)
-    elements.append(company_info)
-    elements.append(Spacer(1, 0.3*cm))
-    
-    # معلومات الفلترة
-    filter_info = []
-    if unit_id and unit_id != 'all':
-        try:
-            unit_name = Unit.objects.get(id=unit_id).name
-            filter_info.append(reshape_arabic_text(f"الوحدة: {unit_name}"))
-        except:
-            pass
-    if report_type == 'daily' and selected_date:
-        filter_info.append(reshape_arabic_text(f"التقرير: يومي - {format_date_arabic(selected_date)}"))
-    elif report_type == 'weekly' and selected_date:
-        filter_info.append(reshape_arabic_text(f"التقرير: أسبوعي - {format_date_arabic(selected_date)}"))
-    elif report_type == 'monthly' and selected_date:
-        filter_info.append(reshape_arabic_text(f"التقرير: شهري - {format_date_arabic(selected_date)}"))
-    elif report_type == 'all':
-        filter_info.append(reshape_arabic_text("التقرير: جميع الحجوزات"))
-    
-    # تاريخ التصدير
-    export_date = format_date_arabic(datetime.now().date())
-    filter_info.append(reshape_arabic_text(f"تاريخ التصدير: {export_date}"))
-    
-    if filter_info:
-        filter_text = " | ".join(filter_info)
-        filter_para = Paragraph(filter_text, subtitle_style)
-        elements.append(filter_para)
-    
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # استخدام Paragraph للنصوص العربية - تنسيق أفضل للطباعة
-    table_style = ParagraphStyle(
-        'TableStyle',
-        parent=styles['Normal'],
-        fontSize=10,  # حجم أكبر للوضوح
-        alignment=1,  # CENTER
-        fontName=arabic_font,
-        encoding='utf-8',
-        rightIndent=0,
-        leftIndent=0,
-        spaceBefore=0,
-        spaceAfter=0,
-        leading=12  # مسافة أكبر بين الأسطر
-    )
-    
-    # نمط الجدول للعنوان - مطابق للوحة التحكم
-    table_header_style = ParagraphStyle(
-        'TableHeaderStyle',
-        parent=styles['Normal'],
-        fontSize=10,  # حجم مناسب
-        alignment=1,  # CENTER - العناوين في الوسط
-        fontName=arabic_font_bold,
-        encoding='utf-8',
-        rightIndent=0,
-        leftIndent=0,
-        leading=12  # المسافة بين الأسطر
-    )
-    
-    headers = [Paragraph(reshape_arabic_text('الوحدة'), table_header_style), 
-               Paragraph(reshape_arabic_text('التاريخ'), table_header_style), 
-               Paragraph(reshape_arabic_text('اسم العميل'), table_header_style), 
-               Paragraph(reshape_arabic_text('رقم الهاتف'), table_header_style), 
-               Paragraph(reshape_arabic_text('الكاش'), table_header_style), 
-               Paragraph(reshape_arabic_text('التحويل'), table_header_style), 
-               Paragraph(reshape_arabic_text('الإجمالي'), table_header_style)]
-    
-    data = [headers]
-    
-    for booking in bookings:
-        unit_name = Paragraph(reshape_arabic_text(booking.unit.name), table_style)
-        date_str = Paragraph(reshape_arabic_text(format_date_arabic(booking.start_date)), table_style)
-        customer_name = Paragraph(reshape_arabic_text(booking.customer_name or '-'), table_style)
-        customer_phone = Paragraph(reshape_arabic_text(booking.customer_phone or '-'), table_style)
-        cash = f"{float(booking.cash_amount):,.2f}" if booking.cash_amount else "0.00"
-        transfer = f"{float(booking.transfer_amount):,.2f}" if booking.transfer_amount else "0.00"
-        total = f"{float(booking.total_amount):,.2f}"
-        cash_amount = Paragraph(reshape_arabic_text(cash + ' ر.س'), table_style)
-        transfer_amount = Paragraph(reshape_arabic_text(transfer + ' ر.س'), table_style)
-        total_amount = Paragraph(reshape_arabic_text(total + ' ر.س'), table_style)
-        data.append([unit_name, date_str, customer_name, customer_phone, 
-                    cash_amount, transfer_amount, total_amount])
-    
-    total_row = [Paragraph(reshape_arabic_text('الإجمالي'), table_style), 
-                 Paragraph('', table_style), 
-                 Paragraph('', table_style), 
-                 Paragraph('', table_style), 
-                 Paragraph(reshape_arabic_text(f"{float(total_cash):,.2f} ر.س"), table_style), 
-                 Paragraph(reshape_arabic_text(f"{float(total_transfer):,.2f} ر.س"), table_style), 
-                 Paragraph(reshape_arabic_text(f"{float(total_all):,.2f} ر.س"), table_style)]
-    data.append(total_row)
-    
-    # عرض الأعمدة حسب المحتوى - بدون ضغط
-    available_width = A4[0] - (1*cm * 2)  # هوامش أقل = مساحة أكثر
-    
-    # توزيع الأعمدة بشكل متساوٍ على العرض المتاح - بدون ضغط
-    num_cols = 7
-    col_width = available_width / num_cols  # كل عمود يأخذ نفس العرض
-    
-    # لكن نعطي مساحة أكبر للأعمدة التي تحتاجها
-    col_widths = [
-        col_width * 1.0,  # الوحدة
-        col_width * 1.5,  # التاريخ - مساحة أكبر بكثير ليوم الأسبوع الكامل
-        col_width * 1.2,  # اسم العميل - مساحة جيدة
-        col_width * 1.4,  # رقم الهاتف - مساحة أكبر بكثير ليكون كامل
-        col_width * 0.9,  # الكاش
-        col_width * 0.9,  # التحويل
-        col_width * 0.9,  # الإجمالي
-    ]
-    
-    # ضبط العرض الإجمالي
-    total_width = sum(col_widths)
-    if total_width > available_width:
-        ratio = available_width / total_width
-        col_widths = [w * ratio for w in col_widths]
-    
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    
-    table.setStyle(TableStyle([
-        # رأس الجدول - ألوان الهوية (تدرج البيج)
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#a89078')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),  # كل النصوص في الوسط (مثل لوحة التحكم)
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, 0), arabic_font_bold if arabic_font != 'Helvetica' else 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),  # حجم أكبر للوضوح
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        ('LEFTPADDING', (0, 0), (-1, 0), 12),  # مساحة أكثر
-        ('RIGHTPADDING', (0, 0), (-1, 0), 12),
-        # بيانات الجدول - النصوص سوداء
-        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, -2), colors.HexColor('#000000')),
-        ('FONTNAME', (0, 1), (-1, -2), arabic_font),
-        ('FONTSIZE', (0, 1), (-1, -2), 10),  # حجم أكبر للوضوح
-        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#fefcf8')]),
-        ('TOPPADDING', (0, 1), (-1, -2), 12),  # مساحة أكثر للمحتوى
-        ('BOTTOMPADDING', (0, 1), (-1, -2), 12),
-        ('LEFTPADDING', (0, 1), (-1, -2), 12),  # مساحة أكثر
-        ('RIGHTPADDING', (0, 1), (-1, -2), 12),
-        # صف الإجمالي - ألوان الهوية (بيج ذهبي)
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#a89078')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-        ('FONTNAME', (0, -1), (-1, -1), arabic_font_bold if arabic_font != 'Helvetica' else 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 10),
-        ('TOPPADDING', (0, -1), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
-        ('LEFTPADDING', (0, -1), (-1, -1), 12),
-        ('RIGHTPADDING', (0, -1), (-1, -1), 12),
-        # الحدود - مطابق للوحة التحكم (1px solid #ddd)
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),  # 1px solid #e2e8f0
-    ]))
-    
-    elements.append(table)
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # ملخص الإجماليات
-    summary_style = ParagraphStyle(
-        'SummaryStyle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=5,
-        alignment=0,  # right for RTL
-        fontName=arabic_font_bold,
-        encoding='utf-8'
-    )
-    
-    summary_text = f"""
-    <b>ملخص الإجماليات:</b><br/>
-    • إجمالي المدفوعات نقداً: {float(total_cash):,.2f} ر.س<br/>
-    • إجمالي المدفوعات تحويل: {float(total_transfer):,.2f} ر.س<br/>
-    • <b>الإجمالي الكلي: {float(total_all):,.2f} ر.س</b><br/>
-    • عدد الحجوزات: {bookings.count()} حجز
-    """
-    
-    summary = Paragraph(reshape_arabic_text(summary_text), summary_style)
-    elements.append(summary)
-    
-    # بناء PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
-    # قراءة محتوى الـ buffer
-    pdf_content = buffer.read()
-    buffer.close()
-    
-    # إنشاء الرد مع التأكد من أن الملف PDF
-    response = HttpResponse(
-        pdf_content,
-        content_type='application/pdf'
-    )
-    response['Content-Disposition'] = f'attachment; filename="payment_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-    response['Content-Length'] = str(len(pdf_content))
     
     # التأكد من أن المتصفح يعرف أن هذا ملف PDF وليس Word
     response['X-Content-Type-Options'] = 'nosniff'
@@ -771,190 +633,106 @@ def payment_reports_excel(request):
     if not EXCEL_AVAILABLE:
         return HttpResponse("Excel export requires openpyxl. Install it: pip install openpyxl", status=500)
     
-    # نفس منطق الفلترة
-    unit_id = request.GET.get('unit_id', '')
-    report_type = request.GET.get('report_type', 'all')
-    selected_date = request.GET.get('date', '')
-    
-    bookings = Booking.objects.all().select_related('unit', 'unit__owner')
-    
-    # فلترة حسب الوحدة
-    if unit_id and unit_id != 'all':
-        try:
-            unit_filter = Unit.objects.get(id=unit_id)
-            bookings = bookings.filter(unit=unit_filter)
-        except Unit.DoesNotExist:
-            pass
-    
-    # فلترة حسب نوع التقرير
-    if report_type == 'daily' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            bookings = bookings.filter(start_date=target_date)
-        except ValueError:
-            pass
-    elif report_type == 'weekly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            week_start = target_date - timedelta(days=target_date.weekday())
-            week_end = week_start + timedelta(days=6)
-            bookings = bookings.filter(start_date__gte=week_start, start_date__lte=week_end)
-        except ValueError:
-            pass
-    elif report_type == 'monthly' and selected_date:
-        try:
-            target_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            month_start = target_date.replace(day=1)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
-            bookings = bookings.filter(start_date__gte=month_start, start_date__lte=month_end)
-        except ValueError:
-            pass
-    
-    bookings = bookings.order_by('-start_date')
-    
-    total_cash = bookings.aggregate(Sum('cash_amount'))['cash_amount__sum'] or 0
-    total_transfer = bookings.aggregate(Sum('transfer_amount'))['transfer_amount__sum'] or 0
-    total_all = total_cash + total_transfer
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "تقارير المدفوعات"
-    
-    # الأنماط - ألوان الهوية (تدرج البيج)
-    header_fill = PatternFill(start_color="a89078", end_color="8b7765", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    total_fill = PatternFill(start_color="a89078", end_color="a89078", fill_type="solid")
-    total_font = Font(bold=True, color="FFFFFF", size=12)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    # نفس طبقة الاستعلام المستخدمة في payment_reports
+    query = PaymentReportQuery.from_request(request)
+    # كتابة write-only إلى ملف مؤقت بذاكرة ثابتة وخلايا رقمية بتنسيق العملة
+    tmp = payment_report_xlsx_tempfile(query, payment_report_title(query), format_date_arabic)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f'payment_reports_{datetime.now().strftime("%Y%m%d")}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    center_alignment = Alignment(horizontal='center', vertical='center')
-    
-    # بناء العنوان مع معلومات الفلترة
-    title_text = 'تقارير المدفوعات - القمة العقارية'
-    if unit_id and unit_id != 'all':
-        try:
-            unit_name = Unit.objects.get(id=unit_id).name
-            title_text += f' | الوحدة: {unit_name}'
-        except:
-            pass
-    if report_type == 'daily' and selected_date:
-        title_text += f' | يومي - {format_date_arabic(selected_date)}'
-    elif report_type == 'weekly' and selected_date:
-        title_text += f' | أسبوعي - {format_date_arabic(selected_date)}'
-    elif report_type == 'monthly' and selected_date:
-        title_text += f' | شهري - {format_date_arabic(selected_date)}'
-    
-    # العنوان
-    ws.merge_cells('A1:G1')
-    ws['A1'] = title_text
-    title_alignment = Alignment(horizontal='center', vertical='center', text_rotation=0)
-    ws['A1'].font = Font(bold=True, size=14)
-    ws['A1'].alignment = title_alignment
-    
-    # رأس الجدول
-    headers = ['الوحدة', 'التاريخ', 'اسم العميل', 'رقم الهاتف', 'الكاش', 'التحويل', 'الإجمالي']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_alignment
-        cell.border = border
-    
-    # البيانات
-    row = 4
-    for booking in bookings:
-        # النصوص العربية
-        cell1 = ws.cell(row=row, column=1, value=booking.unit.name)
-        cell1.border = border
-        cell1.alignment = center_alignment
-        
-        cell2 = ws.cell(row=row, column=2, value=format_date_arabic(booking.start_date))
-        cell2.border = border
-        cell2.alignment = center_alignment
-        
-        cell3 = ws.cell(row=row, column=3, value=booking.customer_name or '-')
-        cell3.border = border
-        cell3.alignment = center_alignment
-        
-        cell4 = ws.cell(row=row, column=4, value=booking.customer_phone or '-')
-        cell4.border = border
-        cell4.alignment = center_alignment
-        
-        # الأرقام مع تنسيق
-        cash_value = float(booking.cash_amount or 0)
-        cell5 = ws.cell(row=row, column=5, value=f"{cash_value:,.2f} ر.س")
-        cell5.border = border
-        cell5.alignment = center_alignment
-        
-        transfer_value = float(booking.transfer_amount or 0)
-        cell6 = ws.cell(row=row, column=6, value=f"{transfer_value:,.2f} ر.س")
-        cell6.border = border
-        cell6.alignment = center_alignment
-        
-        total_value = float(booking.total_amount)
-        cell7 = ws.cell(row=row, column=7, value=f"{total_value:,.2f} ر.س")
-        cell7.border = border
-        cell7.alignment = center_alignment
-        
-        row += 1
-    
-    # الصف الأخير - الإجماليات
-    cell1 = ws.cell(row=row, column=1, value='الإجمالي')
-    cell1.fill = total_fill
-    cell1.font = total_font
-    cell1.alignment = center_alignment
-    cell1.border = border
-    
-    for col in [2, 3, 4]:
-        cell = ws.cell(row=row, column=col, value='')
-        cell.fill = total_fill
-        cell.font = total_font
-        cell.alignment = center_alignment
-        cell.border = border
-    
-    cell5 = ws.cell(row=row, column=5, value=f"{float(total_cash):,.2f} ر.س")
-    cell5.fill = total_fill
-    cell5.font = total_font
-    cell5.alignment = center_alignment
-    cell5.border = border
-    
-    cell6 = ws.cell(row=row, column=6, value=f"{float(total_transfer):,.2f} ر.س")
-    cell6.fill = total_fill
-    cell6.font = total_font
-    cell6.alignment = center_alignment
-    cell6.border = border
-    
-    cell7 = ws.cell(row=row, column=7, value=f"{float(total_all):,.2f} ر.س")
-    cell7.fill = total_fill
-    cell7.font = total_font
-    cell7.alignment = center_alignment
-    cell7.border = border
-    
-    # تعديل عرض الأعمدة
-    ws.column_dimensions['A'].width = 20  # الوحدة
-    ws.column_dimensions['B'].width = 25  # التاريخ (مع يوم الأسبوع)
-    ws.column_dimensions['C'].width = 18  # اسم العميل
-    ws.column_dimensions['D'].width = 15  # رقم الهاتف
-    ws.column_dimensions['E'].width = 15  # الكاش
-    ws.column_dimensions['F'].width = 15  # التحويل
-    ws.column_dimensions['G'].width = 15  # الإجمالي
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = HttpResponse(buffer.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="payment_reports_{datetime.now().strftime("%Y%m%d")}.xlsx"'
+
+
+def _streaming_export_response(values_qs, fields, fmt, prefix):
+    """رد متدفق لملف CSV أو JSONL"""
+    response = StreamingHttpResponse(iter_export(values_qs, fields, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(prefix, fmt)}"'
+    response['X-Content-Type-Options'] = 'nosniff'
     return response
 
 
+@staff_member_required
+@never_cache
+def bookings_export(request, fmt):
+    """تصدير الحجوزات كبيانات خام (CSV أو JSONL) بنفس فلاتر تقارير المدفوعات"""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404
+    query = PaymentReportQuery.from_request(request)
+    return _streaming_export_response(export_bookings_queryset(query), BOOKING_EXPORT_FIELDS, fmt, 'bookings')
+
+
+@staff_member_required
+@never_cache
+def expenses_export(request, fmt):
+    """تصدير المصروفات كبيانات خام (CSV أو JSONL) بنفس فلاتر تقارير المدفوعات (حسب تاريخ الإضافة)"""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404
+    query = PaymentReportQuery.from_request(request)
+    return _streaming_export_response(export_expenses_queryset(query), EXPENSE_EXPORT_FIELDS, fmt, 'expenses')
+
+
+@staff_member_required
+@never_cache
+def metrics(request):
+    """عدادات داخلية لهذه العملية (ذاكرة التشكيل العربي، طابور الزيارات، جداول القيم، تصفية الزيارات، أقفال SQLite)"""
+    return JsonResponse({
+        'arabic': arabic_cache_stats(),
+        'visits': visit_buffer_stats(),
+        'visit_dimensions': intern_cache_stats(),
+        'visit_tracking': tracking_stats(),
+        'sqlite': sqlite_stats(),
+    })
+
+
+@staff_member_required
+@require_POST
+@never_cache
+def report_job_submit(request):
+    """طلب توليد تقرير المدفوعات (PDF أو Excel) في الخلفية"""
+    kind = request.POST.get('format', 'pdf')
+    if kind not in JOB_KINDS:
+        return JsonResponse({'error': 'نوع الملف غير مدعوم'}, status=400)
+    if kind == 'xlsx' and not EXCEL_AVAILABLE:
+        return JsonResponse({'error': 'تصدير Excel يتطلب مكتبة openpyxl'}, status=400)
+
+    query = PaymentReportQuery.from_request(request)
+    attach = request.POST.get('attach') in ('1', 'true', 'on')
+    job, created = submit_report_job(kind, query, user=request.user, attach_to_owner=attach)
+
+    payload = job_payload(job)
+    payload['created'] = created
+    return JsonResponse(payload, status=202)
+
+
+@staff_member_required
+@never_cache
+def report_job_status(request, job_id):
+    """حالة مهمة تقرير (للاستعلام الدوري من المتصفح)"""
+    job = get_object_or_404(ReportJob, id=job_id)
+    if requeue_stale_jobs(pk=job.pk):
+        # العملية التي كانت تنفذ المهمة توقفت: إعادتها للانتظار بدلاً من "قيد التنفيذ" للأبد
+        schedule_report_job(job.pk)
+        job.refresh_from_db()
+    return JsonResponse(job_payload(job))
+
+
+@staff_member_required
+@never_cache
+def report_job_download(request, job_id):
+    """تحميل ملف مهمة تقرير مكتملة"""
+    job = get_object_or_404(ReportJob, id=job_id)
+    if job.status != ReportJob.STATUS_DONE or not job.file:
+        raise Http404
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=job_download_name(job),
+        content_type=JOB_KINDS[job.kind][1],
+    )
+
+
 @login_required
 @never_cache
 def unit_expenses(request, unit_id):
@@ -1097,8 +875,8 @@ def unit_pricing(request, unit_id):
     eid_al_fitr_nights = create_night_list(eid_al_fitr_prices)
     eid_al_adha_nights = create_night_list(eid_al_adha_prices)
     
-    # جلب الإجازات الجديدة (مع اسم الإجازة والتاريخ)
-    holidays_list = Holiday.objects.filter(unit=unit).order_by('holiday_date')
+    # إجازات الوحدة الخاصة والإجازات العامة بسعرها للوحدة (مع اسم الإجازة والتاريخ)
+    holidays_list = unit_holidays(unit.id)
     
     context = {
         'unit': unit,
@@ -1138,102 +916,17 @@ def unit_gallery(request, unit_id):
 @never_cache
 def profits_view(request):
     """عرض الأرباح والرسوم البيانية للمديرين"""
-    from collections import defaultdict
-    
-    # حساب الأرباح لكل وحدة
-    units = Unit.objects.all().order_by('name')
-    profits_data = []
-    
-    for unit in units:
-        # حساب إجمالي الحجوزات
-        bookings = Booking.objects.filter(unit=unit)
-        total_booking_amount = 0
-        
-        for booking in bookings:
-            cash_transfer_total = float((booking.cash_amount or 0) + (booking.transfer_amount or 0))
-            if cash_transfer_total > 0:
-                total_booking_amount += cash_transfer_total
-            elif booking.price_per_day is not None:
-                total_days = (booking.end_date - booking.start_date).days + 1
-                total_booking_amount += float(booking.price_per_day) * max(total_days, 1)
-        
-        # حساب إجمالي المصروفات
-        expenses = Expense.objects.filter(unit=unit)
-        total_expenses = float(expenses.aggregate(Sum('price'))['price__sum'] or 0)
-        
-        # حساب الصافي
-        net_total = total_booking_amount - total_expenses
-        
-        # الحصول على نسبة الأرباح من مالك الوحدة
-        percentage = 50  # افتراضي 50%
-        if unit.owner:
-            try:
-                profit_percentage_obj = unit.owner.profit_percentage
-                percentage = profit_percentage_obj.percentage
-            except ProfitPercentage.DoesNotExist:
-                percentage = 50  # افتراضي 50%
-        
-        # حساب الأرباح
-        profit = (net_total * percentage) / 100
-        
-        profits_data.append({
-            'unit': unit,
-            'owner': unit.owner,
-            'total_bookings': total_booking_amount,
-            'total_expenses': total_expenses,
-            'net_total': net_total,
-            'percentage': percentage,
-            'profit': profit,
-        })
+    # حساب الأرباح لكل وحدة في استعلام واحد
+    profits_data = unit_profits()
     
     # بيانات الرسوم البيانية - أعلى الوحدات بالحجوزات
     today = datetime.now().date()
     current_month_start = today.replace(day=1)
     current_year_start = today.replace(month=1, day=1)
     
-    # الحجوزات خلال الشهر
-    monthly_bookings_raw = Booking.objects.filter(
-        start_date__gte=current_month_start,
-        start_date__lte=today
-    ).select_related('unit')
-    
-    monthly_bookings_dict = {}
-    for booking in monthly_bookings_raw:
-        unit_name = booking.unit.name
-        if unit_name not in monthly_bookings_dict:
-            monthly_bookings_dict[unit_name] = {'booking_count': 0, 'total_amount': 0}
-        monthly_bookings_dict[unit_name]['booking_count'] += 1
-        cash_transfer_total = float((booking.cash_amount or 0) + (booking.transfer_amount or 0))
-        if cash_transfer_total > 0:
-            monthly_bookings_dict[unit_name]['total_amount'] += cash_transfer_total
-        elif booking.price_per_day is not None:
-            total_days = (booking.end_date - booking.start_date).days + 1
-            monthly_bookings_dict[unit_name]['total_amount'] += float(booking.price_per_day) * max(total_days, 1)
-    
-    monthly_bookings = [{'unit__name': k, 'booking_count': v['booking_count'], 'total_amount': v['total_amount']} 
-                        for k, v in sorted(monthly_bookings_dict.items(), key=lambda x: x[1]['booking_count'], reverse=True)[:10]]
-    
-    # الحجوزات خلال السنة
-    yearly_bookings_raw = Booking.objects.filter(
-        start_date__gte=current_year_start,
-        start_date__lte=today
-    ).select_related('unit')
-    
-    yearly_bookings_dict = {}
-    for booking in yearly_bookings_raw:
-        unit_name = booking.unit.name
-        if unit_name not in yearly_bookings_dict:
-            yearly_bookings_dict[unit_name] = {'booking_count': 0, 'total_amount': 0}
-        yearly_bookings_dict[unit_name]['booking_count'] += 1
-        cash_transfer_total = float((booking.cash_amount or 0) + (booking.transfer_amount or 0))
-        if cash_transfer_total > 0:
-            yearly_bookings_dict[unit_name]['total_amount'] += cash_transfer_total
-        elif booking.price_per_day is not None:
-            total_days = (booking.end_date - booking.start_date).days + 1
-            yearly_bookings_dict[unit_name]['total_amount'] += float(booking.price_per_day) * max(total_days, 1)
-    
-    yearly_bookings = [{'unit__name': k, 'booking_count': v['booking_count'], 'total_amount': v['total_amount']} 
-                       for k, v in sorted(yearly_bookings_dict.items(), key=lambda x: x[1]['booking_count'], reverse=True)[:10]]
+    # الحجوزات خلال الشهر والسنة (استعلام مجمّع لكل فترة)
+    monthly_bookings = top_units_by_bookings(current_month_start, today)
+    yearly_bookings = top_units_by_bookings(current_year_start, today)
     
     # المصروفات خلال الشهر
     monthly_expenses = Expense.objects.filter(
@@ -1269,174 +962,13 @@ def profits_view(request):
 @never_cache
 def profits_pdf(request):
     """تصدير تقرير الأرباح كـ PDF"""
-    # حساب الأرباح لكل وحدة (نفس منطق profits_view)
-    units = Unit.objects.all().order_by('name')
-    profits_data = []
-    
-    for unit in units:
-        # حساب إجمالي الحجوزات
-        bookings = Booking.objects.filter(unit=unit)
-        total_booking_amount = 0
-        
-        for booking in bookings:
-            cash_transfer_total = float((booking.cash_amount or 0) + (booking.transfer_amount or 0))
-            if cash_transfer_total > 0:
-                total_booking_amount += cash_transfer_total
-            elif booking.price_per_day is not None:
-                total_days = (booking.end_date - booking.start_date).days + 1
-                total_booking_amount += float(booking.price_per_day) * max(total_days, 1)
-        
-        # حساب إجمالي المصروفات
-        expenses = Expense.objects.filter(unit=unit)
-        total_expenses = float(expenses.aggregate(Sum('price'))['price__sum'] or 0)
-        
-        # حساب الصافي
-        net_total = total_booking_amount - total_expenses
-        
-        # الحصول على نسبة الأرباح من مالك الوحدة
-        percentage = 50  # افتراضي 50%
-        if unit.owner:
-            try:
-                profit_percentage_obj = unit.owner.profit_percentage
-                percentage = profit_percentage_obj.percentage
-            except ProfitPercentage.DoesNotExist:
-                percentage = 50  # افتراضي 50%
-        
-        # حساب الأرباح
-        profit = (net_total * percentage) / 100
-        
-        profits_data.append({
-            'unit': unit,
-            'owner': unit.owner,
-            'total_bookings': total_booking_amount,
-            'total_expenses': total_expenses,
-            'net_total': net_total,
-            'percentage': percentage,
-            'profit': profit,
-        })
+    # حساب الأرباح لكل وحدة (نفس خدمة profits_view)
+    profits_data = unit_profits()
+    totals = profits_totals(profits_data)
     
     # إنشاء PDF
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1*cm, leftMargin=1*cm, topMargin=1*cm, bottomMargin=1*cm)
-    elements = []
-    
-    # تسجيل الخط العربي
-    try:
-        pdfmetrics.registerFont(TTFont('Arabic', 'static/fonts/Cairo-Regular.ttf'))
-        pdfmetrics.registerFont(TTFont('ArabicBold', 'static/fonts/Cairo-Bold.ttf'))
-        arabic_font = 'Arabic'
-        arabic_font_bold = 'ArabicBold'
-    except:
-        arabic_font = 'Helvetica'
-        arabic_font_bold = 'Helvetica-Bold'
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#8b7765'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName=arabic_font_bold
-    )
-    
-    table_header_style = ParagraphStyle(
-        'TableHeader',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        fontName=arabic_font_bold,
-        textColor=colors.white,
-        backColor=colors.HexColor('#8b7765')
-    )
-    
-    table_style = ParagraphStyle(
-        'TableStyle',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_CENTER,
-        fontName=arabic_font
-    )
-    
-    # العنوان
-    title = Paragraph(reshape_arabic_text('تقرير الأرباح'), title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # رؤوس الجدول
-    headers = [
-        Paragraph(reshape_arabic_text('الوحدة'), table_header_style),
-        Paragraph(reshape_arabic_text('المالك'), table_header_style),
-        Paragraph(reshape_arabic_text('إجمالي الحجوزات'), table_header_style),
-        Paragraph(reshape_arabic_text('إجمالي المصروفات'), table_header_style),
-        Paragraph(reshape_arabic_text('الصافي'), table_header_style),
-        Paragraph(reshape_arabic_text('نسبة الأرباح'), table_header_style),
-        Paragraph(reshape_arabic_text('الأرباح'), table_header_style)
-    ]
-    
-    data = [headers]
-    
-    # إجماليات
-    total_bookings = 0
-    total_expenses = 0
-    total_net = 0
-    total_profit = 0
-    
-    for item in profits_data:
-        unit_name = Paragraph(reshape_arabic_text(item['unit'].name), table_style)
-        owner_name = Paragraph(reshape_arabic_text(item['owner'].username if item['owner'] else '-'), table_style)
-        bookings = Paragraph(reshape_arabic_text(f"{item['total_bookings']:,.2f} ر.س"), table_style)
-        expenses = Paragraph(reshape_arabic_text(f"{item['total_expenses']:,.2f} ر.س"), table_style)
-        net = Paragraph(reshape_arabic_text(f"{item['net_total']:,.2f} ر.س"), table_style)
-        percentage = Paragraph(reshape_arabic_text(f"{item['percentage']}%"), table_style)
-        profit = Paragraph(reshape_arabic_text(f"{item['profit']:,.2f} ر.س"), table_style)
-        
-        data.append([unit_name, owner_name, bookings, expenses, net, percentage, profit])
-        
-        total_bookings += item['total_bookings']
-        total_expenses += item['total_expenses']
-        total_net += item['net_total']
-        total_profit += item['profit']
-    
-    # صف الإجمالي
-    total_row = [
-        Paragraph(reshape_arabic_text('الإجمالي'), table_style),
-        Paragraph('', table_style),
-        Paragraph(reshape_arabic_text(f"{total_bookings:,.2f} ر.س"), table_style),
-        Paragraph(reshape_arabic_text(f"{total_expenses:,.2f} ر.س"), table_style),
-        Paragraph(reshape_arabic_text(f"{total_net:,.2f} ر.س"), table_style),
-        Paragraph('', table_style),
-        Paragraph(reshape_arabic_text(f"{total_profit:,.2f} ر.س"), table_style)
-    ]
-    data.append(total_row)
-    
-    # إنشاء الجدول
-    available_width = A4[0] - (1*cm * 2)
-    num_cols = 7
-    col_width = available_width / num_cols
-    
-    table = Table(data, colWidths=[col_width] * num_cols)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8b7765')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), arabic_font_bold),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, -2), colors.black),
-        ('FONTNAME', (0, 1), (-1, -2), arabic_font),
-        ('FONTSIZE', (0, 1), (-1, -2), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f5f5f5')]),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e9ecef')),
-        ('FONTNAME', (0, -1), (-1, -1), arabic_font_bold),
-        ('FONTSIZE', (0, -1), (-1, -1), 10),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
+    write_profits_pdf(profits_data, totals, buffer)
     
     buffer.seek(0)
     response = HttpResponse(buffer.read(), content_type='application/pdf')
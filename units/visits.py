@@ -0,0 +1,188 @@
+"""
+تسجيل الزيارات على دفعات بدلاً من كتابة سطر في قاعدة البيانات مع كل طلب
+
+يضع الـ middleware الزيارة في طابور محدود داخل العملية ويعود فوراً، ويكتب
+خيط خلفي الزيارات بـ bulk_create كل N زيارة أو كل T ملي ثانية (أيهما أسبق).
+عند امتلاء الطابور تُسقط الزيارة وتُحسب في العدادات بدل إبطاء الطلب،
+وتُكتب الزيارات المتبقية عند إيقاف العملية.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.utils import timezone
+
+from .dimensions import intern_visit_fields
+from .models import Visit
+from .rollups import add_visits_to_rollups
+from .sqlite import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+def write_visits(records, batch_size=None):
+    """كتابة زيارات (قواميس حقول Visit) وإضافتها إلى الملخصات في معاملة واحدة
+
+    لو كانت الكتابتان في معاملتين لكانت إعادة حساب الملخصات (rollup_visits) بينهما
+    تعدّ الزيارات ثم تضيفها الدفعة مرة أخرى.
+    """
+    visits = [Visit(**intern_visit_fields(record)) for record in records]
+    with transaction.atomic(using=router.db_for_write(Visit)):
+        Visit.objects.bulk_create(visits, batch_size=batch_size)
+        add_visits_to_rollups(records)
+
+
+def visit_logging_mode():
+    """'buffered' (الافتراضي) للكتابة على دفعات، أو 'sync' للكتابة داخل الطلب"""
+    return getattr(settings, 'VISIT_LOGGING_MODE', 'buffered')
+
+
+class VisitBuffer:
+    """طابور زيارات محدود مع خيط يكتبها على دفعات"""
+
+    def __init__(self, max_size=None, batch_size=None, interval_ms=None):
+        self.max_size = max_size or getattr(settings, 'VISIT_BUFFER_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'VISIT_FLUSH_BATCH', 200)
+        self.interval = (interval_ms or getattr(settings, 'VISIT_FLUSH_INTERVAL_MS', 2000)) / 1000
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'flushes': 0,
+            'dropped_full': 0,
+            'dropped_errors': 0,
+            'last_flush_at': None,
+            'last_error': None,
+        }
+
+    def _ensure_started(self):
+        # بعد fork (مثل عمال gunicorn) لا ينتقل الخيط، فنبدأ طابوراً جديداً للعملية
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name='visit-flusher', daemon=True
+                    )
+                    self._thread.start()
+
+    def add(self, record):
+        """إضافة زيارة (قاموس حقول Visit) دون انتظار قاعدة البيانات"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats['dropped_full'] += 1
+            return False
+        self.stats['enqueued'] += 1
+        return True
+
+    def _take_batch(self, timeout):
+        """انتظار حتى اكتمال دفعة أو انتهاء المهلة، وإرجاع ما تجمّع"""
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            try:
+                call_with_retry(write_visits, batch, batch_size=self.batch_size, name='visits:flush')
+            except Exception as exc:
+                self.stats['dropped_errors'] += len(batch)
+                self.stats['last_error'] = str(exc)
+                logger.exception('تعذر كتابة %s زيارة', len(batch))
+                return
+            self.stats['written'] += len(batch)
+            self.stats['flushes'] += 1
+            self.stats['last_flush_at'] = timezone.now().isoformat()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(self.interval)
+            if not batch:
+                continue
+            close_old_connections()
+            try:
+                self._write(batch)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """كتابة كل ما في الطابور الآن (من الخيط المستدعي)"""
+        batch = self._drain()
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+        return len(batch)
+
+    def shutdown(self, timeout=5):
+        """إيقاف الخيط وكتابة الزيارات المتبقية (يُستدعى عند الخروج)"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('تعذر كتابة الزيارات المتبقية عند الإيقاف')
+
+    def snapshot(self):
+        """العدادات الحالية مع حجم الطابور"""
+        data = dict(self.stats)
+        data['pending'] = self._queue.qsize()
+        data['max_size'] = self.max_size
+        data['batch_size'] = self.batch_size
+        data['interval_ms'] = int(self.interval * 1000)
+        return data
+
+
+visit_buffer = VisitBuffer()
+atexit.register(visit_buffer.shutdown)
+
+
+def record_visit(**fields):
+    """تسجيل زيارة حسب الوضع المضبوط (على دفعات أو مباشرة)"""
+    fields.setdefault('created_at', timezone.now())
+    if visit_logging_mode() == 'sync':
+        call_with_retry(write_visits, [fields], name='visits:sync')
+        return True
+    return visit_buffer.add(fields)
+
+
+def visit_buffer_stats():
+    return visit_buffer.snapshot()